@@ -11,8 +11,11 @@ setup(
     install_requires=[
         "fastapi>=0.103.1",
         "uvicorn>=0.23.2",
-        "sqlalchemy>=2.0.20",
+        "sqlalchemy[asyncio]>=2.0.20",
+        "aiosqlite>=0.19.0",
         "pandas>=2.1.0",
+        "prometheus-client>=0.17.0",
+        "orjson>=3.9.0",
         "openpyxl>=3.1.2",
         "python-jose>=3.3.0",
         "passlib>=1.7.4",
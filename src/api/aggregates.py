@@ -0,0 +1,177 @@
+"""
+Calcul des statistiques servies par l'API.
+
+Ces fonctions exécutent les requêtes d'agrégats sur une session et mettent
+en forme leurs résultats (sérialisables en JSON). Elles sont partagées par
+les routes de statistiques (avec cache) et par la route de tableau de bord
+(plusieurs calculs sur un même instantané).
+"""
+import os
+from datetime import date, timedelta
+
+from fastapi import HTTPException, status
+
+from src.db.periods import iter_periods, period_start, shift_period
+from src.db.queries import (
+    BANK_DATA_COLUMNS, bank_data_query, keyset_page_query,
+    rollup_stats_by_agence_query, rollup_stats_by_date_query,
+    rollup_agences_query, rollup_timeseries_query, rollup_pivot_query, rollup_top_agences_query
+)
+
+# Nombre de périodes d'une série temporelle sans date de début, et maximum accepté
+TIMESERIES_DEFAULT_POINTS = int(os.getenv("TIMESERIES_DEFAULT_POINTS", "30"))
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "1000"))
+
+
+def resolve_periods(granularity, date_from=None, date_to=None):
+    """
+    Calculer les périodes couvertes par une série temporelle.
+
+    Returns:
+        tuple: (début de la première période, début de la dernière, liste des débuts)
+
+    Raises:
+        HTTPException: 400 si l'intervalle est vide, trop long ou touche les
+            bornes du calendrier (la période suivant la dernière doit exister)
+    """
+    try:
+        last = period_start(date_to or date.today(), granularity)
+        if date_from:
+            first = period_start(date_from, granularity)
+        else:
+            first = shift_period(last, granularity, -(TIMESERIES_DEFAULT_POINTS - 1))
+        # Borne exclusive des requêtes (voir timeseries et pivot)
+        shift_period(last, granularity)
+    except (OverflowError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Intervalle hors des dates prises en charge"
+        )
+    if first > last:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La date de début doit précéder la date de fin"
+        )
+    if (last - first).days > TIMESERIES_MAX_POINTS * 92:
+        # Évite d'énumérer un intervalle démesuré avant de le refuser
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Une série contient au plus {TIMESERIES_MAX_POINTS} périodes"
+        )
+    periods = iter_periods(first, last, granularity)
+    if len(periods) > TIMESERIES_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Une série contient au plus {TIMESERIES_MAX_POINTS} périodes"
+        )
+    return first, last, periods
+
+
+async def stats_by_agence(db):
+    """Statistiques par agence (montant total, transactions, nombre d'entrées)."""
+    result = await db.execute(rollup_stats_by_agence_query())
+    return [
+        {
+            "agence": row.agence,
+            "montant_total": row.montant_total,
+            "transactions_total": row.transactions_total,
+            "nombre_entrees": row.nombre_entrees
+        }
+        for row in result.all()
+    ]
+
+
+async def stats_by_date(db, date_limite):
+    """Statistiques par date depuis `date_limite`."""
+    result = await db.execute(rollup_stats_by_date_query(date_limite))
+    return [
+        {
+            "date": row.date.isoformat(),
+            "montant_total": row.montant_total,
+            "transactions_total": row.transactions_total,
+            "nombre_entrees": row.nombre_entrees
+        }
+        for row in result.all()
+    ]
+
+
+async def timeseries(db, granularity, first, last, periods, agence=None):
+    """Série temporelle continue (périodes sans données à zéro)."""
+    query = rollup_timeseries_query(
+        granularity, first, shift_period(last, granularity), agence, db.bind.dialect.name
+    )
+    rows = {row.period_start: row for row in (await db.execute(query)).all()}
+    points = []
+    for start in periods:
+        row = rows.get(start)
+        points.append({
+            "period_start": start.isoformat(),
+            "montant_total": row.montant_total if row else 0.0,
+            "transactions_total": row.transactions_total if row else 0,
+            "nombre_entrees": row.nombre_entrees if row else 0
+        })
+    return {"granularity": granularity, "agence": agence, "points": points}
+
+
+async def pivot(db, granularity, metric, first, last, periods):
+    """
+    Matrice agence x période d'une mesure, au format colonnes.
+
+    L'axe des agences contient toutes les agences, même sans données dans
+    l'intervalle : il ne varie pas d'un intervalle à l'autre. Les montants
+    sont des flottants, les nombres de transactions et d'entrées des entiers.
+    """
+    query = rollup_pivot_query(granularity, metric, first, shift_period(last, granularity), db.bind.dialect.name)
+    cells = {(row.agence, row.period_start): row.value for row in (await db.execute(query)).all()}
+    agences = (await db.execute(rollup_agences_query())).scalars().all()
+    cast = float if metric == "montant_total" else int
+    values = [cast(cells.get((agence, start), 0)) for agence in agences for start in periods]
+    return {
+        "granularity": granularity,
+        "metric": metric,
+        "agences": agences,
+        "periods": [start.isoformat() for start in periods],
+        "shape": [len(agences), len(periods)],
+        "values": values
+    }
+
+
+async def top_agences(db, metric, limit, date_from=None, date_to=None):
+    """Agences classées par valeur décroissante d'une mesure."""
+    result = await db.execute(rollup_top_agences_query(metric, limit, date_from, date_to))
+    return [{"agence": row.agence, metric: row.value} for row in result.all()]
+
+
+async def bank_data_list(db, agence=None, date_debut=None, date_fin=None, skip=0, limit=100):
+    """Données bancaires filtrées, triées par date puis par ID."""
+    query = keyset_page_query(
+        bank_data_query(agence, date_debut, date_fin).with_only_columns(*BANK_DATA_COLUMNS)
+    ).offset(skip).limit(limit)
+    return [row._asdict() for row in (await db.execute(query)).all()]
+
+
+async def run_dashboard_query(db, query):
+    """
+    Exécuter une sous-requête de tableau de bord.
+
+    Args:
+        db: Session asynchrone
+        query: Sous-requête (modèle de DashboardQuery)
+
+    Returns:
+        Résultat au format de la route équivalente
+    """
+    if query.type == "stats_by_agence":
+        return await stats_by_agence(db)
+    if query.type == "stats_by_date":
+        return await stats_by_date(db, date.today() - timedelta(days=query.days))
+    if query.type == "timeseries":
+        first, last, periods = resolve_periods(query.granularity, query.date_from, query.date_to)
+        return await timeseries(db, query.granularity, first, last, periods, query.agence)
+    if query.type == "pivot":
+        first, last, periods = resolve_periods(query.granularity, query.date_from, query.date_to)
+        return await pivot(db, query.granularity, query.metric, first, last, periods)
+    if query.type == "top_agences":
+        return await top_agences(db, query.metric, query.limit, query.date_from, query.date_to)
+    return await bank_data_list(db, query.agence, query.date_debut, query.date_fin, query.skip, query.limit)
+
@@ -0,0 +1,481 @@
+"""
+Analyses IA exécutées en arrière-plan.
+
+POST /api/ai/analyze enregistre une tâche dans la table analysis_jobs et
+répond immédiatement (202). Un pool borné de workers (ANALYSIS_WORKERS)
+exécute les tâches : lecture des données, puis appel LLM et graphiques dans
+des threads dédiés, hors de la boucle d'événements. Les clients consultent
+/api/ai/jobs/{id} et peuvent attendre la fin de la tâche (paramètre wait).
+
+Les tâches sont persistées. Une tâche en cours appartient au processus qui
+l'exécute (worker_id) tant que son bail est renouvelé (heartbeat_at, toutes
+les ANALYSIS_JOB_LEASE_SECONDS / 3 secondes). Au démarrage, puis
+périodiquement, les tâches en attente et celles dont le bail a expiré
+(processus arrêté) sont relancées ; celles d'un autre processus encore actif
+ne le sont pas, ce qui permet plusieurs processus et les redémarrages
+progressifs.
+
+Le résultat d'une analyse réussie est conservé dans un cache dont la clé
+combine les paramètres de la demande et l'empreinte des données analysées
+(agrégats journaliers de la plage et de l'agence demandées). Une demande
+identique sur des données inchangées reçoit ce résultat sans nouvelle
+exécution ; une écriture hors de la plage analysée ne l'invalide pas.
+"""
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import or_, select, update
+
+from src.db.models import AnalysisJob
+from src.db.queries import analysis_data_query, analysis_fingerprint_query
+from src.api.cache import create_cache, make_cache_key
+from src.api.ia_models import AnalysisMetadata, AnalysisResponse, Visualization
+from src.api.singleflight import SingleFlight
+from src.ia.ai_service import ai_service
+
+logger = logging.getLogger(__name__)
+
+# Nombre d'analyses exécutées simultanément par processus
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+# Nombre maximal de tâches en file d'attente (au-delà : 503)
+ANALYSIS_QUEUE_MAX = int(os.getenv("ANALYSIS_QUEUE_MAX", "100"))
+# Attente maximale accordée par GET /api/ai/jobs/{id}?wait=
+ANALYSIS_JOB_MAX_WAIT_SECONDS = float(os.getenv("ANALYSIS_JOB_MAX_WAIT_SECONDS", "60"))
+# Durée de conservation et nombre maximal des résultats d'analyse en cache
+ANALYSIS_RESULT_CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_RESULT_CACHE_TTL_SECONDS", "3600"))
+ANALYSIS_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_RESULT_CACHE_MAX_ENTRIES", "256"))
+# Durée du bail d'une tâche en cours : passé ce délai sans renouvellement, elle est relancée
+ANALYSIS_JOB_LEASE_SECONDS = float(os.getenv("ANALYSIS_JOB_LEASE_SECONDS", "60"))
+# Intervalle de relecture d'une tâche exécutée par un autre processus
+JOB_POLL_SECONDS = 1.0
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# Paramètres qui déterminent le résultat d'une analyse
+RESULT_CACHE_PARAMETERS = ("start_date", "end_date", "agence", "format", "include_visualizations")
+
+# Analyses en cours, regroupées par paramètres et empreinte des données
+analysis_flight = SingleFlight("ai_analyze")
+# Résultats des analyses réussies (AnalysisResponse sérialisées en JSON)
+analysis_result_cache = create_cache(
+    ttl=ANALYSIS_RESULT_CACHE_TTL_SECONDS, max_entries=ANALYSIS_RESULT_CACHE_MAX_ENTRIES
+)
+
+
+class AnalysisQueueFull(Exception):
+    """La file des analyses a atteint ANALYSIS_QUEUE_MAX."""
+
+
+def resolve_parameters(request):
+    """
+    Paramètres d'une analyse, dates par défaut appliquées (sérialisables en JSON).
+
+    Args:
+        request: Demande d'analyse (AnalysisRequest)
+    """
+    today = datetime.date.today()
+    parameters = request.model_copy(update={
+        "start_date": request.start_date or today - datetime.timedelta(days=30),
+        "end_date": request.end_date or today,
+    })
+    return parameters.model_dump(mode="json")
+
+
+async def data_fingerprint(db, parameters):
+    """
+    Empreinte des données couvertes par une analyse.
+
+    Args:
+        db: Session ou connexion asynchrone
+        parameters: Paramètres résolus de l'analyse (voir resolve_parameters)
+
+    Returns:
+        str: Empreinte, modifiée par toute écriture dans la plage analysée
+    """
+    query = analysis_fingerprint_query(
+        datetime.date.fromisoformat(parameters["start_date"]),
+        datetime.date.fromisoformat(parameters["end_date"]),
+        parameters.get("agence")
+    )
+    rows = (await db.execute(query)).all()
+    return hashlib.sha256(repr([tuple(row) for row in rows]).encode()).hexdigest()[:16]
+
+
+def result_cache_key(parameters, fingerprint):
+    """Clé du résultat d'une analyse pour une empreinte des données."""
+    return make_cache_key(
+        "ai/analyze",
+        {name: parameters.get(name) for name in RESULT_CACHE_PARAMETERS},
+        fingerprint
+    )
+
+
+async def get_cached_result(db, parameters):
+    """
+    Retourner le résultat d'une analyse identique sur les mêmes données.
+
+    Returns:
+        dict: AnalysisResponse sérialisée, ou None (absente, données modifiées ou bypass_cache)
+    """
+    if parameters.get("bypass_cache"):
+        return None
+    fingerprint = await data_fingerprint(db, parameters)
+    return await analysis_result_cache.get(result_cache_key(parameters, fingerprint))
+
+
+async def fetch_analysis_data(db, parameters):
+    """
+    Lire les données d'une analyse.
+
+    Args:
+        db: Session ou connexion asynchrone
+        parameters: Paramètres résolus de l'analyse (voir resolve_parameters)
+
+    Returns:
+        list: Lignes (agence, date, montant, nombre_transactions) sous forme de dictionnaires
+
+    Raises:
+        LookupError: Si aucune donnée ne correspond aux critères
+    """
+    query = analysis_data_query(
+        datetime.date.fromisoformat(parameters["start_date"]),
+        datetime.date.fromisoformat(parameters["end_date"]),
+        parameters.get("agence")
+    )
+    bank_data = (await db.execute(query)).all()
+    if not bank_data:
+        raise LookupError("Aucune donnée trouvée pour les critères spécifiés")
+    return [
+        {
+            "agence": item.agence,
+            "date": item.date,
+            "montant": item.montant,
+            "nombre_transactions": item.nombre_transactions
+        }
+        for item in bank_data
+    ]
+
+
+async def execute_analysis(db_engine, parameters, executor):
+    """
+    Lire les données d'une analyse et appeler le service d'IA.
+
+    Les demandes identiques simultanées (mêmes paramètres, mêmes données)
+    partagent la même requête SQL et le même appel LLM.
+
+    Returns:
+        tuple: (empreinte des données, résultat du service d'IA)
+
+    Raises:
+        LookupError: Si aucune donnée ne correspond aux critères
+    """
+    start_date = datetime.date.fromisoformat(parameters["start_date"])
+    end_date = datetime.date.fromisoformat(parameters["end_date"])
+    agence = parameters.get("agence")
+    use_cache = not parameters.get("bypass_cache")
+    include_visualizations = bool(parameters.get("include_visualizations"))
+
+    async with db_engine.connect() as conn:
+        # Empreinte lue avant les données : une écriture concurrente produit
+        # au pire un résultat plus récent que son empreinte, jamais l'inverse
+        fingerprint = await data_fingerprint(conn, parameters)
+
+    async def run_analysis():
+        # Calcul partagé : sa connexion ne dépend pas de la demande qui l'a
+        # lancé et est rendue au pool avant l'appel LLM
+        async with db_engine.connect() as conn:
+            data_dicts = await fetch_analysis_data(conn, parameters)
+        # Appel LLM et graphiques bloquants, dans le pool des analyses
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, ai_service.analyze_bank_data, data_dicts, use_cache, include_visualizations
+        )
+
+    flight_key = make_cache_key(
+        "ai/analyze",
+        {
+            "start_date": start_date, "end_date": end_date, "agence": agence,
+            "use_cache": use_cache, "include_visualizations": include_visualizations
+        },
+        fingerprint
+    )
+    return fingerprint, await analysis_flight.do(flight_key, run_analysis)
+
+
+def visualization_links(visualizations):
+    """Visualisations générées par le service d'IA, avec l'URL d'accès à l'image."""
+    return [
+        Visualization(
+            path=viz["path"],
+            title=viz["title"],
+            type=viz["type"],
+            url=f"/api/ai/visualizations/{uuid.uuid4()}"
+        )
+        for viz in visualizations
+    ]
+
+
+def build_analysis_response(analysis_id, parameters, result, execution_time, visualizations=None):
+    """
+    Mettre en forme le résultat d'une analyse (AnalysisResponse sérialisée en JSON).
+
+    Args:
+        visualizations: Visualisations déjà transmises au client (voir visualization_links)
+    """
+    if visualizations is None:
+        visualizations = []
+        if parameters.get("include_visualizations") and "visualizations" in result:
+            visualizations = visualization_links(result["visualizations"])
+
+    response = AnalysisResponse(
+        report=result["report"],
+        visualizations=visualizations,
+        metadata=AnalysisMetadata(
+            timestamp=datetime.datetime.fromisoformat(result["metadata"]["timestamp"]),
+            data_points=result["metadata"]["data_points"],
+            date_range=result["metadata"]["date_range"],
+            agencies=result["metadata"]["agencies"],
+            execution_time=execution_time,
+            model_used=ai_service.model_used
+        ),
+        id=analysis_id
+    )
+    return response.model_dump(mode="json")
+
+
+async def record_finished_job(db_engine, job_id, user_id, parameters, result, started_at):
+    """Enregistrer une analyse exécutée hors de la file (ex. diffusée en flux)."""
+    async with db_engine.begin() as conn:
+        await conn.execute(AnalysisJob.__table__.insert().values(
+            id=job_id,
+            user_id=user_id,
+            status=JOB_SUCCEEDED,
+            parameters=parameters,
+            result=result,
+            created_at=started_at,
+            started_at=started_at,
+            finished_at=datetime.datetime.now()
+        ))
+
+
+def job_query(job_id):
+    """Requête de lecture d'une tâche, relue en base même si elle est déjà chargée."""
+    return select(AnalysisJob).where(AnalysisJob.id == job_id).execution_options(populate_existing=True)
+
+
+def job_header_query(job_id):
+    """Requête de lecture d'une tâche sans son résultat (contrôle d'accès, ETag)."""
+    return select(
+        AnalysisJob.id, AnalysisJob.user_id, AnalysisJob.status, AnalysisJob.created_at, AnalysisJob.finished_at
+    ).where(AnalysisJob.id == job_id)
+
+
+class AnalysisJobManager:
+    """File et pool de workers des analyses d'un processus."""
+
+    def __init__(self, workers=ANALYSIS_WORKERS, queue_max=ANALYSIS_QUEUE_MAX, lease_seconds=ANALYSIS_JOB_LEASE_SECONDS):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.lease_seconds = lease_seconds
+        # Propriétaire des tâches exécutées par ce processus
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+        self._db_engine = None
+        self._queue = None
+        self._tasks = []
+        self._events = {}
+        self._running = set()
+
+    def start(self, db_engine):
+        """Démarrer les workers et le renouvellement des baux dans la boucle d'événements courante."""
+        self._db_engine = db_engine
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain_leases(db_engine)))
+
+    async def stop(self):
+        """Arrêter les workers et remettre en attente les tâches interrompues."""
+        interrupted = list(self._running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        if interrupted:
+            # Libérer les baux : un autre processus peut les relancer sans attendre leur expiration
+            table = AnalysisJob.__table__
+            try:
+                async with self._db_engine.begin() as conn:
+                    await conn.execute(
+                        update(table)
+                        .where(table.c.id.in_(interrupted), table.c.worker_id == self.worker_id)
+                        .values(status=JOB_PENDING, started_at=None, worker_id=None, heartbeat_at=None)
+                    )
+            except Exception:
+                logger.exception("Impossible de remettre en attente les analyses interrompues")
+
+    async def _reclaim_expired(self, conn):
+        """
+        Remettre en attente les tâches en cours dont le bail a expiré.
+
+        Returns:
+            list: Identifiants des tâches remises en attente
+        """
+        table = AnalysisJob.__table__
+        expired = or_(
+            table.c.heartbeat_at.is_(None),
+            table.c.heartbeat_at < datetime.datetime.now() - datetime.timedelta(seconds=self.lease_seconds)
+        )
+        result = await conn.execute(select(table.c.id).where(table.c.status == JOB_RUNNING, expired))
+        job_ids = result.scalars().all()
+        if job_ids:
+            # Bail relu dans la condition : un renouvellement concurrent l'emporte
+            await conn.execute(
+                update(table)
+                .where(table.c.id.in_(job_ids), table.c.status == JOB_RUNNING, expired)
+                .values(status=JOB_PENDING, started_at=None, worker_id=None, heartbeat_at=None)
+            )
+        return job_ids
+
+    async def recover(self, db_engine):
+        """Relancer les tâches en attente et celles dont le bail a expiré (processus arrêté)."""
+        table = AnalysisJob.__table__
+        async with db_engine.begin() as conn:
+            await self._reclaim_expired(conn)
+            result = await conn.execute(
+                select(table.c.id).where(table.c.status == JOB_PENDING).order_by(table.c.created_at)
+            )
+            job_ids = result.scalars().all()
+        for job_id in job_ids:
+            self._queue.put_nowait((job_id, db_engine))
+        if job_ids:
+            logger.info(f"{len(job_ids)} analyses relancées")
+
+    async def _maintain_leases(self, db_engine):
+        """Renouveler les baux des tâches en cours et relancer les tâches abandonnées."""
+        table = AnalysisJob.__table__
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with db_engine.begin() as conn:
+                    if self._running:
+                        await conn.execute(
+                            update(table)
+                            .where(table.c.id.in_(list(self._running)), table.c.worker_id == self.worker_id)
+                            .values(heartbeat_at=datetime.datetime.now())
+                        )
+                    job_ids = await self._reclaim_expired(conn)
+                for job_id in job_ids:
+                    self._queue.put_nowait((job_id, db_engine))
+                if job_ids:
+                    logger.info(f"{len(job_ids)} analyses abandonnées relancées")
+            except Exception:
+                logger.exception("Échec du renouvellement des baux des analyses")
+
+    def is_full(self):
+        """Indiquer si une nouvelle tâche peut être acceptée."""
+        return self._queue is None or self._queue.qsize() >= self.queue_max
+
+    def submit(self, job_id, db_engine):
+        """
+        Placer une tâche enregistrée dans la file.
+
+        Raises:
+            AnalysisQueueFull: Si les workers ne sont pas démarrés ou la file est pleine
+        """
+        if self.is_full():
+            raise AnalysisQueueFull()
+        self._queue.put_nowait((job_id, db_engine))
+
+    async def _worker(self):
+        """Exécuter les tâches de la file, une à la fois."""
+        while True:
+            job_id, db_engine = await self._queue.get()
+            try:
+                await self.run_job(job_id, db_engine)
+            except Exception:
+                logger.exception(f"Échec de l'exécution de l'analyse {job_id}")
+            finally:
+                self._queue.task_done()
+
+    async def run_job(self, job_id, db_engine):
+        """Réserver une tâche en attente, l'exécuter et enregistrer son résultat."""
+        table = AnalysisJob.__table__
+        async with db_engine.begin() as conn:
+            claimed = await conn.execute(
+                update(table)
+                .where(table.c.id == job_id, table.c.status == JOB_PENDING)
+                .values(
+                    status=JOB_RUNNING,
+                    started_at=datetime.datetime.now(),
+                    worker_id=self.worker_id,
+                    heartbeat_at=datetime.datetime.now()
+                )
+            )
+            if claimed.rowcount != 1:
+                # Déjà exécutée (ou réservée par un autre processus)
+                return
+            parameters = (await conn.execute(select(table.c.parameters).where(table.c.id == job_id))).scalar_one()
+
+        self._running.add(job_id)
+        start = time.perf_counter()
+        try:
+            fingerprint, result = await execute_analysis(db_engine, parameters, self._executor)
+            response = build_analysis_response(job_id, parameters, result, time.perf_counter() - start)
+            await analysis_result_cache.set(result_cache_key(parameters, fingerprint), response)
+            values = {"status": JOB_SUCCEEDED, "result": response}
+        except LookupError as e:
+            values = {"status": JOB_FAILED, "error": str(e)}
+        except Exception as e:
+            values = {"status": JOB_FAILED, "error": f"Erreur lors de l'analyse des données: {str(e)}"}
+        finally:
+            self._running.discard(job_id)
+
+        async with db_engine.begin() as conn:
+            # Bail perdu (tâche relancée ailleurs) : le résultat de l'autre exécution prévaut
+            await conn.execute(
+                update(table)
+                .where(table.c.id == job_id, table.c.worker_id == self.worker_id)
+                .values(finished_at=datetime.datetime.now(), **values)
+            )
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, db, job_id, timeout=0):
+        """
+        Lire une tâche, en attendant au plus `timeout` secondes qu'elle se termine.
+
+        Returns:
+            AnalysisJob: Tâche lue en dernier, ou None si elle n'existe pas
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = (await db.execute(job_query(job_id))).scalar_one_or_none()
+            remaining = deadline - time.monotonic()
+            if job is None or job.status in FINISHED_STATUSES:
+                self._events.pop(job_id, None)
+                return job
+            if remaining <= 0:
+                return job
+            # Terminer la transaction de lecture pour voir la mise à jour
+            await db.commit()
+            event = self._events.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, JOB_POLL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+
+analysis_jobs = AnalysisJobManager()
@@ -0,0 +1,208 @@
+"""
+Analyses IA diffusées en Server-Sent Events.
+
+POST /api/ai/analyze/stream transmet chaque étape dès qu'elle est prête :
+
+- `statistics` : statistiques globales et par agence, métadonnées ;
+- `visualizations` : visualisations et leurs URL (si demandées) ;
+- `token` : fragments du rapport, au fil de la génération par le LLM ;
+- `done` : identifiant de l'analyse enregistrée (/api/ai/analyses/{id}) ;
+- `error` : échec de l'analyse.
+
+La place du flux dans le pool est réservée par la route avant la lecture des
+données (AnalysisStreams.reserve), puis libérée à la fin du flux, même si
+celui-ci n'a jamais démarré. Le service d'IA s'exécute dans un thread du
+pool des flux ; ses étapes sont remises à la boucle d'événements par une file. Si le client se déconnecte,
+le thread s'arrête au fragment suivant et ferme la connexion au
+fournisseur, ce qui interrompt la génération (et sa facturation).
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.responses import StreamingResponse
+from prometheus_client import Counter
+
+from src.api.analysis_jobs import (
+    analysis_result_cache, build_analysis_response, record_finished_job, result_cache_key, visualization_links
+)
+from src.ia.ai_service import ai_service
+
+logger = logging.getLogger(__name__)
+
+# Nombre de flux d'analyse simultanés par processus (au-delà : 503)
+ANALYSIS_STREAM_MAX = int(os.getenv("ANALYSIS_STREAM_MAX", "8"))
+
+ANALYSIS_STREAMS = Counter(
+    "analysis_streams_total",
+    "Analyses diffusées en flux, par issue (completed, cancelled, failed)",
+    ["outcome"],
+)
+
+_DONE = object()
+
+
+def format_event(event, data):
+    """Mettre en forme un événement Server-Sent Events (données en JSON)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def iterate_in_thread(iterator, executor):
+    """
+    Parcourir un générateur bloquant dans un thread.
+
+    L'arrêt du parcours (déconnexion, annulation) est signalé au thread, qui
+    ferme le générateur avant de produire l'élément suivant.
+
+    Args:
+        iterator: Générateur bloquant
+        executor: Pool de threads exécutant le générateur
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Boucle d'événements déjà fermée
+            stopped.set()
+
+    def produce():
+        try:
+            for item in iterator:
+                if stopped.is_set():
+                    break
+                put((item, None))
+        except Exception as e:
+            put((None, e))
+        finally:
+            iterator.close()
+            put((_DONE, None))
+
+    loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+class StreamSlot:
+    """Place réservée dans le pool des flux, libérée une seule fois."""
+
+    def __init__(self, streams):
+        self._streams = streams
+        self._released = False
+
+    def release(self):
+        """Libérer la place (sans effet si elle l'est déjà)."""
+        if not self._released:
+            self._released = True
+            self._streams.active -= 1
+
+
+class AnalysisStreamResponse(StreamingResponse):
+    """Flux d'une analyse, libérant sa place même si le générateur n'a pas démarré (déconnexion)."""
+
+    def __init__(self, content, slot, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.slot.release()
+
+
+class AnalysisStreams:
+    """Pool des analyses diffusées en flux d'un processus."""
+
+    def __init__(self, max_streams=ANALYSIS_STREAM_MAX):
+        self.max_streams = max_streams
+        self.active = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_streams, thread_name_prefix="analysis-stream")
+
+    def is_full(self):
+        """Indiquer si un nouveau flux peut être ouvert."""
+        return self.active >= self.max_streams
+
+    def reserve(self):
+        """
+        Réserver une place pour un nouveau flux.
+
+        La réservation est immédiate (sans attente) : des demandes simultanées
+        ne peuvent pas dépasser max_streams.
+
+        Returns:
+            StreamSlot: Place réservée, ou None si le pool est plein
+        """
+        if self.is_full():
+            return None
+        self.active += 1
+        return StreamSlot(self)
+
+    async def events(self, slot, db_engine, user_id, parameters, fingerprint, data):
+        """
+        Exécuter une analyse et produire ses événements Server-Sent Events.
+
+        L'analyse terminée est enregistrée comme une tâche réussie et placée
+        dans le cache des résultats.
+
+        Args:
+            slot: Place réservée par reserve(), libérée à la fin du flux
+            db_engine: Moteur asynchrone (la session de la requête est fermée pendant le flux)
+            user_id: Utilisateur ayant demandé l'analyse
+            parameters: Paramètres résolus de l'analyse (voir resolve_parameters)
+            fingerprint: Empreinte des données, lue avant `data`
+            data: Données à analyser (voir fetch_analysis_data)
+        """
+        started_at = datetime.datetime.now()
+        start = time.perf_counter()
+        outcome = "cancelled"
+        visualizations = []
+        try:
+            steps = ai_service.stream_analysis(
+                data, parameters.get("include_visualizations"), not parameters.get("bypass_cache")
+            )
+            async for step, payload in iterate_in_thread(steps, self._executor):
+                if step == "statistics":
+                    yield format_event("statistics", payload)
+                elif step == "visualizations":
+                    visualizations = visualization_links(payload)
+                    yield format_event("visualizations", [
+                        {"title": viz.title, "type": viz.type, "url": viz.url} for viz in visualizations
+                    ])
+                elif step == "token":
+                    yield format_event("token", {"text": payload})
+                elif step == "result":
+                    job_id = str(uuid.uuid4())
+                    execution_time = time.perf_counter() - start
+                    result = build_analysis_response(job_id, parameters, payload, execution_time, visualizations)
+                    await record_finished_job(db_engine, job_id, user_id, parameters, result, started_at)
+                    await analysis_result_cache.set(result_cache_key(parameters, fingerprint), result)
+                    yield format_event("done", {"id": job_id, "execution_time": execution_time})
+            outcome = "completed"
+        except Exception as e:
+            outcome = "failed"
+            logger.exception("Échec de l'analyse diffusée en flux")
+            yield format_event("error", {"detail": f"Erreur lors de l'analyse des données: {str(e)}"})
+        finally:
+            slot.release()
+            ANALYSIS_STREAMS.labels(outcome).inc()
+
+
+analysis_streams = AnalysisStreams()
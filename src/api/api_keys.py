@@ -0,0 +1,136 @@
+"""
+Clés d'API des clients machines (ETL, connecteurs BI).
+
+Une clé a la forme `brk_<préfixe>.<secret>`. Le préfixe, public, permet de
+retrouver la clé en base ; seul un HMAC-SHA256 de la clé complète est
+stocké. La vérification ne coûte qu'un calcul HMAC (quelques microsecondes),
+sans bcrypt.
+
+Chaque clé a des portées (read, ingest, ai) qui limitent les routes
+accessibles. Les compteurs d'utilisation sont accumulés en mémoire et
+écrits en base périodiquement (API_KEY_USAGE_FLUSH_SECONDS), hors du
+chemin des requêtes.
+"""
+import asyncio
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+
+from sqlalchemy import bindparam, update
+
+from src.db.models import ApiKey
+
+logger = logging.getLogger(__name__)
+
+# Clé secrète du HMAC (par défaut, la clé de signature des tokens)
+API_KEY_HMAC_SECRET = os.getenv(
+    "API_KEY_HMAC_SECRET",
+    os.getenv("API_SECRET_KEY", "secret-key-for-dev-only-change-in-production")
+)
+# Intervalle d'écriture des compteurs d'utilisation
+API_KEY_USAGE_FLUSH_SECONDS = float(os.getenv("API_KEY_USAGE_FLUSH_SECONDS", "10"))
+
+# Préfixe distinguant les clés d'API des tokens JWT
+API_KEY_MARKER = "brk_"
+
+# Portées des clés d'API
+SCOPE_READ = "read"
+SCOPE_INGEST = "ingest"
+SCOPE_AI = "ai"
+API_KEY_SCOPES = (SCOPE_READ, SCOPE_INGEST, SCOPE_AI)
+
+
+def hash_api_key(key):
+    """Calculer le HMAC-SHA256 (hexadécimal) d'une clé d'API."""
+    return hmac.new(API_KEY_HMAC_SECRET.encode(), key.encode(), hashlib.sha256).hexdigest()
+
+
+def generate_api_key():
+    """
+    Générer une nouvelle clé d'API.
+
+    Returns:
+        tuple: (clé complète, à transmettre au client ; préfixe ; hash à stocker)
+    """
+    prefix = secrets.token_hex(6)
+    key = f"{API_KEY_MARKER}{prefix}.{secrets.token_urlsafe(32)}"
+    return key, prefix, hash_api_key(key)
+
+
+def is_api_key(value):
+    """Indiquer si une valeur d'authentification est une clé d'API (et non un JWT)."""
+    return bool(value) and value.startswith(API_KEY_MARKER)
+
+
+def parse_api_key(key):
+    """Extraire le préfixe d'une clé d'API, ou None si la clé est mal formée."""
+    prefix, separator, secret = key[len(API_KEY_MARKER):].partition(".")
+    if not is_api_key(key) or not separator or not prefix or not secret:
+        return None
+    return prefix
+
+
+def verify_api_key(key, key_hash):
+    """Vérifier une clé d'API par rapport à son hash (comparaison à temps constant)."""
+    return hmac.compare_digest(hash_api_key(key), key_hash)
+
+
+def parse_scopes(value):
+    """
+    Lire une liste de portées séparées par des virgules.
+
+    Raises:
+        ValueError: Si une portée est inconnue
+    """
+    scopes = [scope.strip() for scope in value.split(",") if scope.strip()]
+    unknown = set(scopes) - set(API_KEY_SCOPES)
+    if unknown:
+        raise ValueError(f"Portées inconnues: {', '.join(sorted(unknown))}")
+    return scopes
+
+
+class ApiKeyUsage:
+    """Compteurs d'utilisation des clés d'API, accumulés en mémoire puis écrits en base."""
+
+    def __init__(self):
+        self._pending = {}
+
+    def record(self, key_id):
+        """Compter une utilisation de la clé."""
+        count, _ = self._pending.get(key_id, (0, None))
+        self._pending[key_id] = (count + 1, datetime.datetime.now())
+
+    async def flush(self, db_engine):
+        """Écrire en base les utilisations accumulées depuis la dernière écriture."""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        table = ApiKey.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("key_id"))
+            .values(usage_count=table.c.usage_count + bindparam("uses"), last_used_at=bindparam("used_at"))
+        )
+        async with db_engine.begin() as conn:
+            await conn.execute(statement, [
+                {"key_id": key_id, "uses": count, "used_at": used_at}
+                for key_id, (count, used_at) in pending.items()
+            ])
+
+    async def run(self, db_engine, interval=API_KEY_USAGE_FLUSH_SECONDS):
+        """Écrire les compteurs périodiquement, jusqu'à l'annulation de la tâche."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.flush(db_engine)
+                except Exception:
+                    logger.exception("Échec de l'écriture des compteurs des clés d'API")
+        finally:
+            await self.flush(db_engine)
+
+
+api_key_usage = ApiKeyUsage()
@@ -1,28 +1,72 @@
 """
 Module d'authentification pour l'API.
+
+Les utilisateurs actifs authentifiés sont mémorisés dans le processus
+(AUTH_USER_CACHE_TTL_SECONDS, AUTH_USER_CACHE_MAX_ENTRIES) : la table users
+n'est pas relue à chaque requête. Les clés du cache incluent le compteur de
+version `users` (voir src/db/versions.py), incrémenté par les scripts qui
+créent, modifient ou désactivent des utilisateurs ; le changement est vu au
+plus tard après DATA_VERSION_TTL_SECONDS.
+
+Avec AUTH_TRUST_TOKEN_CLAIMS, l'utilisateur est reconstruit à partir des
+informations signées du token, sans accès à la base : une désactivation ne
+prend alors effet qu'à l'expiration des tokens déjà émis.
+
+Les clients machines s'authentifient par clé d'API (voir api_keys.py), dans
+l'en-tête X-API-Key ou comme token Bearer, avec la même dépendance
+get_current_user ; les routes vérifient la portée requise (require_read,
+require_ingest, require_ai). Les utilisateurs authentifiés par token JWT
+disposent de toutes les portées.
+
+Le hachage et la vérification des mots de passe (bcrypt, coût BCRYPT_ROUNDS)
+s'exécutent dans un pool de threads borné (PASSWORD_HASH_WORKERS) pour ne
+pas bloquer la boucle d'événements. Un mot de passe haché avec un autre coût
+est haché à nouveau lors de la connexion.
 """
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.db.database import get_db
 from src.api.models import TokenData
-from src.db.models import User
+from src.api.cache import MemoryCache, users_version_tracker
+from src.api.api_keys import (
+    API_KEY_SCOPES, SCOPE_AI, SCOPE_INGEST, SCOPE_READ,
+    api_key_usage, is_api_key, parse_api_key, verify_api_key
+)
+from src.db.models import ApiKey, User
 
 # Configuration
 SECRET_KEY = os.getenv("API_SECRET_KEY", "secret-key-for-dev-only-change-in-production")
 ALGORITHM = os.getenv("API_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("API_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Coût bcrypt des nouveaux hachages (les hachages d'un autre coût sont mis à jour à la connexion)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Nombre de threads dédiés au hachage des mots de passe
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Cache des utilisateurs authentifiés (durée de vie 0 : cache désactivé)
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "1024"))
+# Faire confiance aux informations signées du token pendant sa durée de validité
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "false").strip().lower() in ("1", "true", "yes", "on")
 
 # Outils de sécurité
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token", auto_error=False)
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+# Utilisateurs actifs et clés d'API actives, par nom (ou préfixe) et version de la table users
+user_cache = MemoryCache(max_entries=AUTH_USER_CACHE_MAX_ENTRIES, ttl=AUTH_USER_CACHE_TTL_SECONDS)
 
 
 def verify_password(plain_password, hashed_password):
@@ -35,21 +79,81 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def get_user(db: Session, username: str):
+async def run_password_task(func, *args):
+    """Exécuter une opération de hachage dans le pool dédié, hors de la boucle d'événements."""
+    return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+
+
+async def hash_password(password):
+    """Générer un hash à partir d'un mot de passe, sans bloquer la boucle d'événements."""
+    return await run_password_task(get_password_hash, password)
+
+
+async def get_user(db: AsyncSession, username: str):
     """Récupérer un utilisateur par son nom d'utilisateur."""
-    return db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    """Authentifier un utilisateur avec son nom d'utilisateur et son mot de passe."""
-    user = get_user(db, username)
-    if not user:
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    """
+    Authentifier un utilisateur avec son nom d'utilisateur et son mot de passe.
+
+    Si le hash du mot de passe utilise un autre coût que BCRYPT_ROUNDS, il est
+    remplacé par un hash au coût courant.
+    """
+    user = await get_user(db, username)
+    if not user or not user.is_active:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await run_password_task(pwd_context.verify_and_update, password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+
+def _detached_user(user):
+    """Copie d'un utilisateur, indépendante de la session qui l'a chargé."""
+    return User(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        hashed_password=user.hashed_password,
+        is_active=user.is_active,
+        created_at=user.created_at
+    )
+
+
+async def get_active_user(db: AsyncSession, username: str):
+    """
+    Récupérer un utilisateur actif, depuis le cache si possible.
+
+    Returns:
+        User: Utilisateur actif, ou None s'il n'existe pas ou est désactivé
+    """
+    if AUTH_USER_CACHE_TTL_SECONDS <= 0:
+        user = await get_user(db, username)
+        return user if user and user.is_active else None
+
+    version, _ = await users_version_tracker.get(db)
+    key = f"{username}#v{version}"
+    user = await user_cache.get(key)
+    if user is None:
+        user = await get_user(db, username)
+        if user is None or not user.is_active:
+            return None
+        user = _detached_user(user)
+        await user_cache.set(key, user)
     return user
 
 
+def token_claims(user):
+    """Informations de l'utilisateur signées dans son token d'accès."""
+    return {"sub": user.username, "uid": user.id, "email": user.email}
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Créer un token d'accès JWT."""
     to_encode = data.copy()
@@ -62,13 +166,72 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Obtenir l'utilisateur actuel à partir du token JWT."""
+async def authenticate_api_key(db: AsyncSession, key: str):
+    """
+    Authentifier un client par sa clé d'API.
+
+    La clé et son utilisateur sont mémorisés comme les utilisateurs ; la
+    vérification se limite alors à un calcul HMAC.
+
+    Returns:
+        tuple: (utilisateur, portées de la clé), ou None si la clé est invalide
+    """
+    prefix = parse_api_key(key)
+    if prefix is None:
+        return None
+    version, _ = await users_version_tracker.get(db)
+    cache_key = f"api-key:{prefix}#v{version}"
+    entry = await user_cache.get(cache_key)
+    if entry is None:
+        result = await db.execute(
+            select(ApiKey, User).join(User, ApiKey.user_id == User.id).where(ApiKey.prefix == prefix)
+        )
+        row = result.first()
+        if row is None or not row.ApiKey.is_active or not row.User.is_active:
+            return None
+        scopes = frozenset(scope.strip() for scope in row.ApiKey.scopes.split(","))
+        entry = (row.ApiKey.id, row.ApiKey.key_hash, scopes, _detached_user(row.User))
+        await user_cache.set(cache_key, entry)
+
+    key_id, key_hash, scopes, user = entry
+    if not verify_api_key(key, key_hash):
+        return None
+    api_key_usage.record(key_id)
+    return user, scopes
+
+
+async def get_current_user(
+    request: Request,
+    token: Optional[str] = Depends(oauth2_scheme),
+    api_key: Optional[str] = Depends(api_key_header),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Obtenir l'utilisateur actuel à partir du token JWT ou de la clé d'API.
+
+    Les portées accordées sont enregistrées dans `request.state.scopes`.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Identification invalide",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if api_key is None and is_api_key(token):
+        api_key = token
+    if api_key is not None:
+        authenticated = await authenticate_api_key(db, api_key)
+        if authenticated is None:
+            raise credentials_exception
+        user, request.state.scopes = authenticated
+        return user
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    request.state.scopes = frozenset(API_KEY_SCOPES)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -77,7 +240,34 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username=token_data.username)
+    if AUTH_TRUST_TOKEN_CLAIMS and payload.get("uid") is not None:
+        # Utilisateur actif lors de l'émission du token
+        return User(id=payload["uid"], username=username, email=payload.get("email"), is_active=True)
+    user = await get_active_user(db, username=token_data.username)
     if user is None:
         raise credentials_exception
-    return user 
\ No newline at end of file
+    return user
+
+
+def require_scope(scope):
+    """
+    Créer une dépendance qui authentifie l'utilisateur et vérifie une portée.
+
+    Raises:
+        HTTPException: 403 si la clé d'API utilisée n'a pas la portée
+    """
+    async def dependency(request: Request, current_user: User = Depends(get_current_user)):
+        if scope not in request.state.scopes:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Portée requise: {scope}"
+            )
+        return current_user
+
+    return dependency
+
+
+# Dépendances des routes selon leur usage
+require_read = require_scope(SCOPE_READ)
+require_ingest = require_scope(SCOPE_INGEST)
+require_ai = require_scope(SCOPE_AI)
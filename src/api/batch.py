@@ -0,0 +1,125 @@
+"""
+Lecture et validation des lots de données bancaires.
+"""
+import json
+import os
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+
+from src.api.models import BankDataCreate
+
+# Nombre maximal d'enregistrements acceptés dans un lot
+BATCH_MAX_RECORDS = int(os.getenv("BATCH_MAX_RECORDS", "10000"))
+# Taille maximale du corps d'un lot, vérifiée avant son décodage (octets)
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(BATCH_MAX_RECORDS * 512)))
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+
+def _too_large(detail):
+    """Erreur 413 (lot trop grand)."""
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+async def read_batch_body(request):
+    """
+    Lire le corps d'un lot sans dépasser BATCH_MAX_BYTES.
+
+    Un Content-Length trop grand est refusé avant toute lecture ; sinon la
+    lecture s'arrête dès que la limite est franchie.
+
+    Raises:
+        HTTPException: 413 si le corps dépasse BATCH_MAX_BYTES
+    """
+    detail = f"Le corps d'un lot fait au plus {BATCH_MAX_BYTES} octets"
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > BATCH_MAX_BYTES:
+        raise _too_large(detail)
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > BATCH_MAX_BYTES:
+            raise _too_large(detail)
+    return bytes(body)
+
+
+def _load_items(body, content_type):
+    """
+    Décoder le corps d'un lot en liste d'éléments JSON.
+
+    Returns:
+        list: Couples (élément décodé, erreur de décodage ou None)
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        try:
+            lines = [line for line in body.decode("utf-8").splitlines() if line.strip()]
+        except UnicodeDecodeError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Le corps NDJSON doit être encodé en UTF-8"
+            )
+        # Nombre d'enregistrements vérifié avant le décodage des lignes
+        if len(lines) > BATCH_MAX_RECORDS:
+            raise _too_large(f"Un lot contient au plus {BATCH_MAX_RECORDS} enregistrements")
+        items = []
+        for line in lines:
+            try:
+                items.append((json.loads(line), None))
+            except ValueError as exc:
+                items.append((None, {"type": "json_invalid", "msg": str(exc)}))
+        return items
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Le corps doit être un tableau JSON ou du NDJSON"
+        )
+    if not isinstance(payload, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Le corps doit être un tableau JSON ou du NDJSON"
+        )
+    return [(item, None) for item in payload]
+
+
+def parse_batch_body(body, content_type=None):
+    """
+    Valider en une passe les enregistrements d'un lot.
+
+    Args:
+        body: Corps brut de la requête
+        content_type: En-tête Content-Type de la requête
+
+    Returns:
+        tuple: (enregistrements valides sous forme de dictionnaires,
+                position de chacun d'eux dans le lot,
+                erreurs {"index", "errors"} des enregistrements invalides)
+
+    Raises:
+        HTTPException: 400 si le corps est illisible, 413 si le lot est trop grand
+    """
+    items = _load_items(body, content_type)
+    if len(items) > BATCH_MAX_RECORDS:
+        raise _too_large(f"Un lot contient au plus {BATCH_MAX_RECORDS} enregistrements")
+
+    records = []
+    indexes = []
+    errors = []
+    for index, (item, decode_error) in enumerate(items):
+        if decode_error is not None:
+            errors.append({"index": index, "errors": [decode_error]})
+            continue
+        try:
+            records.append(BankDataCreate.model_validate(item).model_dump())
+            indexes.append(index)
+        except ValidationError as exc:
+            errors.append({
+                "index": index,
+                "errors": exc.errors(include_url=False, include_context=False),
+            })
+    return records, indexes, errors
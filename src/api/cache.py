@@ -0,0 +1,202 @@
+"""
+Cache des réponses de l'API.
+
+Les clés combinent la route, ses paramètres et la version des données
+(voir src/db/versions.py) : une écriture rend immédiatement inaccessibles
+les entrées calculées sur les anciennes données. La durée de vie (TTL) et
+le nombre d'entrées (LRU) bornent la mémoire occupée par les entrées
+devenues obsolètes.
+
+La version des données est elle-même mémorisée dans le processus pendant
+DATA_VERSION_TTL_SECONDS : les requêtes servies depuis le cache n'exécutent
+alors aucune requête SQL. Les écritures faites par l'API l'invalident
+immédiatement ; celles d'autres processus (ETL, autres workers) sont vues
+au plus tard après ce délai.
+
+Backends disponibles (variable CACHE_BACKEND) :
+- `memory` (par défaut) : cache propre à chaque processus ;
+- `redis` : cache partagé entre les workers (CACHE_URL, ex. le service
+  redis de docker-compose : docker compose --profile cache up -d redis) ;
+- `none` : cache désactivé.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    aioredis = None
+
+from src.db.database import AsyncSessionLocal
+from src.db.versions import BANK_DATA_VERSION, USERS_VERSION, data_version_query
+from src.api.singleflight import SingleFlight
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+# Préfixe des clés dans un cache partagé
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "bankreports:")
+# Durée pendant laquelle la version des données lue en base est réutilisée
+DATA_VERSION_TTL_SECONDS = float(os.getenv("DATA_VERSION_TTL_SECONDS", "1"))
+
+
+class MemoryCache:
+    """Cache LRU en mémoire avec durée de vie des entrées."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    async def get(self, key):
+        """Retourner la valeur associée à la clé, ou None si absente ou expirée."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value):
+        """Enregistrer une valeur en évinçant les entrées les moins récemment utilisées."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        """Vider le cache."""
+        self._entries.clear()
+
+
+class RedisCache:
+    """Cache partagé entre processus, stocké dans Redis (valeurs sérialisées en JSON)."""
+
+    def __init__(self, client=None, url=CACHE_URL, ttl=CACHE_TTL_SECONDS, prefix=CACHE_PREFIX):
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("Le backend de cache redis nécessite le paquet redis")
+            client = aioredis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key):
+        """Retourner la valeur associée à la clé, ou None si absente ou expirée."""
+        data = await self.client.get(self.prefix + key)
+        return json.loads(data) if data is not None else None
+
+    async def set(self, key, value):
+        """Enregistrer une valeur avec sa durée de vie (éviction LRU gérée par Redis)."""
+        await self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+
+    async def clear(self):
+        """Supprimer les entrées de ce cache."""
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+
+class NullCache:
+    """Cache désactivé."""
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value):
+        pass
+
+    async def clear(self):
+        pass
+
+
+def create_cache(backend=CACHE_BACKEND, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+    """Créer le backend de cache configuré."""
+    if backend == "redis":
+        return RedisCache(ttl=ttl)
+    if backend == "none":
+        return NullCache()
+    return MemoryCache(max_entries=max_entries, ttl=ttl)
+
+
+# Cache des réponses de l'API
+response_cache = create_cache()
+# Calculs des réponses absentes du cache, regroupés par clé
+response_flight = SingleFlight("response_cache")
+
+
+def make_cache_key(endpoint, params, version):
+    """Construire la clé de cache d'une route pour une version des données."""
+    encoded = "&".join(f"{name}={params[name]}" for name in sorted(params))
+    return f"{endpoint}?{encoded}#v{version}"
+
+
+class DataVersionTracker:
+    """Compteur de version (données bancaires par défaut), relu en base au plus une fois par TTL."""
+
+    def __init__(self, name=BANK_DATA_VERSION, ttl=DATA_VERSION_TTL_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self._value = None
+        self._expires_at = 0.0
+
+    async def get(self, db):
+        """
+        Retourner la version courante des données.
+
+        Returns:
+            tuple: (version, date de dernière modification ou None)
+        """
+        if self._value is None or time.monotonic() >= self._expires_at:
+            row = (await db.execute(data_version_query(self.name))).first()
+            self._value = (row.version, row.updated_at) if row else (0, None)
+            self._expires_at = time.monotonic() + self.ttl
+        return self._value
+
+    def invalidate(self):
+        """Forcer la relecture de la version (après une écriture de ce processus)."""
+        self._value = None
+
+
+data_version_tracker = DataVersionTracker()
+users_version_tracker = DataVersionTracker(USERS_VERSION)
+
+
+async def get_current_data_version(db):
+    """Lire la version courante des données bancaires."""
+    version, _ = await data_version_tracker.get(db)
+    return version
+
+
+async def cached_response(db, endpoint, params, compute):
+    """
+    Retourner la réponse en cache d'une route, ou la calculer et la mettre en cache.
+
+    Les requêtes simultanées qui ne trouvent pas la même entrée partagent un
+    seul calcul. Celui-ci s'exécute dans sa propre session, sur le moteur de
+    `db` : il ne dépend pas de la requête qui l'a lancé, dont la session peut
+    être fermée (client déconnecté) pendant que les autres attendent.
+
+    Args:
+        db: Session asynchrone de la requête
+        endpoint: Nom de la route
+        params: Paramètres qui déterminent la réponse
+        compute: Coroutine prenant une session et calculant la réponse
+            (sérialisable en JSON)
+    """
+    key = make_cache_key(endpoint, params, await get_current_data_version(db))
+    value = await response_cache.get(key)
+    if value is None:
+        async def compute_and_store():
+            async with AsyncSessionLocal(bind=db.bind) as session:
+                result = await compute(session)
+            await response_cache.set(key, result)
+            return result
+
+        value = await response_flight.do(key, compute_and_store)
+    return value
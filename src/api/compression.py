@@ -0,0 +1,246 @@
+"""
+Compression des réponses de l'API (gzip, brotli, zstd).
+
+Le codage est négocié avec l'en-tête Accept-Encoding du client parmi ceux
+disponibles (brotli et zstd nécessitent les paquets `brotli` et
+`zstandard`). Les réponses plus petites que COMPRESSION_MIN_SIZE, les types
+déjà compressés (images, Parquet...) et les chemins exclus ne sont pas
+compressés. Les réponses en flux (exports) sont compressées morceau par
+morceau, chaque morceau étant envoyé dès qu'il est produit.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    zstandard = None
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Taille minimale (octets) d'une réponse complète pour être compressée
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Codages proposés, par ordre de préférence du serveur
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# Préfixes de chemins jamais compressés (séparés par des virgules)
+COMPRESSION_EXCLUDED_PATHS = os.getenv("COMPRESSION_EXCLUDED_PATHS", "/api/ai/visualizations")
+
+# Types de contenu déjà compressés
+EXCLUDED_CONTENT_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/vnd.apache.parquet",
+)
+
+
+class _GzipEncoder:
+    """Compression gzip (zlib)."""
+
+    def __init__(self, level=COMPRESSION_GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=False):
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else output
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    """Compression brotli."""
+
+    def __init__(self, quality=COMPRESSION_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data, flush=False):
+        output = self._compressor.process(data)
+        return output + self._compressor.flush() if flush else output
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    """Compression zstd."""
+
+    def __init__(self, level=COMPRESSION_ZSTD_LEVEL):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data, flush=False):
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else output
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+def available_encoders():
+    """Codages utilisables (bibliothèque installée), par nom de Content-Encoding."""
+    encoders = {"gzip": _GzipEncoder}
+    if brotli is not None:
+        encoders["br"] = _BrotliEncoder
+    if zstandard is not None:
+        encoders["zstd"] = _ZstdEncoder
+    return encoders
+
+
+def negotiate_encoding(accept_encoding, preferred):
+    """
+    Choisir le codage selon Accept-Encoding (valeurs q) puis la préférence du serveur.
+
+    Args:
+        accept_encoding: Valeur de l'en-tête Accept-Encoding
+        preferred: Codages disponibles, par ordre de préférence
+
+    Returns:
+        str: Codage choisi, ou None pour ne pas compresser
+    """
+    weights = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in preferred:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """Middleware ASGI de compression des réponses HTTP."""
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, encodings=COMPRESSION_ENCODINGS,
+                 excluded_paths=COMPRESSION_EXCLUDED_PATHS):
+        self.app = app
+        self.minimum_size = minimum_size
+        encoders = available_encoders()
+        if isinstance(encodings, str):
+            encodings = encodings.split(",")
+        self.encoders = {name.strip(): encoders[name.strip()] for name in encodings if name.strip() in encoders}
+        if isinstance(excluded_paths, str):
+            excluded_paths = excluded_paths.split(",")
+        self.excluded_paths = tuple(path.strip() for path in excluded_paths if path.strip())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"), list(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding, self.encoders[encoding], self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Intercepte les messages ASGI d'une réponse pour en compresser le corps."""
+
+    def __init__(self, send, encoding, encoder_class, minimum_size):
+        self._send = send
+        self.encoding = encoding
+        self.encoder_class = encoder_class
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    def _is_compressible(self):
+        """Indiquer si la réponse retenue peut être compressée."""
+        headers = Headers(raw=self.start_message["headers"])
+        content_type = headers.get("content-type", "").lower()
+        return (
+            self.start_message["status"] not in (204, 304)
+            and "content-encoding" not in headers
+            and not content_type.startswith(EXCLUDED_CONTENT_TYPES)
+        )
+
+    def _mutable_headers(self):
+        """En-têtes modifiables de la réponse retenue."""
+        headers = MutableHeaders(raw=list(self.start_message["headers"]))
+        self.start_message["headers"] = headers.raw
+        return headers
+
+    def _weaken_etag(self, headers):
+        """
+        Rendre l'ETag faible : le corps envoyé dépend du codage négocié.
+
+        Appliqué à toute réponse dont le codage a été négocié, compressée ou
+        non (seuil de taille, 304), pour que le validateur reste stable.
+        """
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    def _set_headers(self, content_length=None):
+        """Adapter les en-têtes de la réponse au corps compressé."""
+        headers = self._mutable_headers()
+        headers["Content-Encoding"] = self.encoding
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        self._weaken_etag(headers)
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            if not self._is_compressible() or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                # Même validateur que les réponses compressées de cette ressource
+                self._weaken_etag(self._mutable_headers())
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+            self.encoder = self.encoder_class()
+            if not more_body:
+                # Réponse complète : compression en une fois
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                self._set_headers(len(compressed))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            # Réponse en flux : longueur inconnue
+            self._set_headers()
+            await self._send(self.start_message)
+
+        if more_body:
+            chunk = self.encoder.compress(body, flush=True)
+        else:
+            chunk = self.encoder.compress(body) + self.encoder.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,113 @@
+"""
+Requêtes conditionnelles (ETag / If-None-Match, Last-Modified / If-Modified-Since).
+
+L'ETag d'une réponse est dérivé de la version des données (voir cache.py)
+et des paramètres de la requête (ainsi que de la date du jour pour les
+statistiques dont la fenêtre se termine aujourd'hui). Lorsque le client présente un ETag encore
+valide, la réponse 304 est renvoyée avant toute requête SQL sur les données
+et toute sérialisation.
+"""
+import hashlib
+from datetime import date, datetime, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.database import get_db
+from src.db.models import User
+from src.api.auth import require_read
+from src.api.cache import data_version_tracker
+
+# En-têtes Cache-Control par type de route. Les réponses dépendent de
+# l'utilisateur authentifié : elles ne doivent pas être partagées.
+DATA_CACHE_CONTROL = "private, no-cache"
+STATS_CACHE_CONTROL = "private, max-age=5, must-revalidate"
+ANALYSIS_CACHE_CONTROL = "private, max-age=3600, immutable"
+
+
+def make_etag(*parts):
+    """Construire un ETag fort à partir des éléments qui déterminent la réponse."""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def format_http_date(value):
+    """Formater une date (naïve = heure locale) pour l'en-tête Last-Modified."""
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def _etag_matches(if_none_match, etag):
+    """Comparer If-None-Match à un ETag (comparaison faible, RFC 9110)."""
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified_since(if_modified_since, last_modified):
+    """Indiquer si la ressource n'a pas changé depuis la date If-Modified-Since."""
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        # Fuseau « -0000 » (RFC 5322) : heure UTC
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+
+
+def check_conditional(request, response, etag, last_modified=None, cache_control=DATA_CACHE_CONTROL):
+    """
+    Ajouter les en-têtes de validation et répondre 304 si le client est à jour.
+
+    If-None-Match est prioritaire sur If-Modified-Since.
+
+    Raises:
+        HTTPException: 304 Not Modified (sans corps)
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_http_date(last_modified)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        not_modified = (
+            if_modified_since is not None
+            and last_modified is not None
+            and _not_modified_since(if_modified_since, last_modified)
+        )
+    if not_modified:
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+
+def conditional_data_route(cache_control=DATA_CACHE_CONTROL, moving_window=False):
+    """
+    Créer une dépendance de requête conditionnelle pour une route de données bancaires.
+
+    L'ETag combine le chemin, les paramètres de requête et la version des
+    données. La dépendance s'exécute après l'authentification.
+
+    Args:
+        moving_window: La fenêtre par défaut de la route se termine aujourd'hui :
+                       l'ETag inclut la date du jour et Last-Modified vaut au
+                       moins minuit, la réponse change au changement de jour
+    """
+    async def dependency(
+        request: Request,
+        response: Response,
+        current_user: User = Depends(require_read),
+        db: AsyncSession = Depends(get_db)
+    ):
+        version, updated_at = await data_version_tracker.get(db)
+        parts = [request.url.path, sorted(request.query_params.multi_items()), version]
+        if moving_window:
+            today = date.today()
+            parts.append(today.isoformat())
+            midnight = datetime.combine(today, time.min)
+            updated_at = max(updated_at, midnight) if updated_at is not None else midnight
+        check_conditional(request, response, make_etag(*parts), updated_at, cache_control)
+
+    return dependency
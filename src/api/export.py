@@ -0,0 +1,207 @@
+"""
+Export en flux des données bancaires.
+
+Les lignes sont lues par lots depuis un curseur côté serveur et sérialisées
+au fil de l'eau : la mémoire utilisée ne dépend pas du nombre de lignes
+exportées. Formats disponibles : NDJSON, CSV, Arrow IPC et Parquet
+(ces deux derniers nécessitent pyarrow).
+"""
+import csv
+import io
+import json
+
+from fastapi import HTTPException, status
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    pa = None
+    pq = None
+
+from src.db.queries import BANK_DATA_COLUMNS
+
+# Nombre de lignes lues puis sérialisées à chaque lot
+EXPORT_BATCH_SIZE = 10000
+
+# Colonnes exportées, dans l'ordre
+EXPORT_COLUMNS = BANK_DATA_COLUMNS
+
+# Type MIME et extension de fichier de chaque format
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Types MIME acceptés dans l'en-tête Accept
+ACCEPT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json": "ndjson",
+    "text/csv": "csv",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+ARROW_FORMATS = ("arrow", "parquet")
+
+
+def negotiate_format(export_format=None, accept=None):
+    """
+    Choisir le format d'export à partir du paramètre `format` ou de l'en-tête Accept.
+
+    Le paramètre `format` est prioritaire. Sans préférence exploitable, NDJSON
+    est utilisé.
+
+    Raises:
+        HTTPException: 406 si aucun format demandé n'est disponible
+    """
+    if export_format:
+        chosen = export_format
+    else:
+        chosen = None
+        wildcard = not accept
+        for media_range in (accept or "").split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            if media_type in ACCEPT_TYPES:
+                chosen = ACCEPT_TYPES[media_type]
+                break
+            if media_type in ("*/*", "application/*", "text/*"):
+                wildcard = True
+        if chosen is None:
+            if not wildcard:
+                raise HTTPException(
+                    status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                    detail=f"Formats disponibles: {', '.join(EXPORT_FORMATS)}"
+                )
+            chosen = "ndjson"
+
+    if chosen in ARROW_FORMATS and pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Le format {chosen} nécessite pyarrow"
+        )
+    return chosen
+
+
+def _column_names():
+    """Noms des colonnes exportées."""
+    return [column.key for column in EXPORT_COLUMNS]
+
+
+def _to_ndjson(rows):
+    """Sérialiser un lot de lignes en NDJSON."""
+    names = _column_names()
+    return "".join(
+        json.dumps(dict(zip(names, row)), default=lambda value: value.isoformat()) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _to_csv(rows, header=False):
+    """Sérialiser un lot de lignes en CSV (avec l'en-tête pour le premier lot)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(_column_names())
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Fichier en écriture seule dont le contenu est récupéré par morceaux."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        """Retourner les octets écrits depuis le dernier appel."""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema():
+    """Schéma Arrow des colonnes exportées."""
+    return pa.schema([
+        ("id", pa.int64()),
+        ("agence", pa.string()),
+        ("date", pa.date32()),
+        ("montant", pa.float64()),
+        ("nombre_transactions", pa.int64()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+
+def _to_record_batch(rows, schema):
+    """Convertir un lot de lignes en RecordBatch Arrow."""
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+async def stream_export(db_engine, query, export_format, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Générer le contenu d'un export à partir d'un curseur côté serveur.
+
+    La connexion est ouverte par le générateur lui-même : la session de la
+    requête est déjà fermée lorsque la réponse est envoyée.
+
+    Args:
+        db_engine: Moteur asynchrone de la base
+        query: Requête sélectionnant EXPORT_COLUMNS
+        export_format: Format retourné par negotiate_format
+        batch_size: Nombre de lignes sérialisées par lot
+    """
+    async with db_engine.connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=batch_size))
+
+        if export_format in ARROW_FORMATS:
+            schema = _arrow_schema()
+            sink = _ChunkSink()
+            if export_format == "arrow":
+                writer = pa.ipc.new_stream(sink, schema)
+            else:
+                writer = pq.ParquetWriter(sink, schema)
+            async for rows in result.partitions():
+                batch = _to_record_batch(rows, schema)
+                if export_format == "arrow":
+                    writer.write_batch(batch)
+                else:
+                    # Un groupe de lignes Parquet par lot
+                    writer.write_table(pa.Table.from_batches([batch]))
+                yield sink.drain()
+            writer.close()
+            yield sink.drain()
+            return
+
+        first = True
+        async for rows in result.partitions():
+            if export_format == "csv":
+                yield _to_csv(rows, header=first)
+            else:
+                yield _to_ndjson(rows)
+            first = False
+        if first and export_format == "csv":
+            # Export vide : seulement l'en-tête
+            yield _to_csv([], header=True)
@@ -15,6 +15,7 @@ class AnalysisRequest(BaseModel):
     agence: Optional[str] = Field(None, description="Nom de l'agence à analyser (toutes les agences si non spécifié)")
     format: Optional[str] = Field("markdown", description="Format du rapport (markdown ou html)")
     include_visualizations: Optional[bool] = Field(True, description="Inclure des visualisations dans l'analyse")
+    bypass_cache: Optional[bool] = Field(False, description="Régénérer l'analyse sans consulter les caches (résultats et réponses du LLM)")
 
 
 class Visualization(BaseModel):
@@ -64,4 +65,18 @@ class SavedAnalysisList(BaseModel):
     Modèle pour une liste d'analyses sauvegardées.
     """
     analyses: List[SavedAnalysis] = Field(..., description="Liste des analyses sauvegardées")
-    count: int = Field(..., description="Nombre total d'analyses disponibles") 
\ No newline at end of file
+    count: int = Field(..., description="Nombre total d'analyses disponibles")
+
+
+class AnalysisJobResponse(BaseModel):
+    """
+    Modèle pour l'état d'une analyse exécutée en arrière-plan.
+    """
+    id: str = Field(..., description="Identifiant de la tâche (et de l'analyse produite)")
+    status: str = Field(..., description="État de la tâche (pending, running, succeeded ou failed)")
+    created_at: datetime = Field(..., description="Date de soumission")
+    started_at: Optional[datetime] = Field(None, description="Début de l'exécution")
+    finished_at: Optional[datetime] = Field(None, description="Fin de l'exécution")
+    error: Optional[str] = Field(None, description="Message d'erreur si la tâche a échoué")
+    result: Optional[AnalysisResponse] = Field(None, description="Analyse produite si la tâche a réussi")
+
@@ -1,160 +1,230 @@
 """
 Routes de l'API pour l'IA.
+
+Les analyses sont exécutées en arrière-plan (voir analysis_jobs.py) :
+POST /ai/analyze retourne l'identifiant d'une tâche à suivre sur
+/ai/jobs/{id}. Une analyse identique sur des données inchangées est servie
+depuis le cache des résultats : la tâche est alors déjà terminée (200).
+POST /ai/analyze/stream diffuse l'analyse en Server-Sent Events (voir
+analysis_stream.py).
 """
+import datetime
 import uuid
-import time
 from typing import List, Optional
-from datetime import date, datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Path, Request, Response
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.db.database import get_db
-from src.db.models import BankData, User
-from src.api.auth import get_current_user
+from src.db.models import AnalysisJob, User
+from src.api.auth import require_ai
+from src.api.conditional import check_conditional, make_etag, ANALYSIS_CACHE_CONTROL
+from src.api.analysis_stream import AnalysisStreamResponse, analysis_streams
+from src.api.analysis_jobs import (
+    analysis_jobs, data_fingerprint, fetch_analysis_data, get_cached_result, job_header_query, job_query,
+    resolve_parameters,
+    AnalysisQueueFull, ANALYSIS_JOB_MAX_WAIT_SECONDS, JOB_FAILED, JOB_PENDING, JOB_SUCCEEDED
+)
 from src.api.ia_models import (
     AnalysisRequest, 
     AnalysisResponse, 
-    Visualization, 
+    AnalysisJobResponse,
     AnalysisMetadata,
     SavedAnalysis,
     SavedAnalysisList
 )
-from src.ia.ai_service import ai_service
 
 # Créer un router pour les routes d'IA
 router = APIRouter(prefix="/ai", tags=["ai"])
 
-# Dictionnaire en mémoire pour stocker les analyses (dans un vrai système, ce serait en base de données)
-analyses_store = {}
 
-
-@router.post("/analyze", response_model=AnalysisResponse)
+@router.post("/analyze", response_model=AnalysisJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def analyze_bank_data(
     request: AnalysisRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: User = Depends(require_ai),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Analyser les données bancaires avec l'IA et générer un rapport.
+    Demander une analyse des données bancaires par l'IA.
+    
+    L'analyse s'exécute en arrière-plan : suivre la tâche retournée sur
+    `/api/ai/jobs/{id}` (en-tête Location). Si la même analyse a déjà été
+    produite sur les mêmes données, la tâche retournée est terminée (200).
     
     - **start_date**: Date de début pour l'analyse (optionnelle)
     - **end_date**: Date de fin pour l'analyse (optionnelle)
     - **agence**: Nom de l'agence à analyser (toutes si non spécifié)
     - **format**: Format du rapport (markdown ou html)
     - **include_visualizations**: Inclure des visualisations
+    - **bypass_cache**: Ignorer les résultats et réponses LLM en cache
     """
-    start_time = time.time()
-    
-    # Paramètres par défaut
-    if not request.start_date:
-        request.start_date = datetime.now().date() - timedelta(days=30)
-    if not request.end_date:
-        request.end_date = datetime.now().date()
+    parameters = resolve_parameters(request)
+    cached = await get_cached_result(db, parameters)
+    if cached is not None:
+        job_id = str(uuid.uuid4())
+        now = datetime.datetime.now()
+        job = AnalysisJob(
+            id=job_id,
+            user_id=current_user.id,
+            status=JOB_SUCCEEDED,
+            parameters=parameters,
+            result={**cached, "id": job_id},
+            created_at=now,
+            started_at=now,
+            finished_at=now
+        )
+        db.add(job)
+        await db.commit()
+        response.status_code = status.HTTP_200_OK
+        response.headers["Location"] = f"/api/ai/jobs/{job.id}"
+        return job
+
+    queue_full = HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Trop d'analyses en attente, réessayez plus tard",
+        headers={"Retry-After": "30"}
+    )
+    if analysis_jobs.is_full():
+        raise queue_full
     
-    # Construire la requête pour extraire les données
-    query = db.query(BankData).filter(
-        BankData.date >= request.start_date,
-        BankData.date <= request.end_date
+    job = AnalysisJob(
+        id=str(uuid.uuid4()),
+        user_id=current_user.id,
+        status=JOB_PENDING,
+        parameters=parameters
     )
+    db.add(job)
+    await db.commit()
+    try:
+        analysis_jobs.submit(job.id, db.bind)
+    except AnalysisQueueFull:
+        # File remplie par des demandes concurrentes pendant l'enregistrement :
+        # la tâche ne sera pas exécutée, elle ne doit pas rester en attente
+        job.status = JOB_FAILED
+        job.error = queue_full.detail
+        job.finished_at = datetime.datetime.now()
+        await db.commit()
+        raise queue_full
     
-    if request.agence:
-        query = query.filter(BankData.agence == request.agence)
+    response.headers["Location"] = f"/api/ai/jobs/{job.id}"
+    return job
+
+
+@router.post("/analyze/stream")
+async def stream_bank_data_analysis(
+    request: AnalysisRequest,
+    current_user: User = Depends(require_ai),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Analyser les données bancaires en diffusant le résultat (Server-Sent Events).
     
-    # Récupérer les données
-    bank_data = query.all()
+    Événements, dans l'ordre : `statistics`, `visualizations` (si demandées),
+    `token` (fragments du rapport, au fil de la génération), puis `done`
+    (identifiant de l'analyse enregistrée) ou `error`. La génération est
+    interrompue si le client se déconnecte.
     
-    if not bank_data:
+    Mêmes paramètres que `/api/ai/analyze`.
+    """
+    # Place réservée avant toute attente : une rafale ne dépasse pas ANALYSIS_STREAM_MAX
+    slot = analysis_streams.reserve()
+    if slot is None:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Aucune donnée trouvée pour les critères spécifiés"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Trop d'analyses en cours, réessayez plus tard",
+            headers={"Retry-After": "30"}
         )
     
-    # Convertir les modèles SQLAlchemy en dictionnaires
-    data_dicts = [
-        {
-            "agence": item.agence,
-            "date": item.date,
-            "montant": item.montant,
-            "nombre_transactions": item.nombre_transactions
-        }
-        for item in bank_data
-    ]
-    
     try:
-        # Appeler le service d'IA pour analyser les données
-        result = ai_service.analyze_bank_data(data_dicts)
-        
-        # Formater les visualisations pour la réponse
-        visualizations = []
-        if request.include_visualizations and "visualizations" in result:
-            for viz in result["visualizations"]:
-                # Ajouter une URL pour accéder à l'image
-                viz_id = str(uuid.uuid4())
-                visualizations.append(Visualization(
-                    path=viz["path"],
-                    title=viz["title"],
-                    type=viz["type"],
-                    url=f"/api/ai/visualizations/{viz_id}"
-                ))
-        
-        # Calculer le temps d'exécution
-        execution_time = time.time() - start_time
-        
-        # Créer l'ID unique pour cette analyse
-        analysis_id = str(uuid.uuid4())
-        
-        # Préparer la réponse
-        response = AnalysisResponse(
-            report=result["report"],
-            visualizations=visualizations,
-            metadata=AnalysisMetadata(
-                timestamp=datetime.fromisoformat(result["metadata"]["timestamp"]),
-                data_points=result["metadata"]["data_points"],
-                date_range=result["metadata"]["date_range"],
-                agencies=result["metadata"]["agencies"],
-                execution_time=execution_time,
-                model_used="GPT-3.5" if not ai_service.use_alternative_api else "Mistral-7B"
-            ),
-            id=analysis_id
+        parameters = resolve_parameters(request)
+        # Empreinte lue avant les données (voir execute_analysis)
+        fingerprint = await data_fingerprint(db, parameters)
+        try:
+            data = await fetch_analysis_data(db, parameters)
+        except LookupError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except BaseException:
+        slot.release()
+        raise
+    
+    return AnalysisStreamResponse(
+        analysis_streams.events(slot, db.bind, current_user.id, parameters, fingerprint, data),
+        slot,
+        media_type="text/event-stream",
+        # Pas de mise en mémoire tampon par les proxys (nginx)
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def check_job_access(job, current_user):
+    """
+    Vérifier qu'une tâche (ou son en-tête, voir job_header_query) appartient à l'utilisateur.
+
+    Raises:
+        HTTPException: 404 si la tâche n'existe pas, 403 si elle appartient à un autre utilisateur
+    """
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analyse non trouvée"
         )
-        
-        # Stocker l'analyse pour référence future
-        analyses_store[analysis_id] = {
-            "id": analysis_id,
-            "created_at": datetime.now(),
-            "query_parameters": request.dict(),
-            "result": response.dict(),
-            "user_id": current_user.id
-        }
-        
-        return response
-        
-    except Exception as e:
+    if job.user_id != current_user.id:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erreur lors de l'analyse des données: {str(e)}"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Vous n'êtes pas autorisé à accéder à cette analyse"
         )
+    return job
+
+
+async def get_user_job(db, job_id, current_user, wait=0):
+    """
+    Lire une tâche de l'utilisateur, en attendant éventuellement sa fin.
+
+    Raises:
+        HTTPException: 404 si la tâche n'existe pas, 403 si elle appartient à un autre utilisateur
+    """
+    return check_job_access(await analysis_jobs.wait(db, job_id, wait), current_user)
+
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(
+    job_id: str = Path(..., description="ID de la tâche d'analyse"),
+    wait: float = Query(0, ge=0, le=ANALYSIS_JOB_MAX_WAIT_SECONDS, description="Attente maximale de la fin de la tâche (secondes)"),
+    current_user: User = Depends(require_ai),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Suivre une tâche d'analyse.
+    
+    - **job_id**: ID retourné par `/api/ai/analyze`
+    - **wait**: Attendre au plus ce nombre de secondes que la tâche se termine
+    """
+    return await get_user_job(db, job_id, current_user, wait)
 
 
 @router.get("/analyses", response_model=SavedAnalysisList)
 async def list_analyses(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_ai),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Lister les analyses précédemment générées.
     """
-    # Filtrer les analyses pour l'utilisateur courant
+    result = await db.execute(
+        select(AnalysisJob)
+        .where(AnalysisJob.user_id == current_user.id, AnalysisJob.status == JOB_SUCCEEDED)
+        .order_by(AnalysisJob.created_at)
+    )
     user_analyses = [
         SavedAnalysis(
-            id=analysis["id"],
-            created_at=analysis["created_at"],
-            query_parameters=AnalysisRequest(**analysis["query_parameters"]),
-            metadata=AnalysisMetadata(**analysis["result"]["metadata"])
+            id=job.id,
+            created_at=job.created_at,
+            query_parameters=AnalysisRequest(**job.parameters),
+            metadata=AnalysisMetadata(**job.result["metadata"])
         )
-        for analysis_id, analysis in analyses_store.items()
-        if analysis["user_id"] == current_user.id
+        for job in result.scalars()
     ]
     
     return SavedAnalysisList(
@@ -165,36 +235,43 @@ async def list_analyses(
 
 @router.get("/analyses/{analysis_id}", response_model=AnalysisResponse)
 async def get_analysis(
+    request: Request,
+    response: Response,
     analysis_id: str = Path(..., description="ID de l'analyse à récupérer"),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_ai),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Récupérer une analyse précédemment générée.
     
     - **analysis_id**: ID unique de l'analyse
+    
+    Le résultat, volumineux, n'est lu qu'après la vérification de l'ETag :
+    une réponse 304 ne charge que l'en-tête de la tâche.
     """
-    if analysis_id not in analyses_store:
+    job = check_job_access((await db.execute(job_header_query(analysis_id))).first(), current_user)
+    if job.status != JOB_SUCCEEDED:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Analyse non trouvée"
         )
     
-    analysis = analyses_store[analysis_id]
-    
-    # Vérifier que l'utilisateur a accès à cette analyse
-    if analysis["user_id"] != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Vous n'êtes pas autorisé à accéder à cette analyse"
-        )
-    
-    return AnalysisResponse(**analysis["result"])
+    # Une analyse n'est jamais modifiée : son ETag ne dépend que de son identité
+    check_conditional(
+        request, response,
+        make_etag(analysis_id, job.created_at.isoformat()),
+        job.created_at,
+        ANALYSIS_CACHE_CONTROL
+    )
+    result = (await db.execute(select(AnalysisJob.result).where(AnalysisJob.id == analysis_id))).scalar_one()
+    return AnalysisResponse(**result)
 
 
 @router.get("/visualizations/{visualization_id}")
 async def get_visualization(
     visualization_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_ai),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Récupérer une visualisation par son ID.
@@ -206,11 +283,15 @@ async def get_visualization(
     # l'ID de visualisation et le chemin de fichier
     
     # Pour l'instant, nous retournons simplement la première visualisation trouvée pour l'utilisateur
-    for analysis_id, analysis in analyses_store.items():
-        if analysis["user_id"] == current_user.id:
-            for viz in analysis["result"].get("visualizations", []):
-                # Ici on ne vérifie pas l'ID, juste le premier fichier trouvé
-                return FileResponse(viz["path"])
+    result = await db.execute(
+        select(AnalysisJob.result)
+        .where(AnalysisJob.user_id == current_user.id, AnalysisJob.status == JOB_SUCCEEDED)
+        .order_by(AnalysisJob.created_at)
+    )
+    for analysis in result.scalars():
+        for viz in analysis.get("visualizations", []):
+            # Ici on ne vérifie pas l'ID, juste le premier fichier trouvé
+            return FileResponse(viz["path"])
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
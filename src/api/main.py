@@ -2,17 +2,26 @@
 Module principal de l'API FastAPI.
 """
 import os
+import asyncio
+import logging
+from contextlib import suppress
 from typing import List
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Response
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from src.db.database import get_db
+from src.db.database import get_db, engine, async_engine, log_database_settings
 from src.api.models import BankDataResponse
 from src.api.auth import get_current_user
 from src.api.routes import router as api_router
 from src.api.ia_routes import router as ia_router
+from src.api.compression import CompressionMiddleware
+from src.api.api_keys import api_key_usage
+from src.api.analysis_jobs import analysis_jobs
+
+logger = logging.getLogger(__name__)
 
 # Créer l'application FastAPI
 app = FastAPI(
@@ -30,8 +39,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Compresser les réponses (gzip, brotli, zstd selon Accept-Encoding)
+app.add_middleware(CompressionMiddleware)
+
+@app.on_event("startup")
+async def report_database_settings():
+    """Afficher la configuration de la base de données au démarrage."""
+    log_database_settings(engine)
+
+@app.on_event("startup")
+async def start_api_key_usage_flush():
+    """Écrire périodiquement en base les compteurs d'utilisation des clés d'API."""
+    app.state.api_key_usage_task = asyncio.create_task(api_key_usage.run(async_engine))
+
+@app.on_event("startup")
+async def start_analysis_workers():
+    """Démarrer les workers des analyses IA et relancer les tâches non terminées."""
+    analysis_jobs.start(async_engine)
+    try:
+        await analysis_jobs.recover(async_engine)
+    except Exception:
+        logger.exception("Impossible de relancer les analyses en attente")
+
+@app.on_event("shutdown")
+async def stop_analysis_workers():
+    """Arrêter les workers des analyses IA."""
+    await analysis_jobs.stop()
+
+@app.on_event("shutdown")
+async def stop_api_key_usage_flush():
+    """Arrêter l'écriture périodique (les compteurs restants sont écrits)."""
+    task = app.state.api_key_usage_task
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
 # Inclure les routes de l'API
 app.include_router(api_router, prefix="/api", tags=["api"])
 
@@ -53,4 +98,9 @@ async def health_check():
     """Vérifier l'état de santé de l'API."""
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Exposer les métriques Prometheus du processus."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Pour démarrer l'API en local : uvicorn src.api.main:app --reload 
\ No newline at end of file
@@ -1,9 +1,9 @@
 """
 Modèles Pydantic pour l'API.
 """
-from typing import List, Optional, Union
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 from datetime import date, datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class BankDataBase(BaseModel):
@@ -29,6 +29,121 @@ class BankDataResponse(BankDataBase):
         from_attributes = True
 
 
+class BankDataBatchError(BaseModel):
+    """Erreurs de validation d'un enregistrement d'un lot."""
+    index: int
+    errors: List[dict]
+
+
+class BankDataBatchResult(BaseModel):
+    """Résultat de l'insertion d'un lot de données bancaires."""
+    inserted: int
+    updated: int
+    errors: List[BankDataBatchError]
+
+
+class TimeseriesPoint(BaseModel):
+    """Point d'une série temporelle (période sans données : valeurs à zéro)."""
+    period_start: date
+    montant_total: float
+    transactions_total: int
+    nombre_entrees: int
+
+
+class TimeseriesResponse(BaseModel):
+    """Série temporelle continue des données bancaires."""
+    granularity: str
+    agence: Optional[str] = None
+    points: List[TimeseriesPoint]
+
+
+class PivotResponse(BaseModel):
+    """Matrice agence x période au format colonnes (valeurs à plat, ligne par agence)."""
+    granularity: str
+    metric: str
+    agences: List[str]
+    periods: List[date]
+    shape: List[int]
+    # Flottants pour montant_total, entiers pour transactions_total et nombre_entrees
+    values: List[Union[int, float]]
+
+
+Granularity = Literal["day", "week", "month", "quarter"]
+Metric = Literal["montant_total", "transactions_total", "nombre_entrees"]
+
+
+class DashboardSubQuery(BaseModel):
+    """Base des sous-requêtes d'un tableau de bord."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    name: str = Field(..., description="Nom du résultat dans la réponse")
+
+
+class StatsByAgenceQuery(DashboardSubQuery):
+    """Statistiques par agence (comme GET /bank-data/stats/by-agence)."""
+    type: Literal["stats_by_agence"]
+
+
+class StatsByDateQuery(DashboardSubQuery):
+    """Statistiques par date (comme GET /bank-data/stats/by-date)."""
+    type: Literal["stats_by_date"]
+    days: int = Field(30, ge=0, le=36500)
+
+
+class TimeseriesQuery(DashboardSubQuery):
+    """Série temporelle (comme GET /bank-data/stats/timeseries)."""
+    type: Literal["timeseries"]
+    granularity: Granularity = "day"
+    agence: Optional[str] = None
+    date_from: Optional[date] = Field(None, alias="from")
+    date_to: Optional[date] = Field(None, alias="to")
+
+
+class PivotQuery(DashboardSubQuery):
+    """Matrice agence x période (comme GET /bank-data/stats/pivot)."""
+    type: Literal["pivot"]
+    granularity: Granularity = "week"
+    metric: Metric = "montant_total"
+    date_from: Optional[date] = Field(None, alias="from")
+    date_to: Optional[date] = Field(None, alias="to")
+
+
+class TopAgencesQuery(DashboardSubQuery):
+    """Agences classées par valeur décroissante d'une mesure."""
+    type: Literal["top_agences"]
+    metric: Metric = "montant_total"
+    limit: int = Field(5, ge=1, le=100)
+    date_from: Optional[date] = Field(None, alias="from")
+    date_to: Optional[date] = Field(None, alias="to")
+
+
+class BankDataListQuery(DashboardSubQuery):
+    """Liste filtrée de données bancaires (comme GET /bank-data)."""
+    type: Literal["bank_data"]
+    agence: Optional[str] = None
+    date_debut: Optional[date] = None
+    date_fin: Optional[date] = None
+    skip: int = Field(0, ge=0)
+    limit: int = Field(100, ge=1, le=1000)
+
+
+DashboardQuery = Annotated[
+    Union[StatsByAgenceQuery, StatsByDateQuery, TimeseriesQuery, PivotQuery, TopAgencesQuery, BankDataListQuery],
+    Field(discriminator="type")
+]
+
+
+class DashboardRequest(BaseModel):
+    """Ensemble de sous-requêtes exécutées en un seul appel."""
+    queries: List[DashboardQuery] = Field(..., min_length=1)
+
+
+class DashboardResponse(BaseModel):
+    """Résultats des sous-requêtes, par nom (et erreurs éventuelles, par nom)."""
+    results: Dict[str, Any]
+    errors: Dict[str, str] = {}
+
+
 class UserBase(BaseModel):
     """Modèle de base pour les utilisateurs."""
     username: str
@@ -0,0 +1,38 @@
+"""
+Pagination par curseur (keyset) pour les routes de l'API.
+
+Le curseur est opaque pour les clients : il encode la clé de tri
+(date, id) de la dernière ligne renvoyée.
+"""
+import base64
+import json
+from datetime import date
+
+from fastapi import HTTPException, status
+
+# En-tête de réponse contenant le curseur de la page suivante
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(row_date, row_id):
+    """Encoder la clé (date, id) d'une ligne en curseur opaque."""
+    payload = json.dumps([row_date.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Décoder un curseur opaque en clé (date, id).
+
+    Raises:
+        HTTPException: 400 si le curseur est invalide
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        row_date, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return date.fromisoformat(row_date), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Curseur de pagination invalide"
+        )
@@ -1,32 +1,54 @@
 """
 Routes de l'API.
 """
-from typing import List, Optional
+import os
+from typing import List, Literal, Optional
 from datetime import date, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
-from src.db.database import get_db
+from src.db.database import get_db, begin_read_snapshot
 from src.db.models import BankData, User
-from src.api.models import BankDataResponse, BankDataCreate, UserResponse, UserCreate, Token
-from src.api.auth import authenticate_user, create_access_token, get_current_user, get_password_hash
+from src.db.queries import BANK_DATA_COLUMNS, bank_data_query, keyset_page_query
+from src.api.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from src.api.export import EXPORT_COLUMNS, EXPORT_FORMATS, negotiate_format, stream_export
+from src.api.models import (
+    BankDataResponse, BankDataCreate, BankDataBatchResult, TimeseriesResponse, PivotResponse,
+    DashboardRequest, DashboardResponse,
+    UserResponse, UserCreate, Token
+)
+from src.api.batch import parse_batch_body, read_batch_body
+from src.api.serialization import rows_response
+from src.api import aggregates
+from src.api.cache import cached_response, data_version_tracker
+from src.api.conditional import conditional_data_route, DATA_CACHE_CONTROL, STATS_CACHE_CONTROL
+from src.db.ingest import ingest_bank_data
+from src.api.auth import (
+    authenticate_user, create_access_token, get_current_user, hash_password, token_claims,
+    require_read, require_ingest
+)
 
 router = APIRouter()
 
+# Nombre maximal de sous-requêtes d'un tableau de bord
+DASHBOARD_MAX_QUERIES = int(os.getenv("DASHBOARD_MAX_QUERIES", "20"))
+
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """Obtenir un token d'accès JWT."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Nom d'utilisateur ou mot de passe incorrect",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data=token_claims(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -37,18 +59,20 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 
 
 @router.post("/users", response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Créer un nouvel utilisateur."""
-    db_user = db.query(User).filter(User.username == user.username).first()
+    result = await db.execute(select(User).where(User.username == user.username))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Ce nom d'utilisateur est déjà utilisé")
     
     if user.email:
-        db_email = db.query(User).filter(User.email == user.email).first()
+        result = await db.execute(select(User).where(User.email == user.email))
+        db_email = result.scalars().first()
         if db_email:
             raise HTTPException(status_code=400, detail="Cet email est déjà utilisé")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -56,57 +80,104 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
         is_active=user.is_active
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-@router.get("/bank-data", response_model=List[BankDataResponse])
+@router.get(
+    "/bank-data",
+    response_model=List[BankDataResponse],
+    dependencies=[Depends(conditional_data_route(DATA_CACHE_CONTROL))]
+)
 async def read_bank_data(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0, description="Nombre d'éléments à sauter"),
+    limit: int = Query(100, ge=1, le=1000, description="Nombre maximum d'éléments à retourner"),
     agence: Optional[str] = None,
     date_debut: Optional[date] = None,
     date_fin: Optional[date] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    pagination: Literal["offset", "cursor"] = Query("offset", description="Mode de pagination"),
+    cursor: Optional[str] = Query(None, description="Curseur de la page suivante (mode cursor)"),
+    current_user: User = Depends(require_read),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Récupérer les données bancaires.
+    Récupérer les données bancaires, triées par date puis par ID.
     
-    - **skip**: Nombre d'éléments à sauter (pagination)
-    - **limit**: Nombre maximum d'éléments à retourner
+    - **skip**: Nombre d'éléments à sauter (pagination par offset, mode historique)
+    - **limit**: Nombre maximum d'éléments à retourner (1 à 1000)
     - **agence**: Filtrer par nom d'agence
     - **date_debut**: Filtrer à partir de cette date
     - **date_fin**: Filtrer jusqu'à cette date
+    - **pagination**: `offset` (par défaut) ou `cursor`
+    - **cursor**: Curseur renvoyé dans l'en-tête `X-Next-Cursor` de la page précédente
+    
+    En mode `cursor`, l'en-tête `X-Next-Cursor` est absent sur la dernière page.
     """
-    query = db.query(BankData)
+    # Appliquer les filtres (lignes SQL sérialisées directement, sans objets ORM)
+    query = bank_data_query(agence, date_debut, date_fin).with_only_columns(*BANK_DATA_COLUMNS)
     
-    # Appliquer les filtres
-    if agence:
-        query = query.filter(BankData.agence == agence)
-    if date_debut:
-        query = query.filter(BankData.date >= date_debut)
-    if date_fin:
-        query = query.filter(BankData.date <= date_fin)
+    # Pagination par curseur : temps constant quelle que soit la page
+    if pagination == "cursor" or cursor:
+        after = decode_cursor(cursor) if cursor else None
+        result = await db.execute(keyset_page_query(query, after).limit(limit + 1))
+        bank_data = result.all()
+        if len(bank_data) > limit:
+            bank_data = bank_data[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(bank_data[-1].date, bank_data[-1].id)
+        return rows_response(bank_data, headers=response.headers)
     
-    # Appliquer la pagination
-    bank_data = query.offset(skip).limit(limit).all()
-    return bank_data
+    # Pagination par offset (mode historique)
+    result = await db.execute(keyset_page_query(query).offset(skip).limit(limit))
+    return rows_response(result.all(), headers=response.headers)
+
+
+@router.get("/bank-data/export")
+async def export_bank_data(
+    request: Request,
+    agence: Optional[str] = None,
+    date_debut: Optional[date] = None,
+    date_fin: Optional[date] = None,
+    export_format: Optional[Literal["ndjson", "csv", "arrow", "parquet"]] = Query(
+        None, alias="format", description="Format d'export (sinon choisi selon l'en-tête Accept)"
+    ),
+    current_user: User = Depends(require_read),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Exporter en flux toutes les données bancaires, triées par date puis par ID.
+    
+    - **agence**: Filtrer par nom d'agence
+    - **date_debut**: Filtrer à partir de cette date
+    - **date_fin**: Filtrer jusqu'à cette date
+    - **format**: `ndjson`, `csv`, `arrow` (Arrow IPC) ou `parquet`
+    
+    Les lignes sont lues depuis un curseur côté serveur : la mémoire utilisée
+    reste constante quel que soit le volume exporté.
+    """
+    chosen = negotiate_format(export_format, request.headers.get("accept"))
+    query = keyset_page_query(bank_data_query(agence, date_debut, date_fin)).with_only_columns(*EXPORT_COLUMNS)
+    media_type, extension = EXPORT_FORMATS[chosen]
+    return StreamingResponse(
+        stream_export(db.bind, query, chosen),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="bank_data.{extension}"'},
+    )
 
 
 @router.get("/bank-data/{bank_data_id}", response_model=BankDataResponse)
 async def read_bank_data_by_id(
     bank_data_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(require_read),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Récupérer une entrée de données bancaires par son ID.
     
     - **bank_data_id**: ID de l'entrée à récupérer
     """
-    bank_data = db.query(BankData).filter(BankData.id == bank_data_id).first()
+    bank_data = await db.get(BankData, bank_data_id)
     if bank_data is None:
         raise HTTPException(status_code=404, detail="Données non trouvées")
     return bank_data
@@ -115,8 +186,8 @@ async def read_bank_data_by_id(
 @router.post("/bank-data", response_model=BankDataResponse, status_code=status.HTTP_201_CREATED)
 async def create_bank_data(
     bank_data: BankDataCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(require_ingest),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Créer une nouvelle entrée de données bancaires.
@@ -130,43 +201,84 @@ async def create_bank_data(
         nombre_transactions=bank_data.nombre_transactions
     )
     db.add(db_bank_data)
-    db.commit()
-    db.refresh(db_bank_data)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Une entrée existe déjà pour cette agence à cette date"
+        )
+    data_version_tracker.invalidate()
+    await db.refresh(db_bank_data)
     return db_bank_data
 
 
-@router.get("/bank-data/stats/by-agence", response_model=List[dict])
-async def get_bank_data_stats_by_agence(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+@router.post("/bank-data/batch", response_model=BankDataBatchResult)
+async def create_bank_data_batch(
+    request: Request,
+    mode: Literal["insert", "upsert"] = Query("insert", description="upsert: mettre à jour la ligne de même (agence, date)"),
+    current_user: User = Depends(require_ingest),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Obtenir des statistiques par agence (montant total, nombre de transactions).
-    """
-    stats = db.query(
-        BankData.agence,
-        func.sum(BankData.montant).label("montant_total"),
-        func.sum(BankData.nombre_transactions).label("transactions_total"),
-        func.count(BankData.id).label("nombre_entrees")
-    ).group_by(BankData.agence).all()
+    Créer un lot de données bancaires en une seule transaction.
     
-    result = [
+    Le corps est un tableau JSON ou du NDJSON (`Content-Type: application/x-ndjson`)
+    d'objets au format de POST /bank-data. Les enregistrements invalides sont
+    signalés dans `errors` (avec leur position dans le lot) sans empêcher
+    l'insertion des enregistrements valides.
+    
+    Une agence a au plus une entrée par date : en mode `insert`, les
+    enregistrements dont l'entrée existe déjà (en base ou plus tôt dans le lot)
+    sont signalés dans `errors` et les autres sont insérés.
+    
+    - **mode**: `insert` (par défaut) ou `upsert` pour rendre le rejeu d'un lot idempotent
+    """
+    records, indexes, errors = parse_batch_body(await read_batch_body(request), request.headers.get("content-type"))
+    inserted, updated, rejected = await db.run_sync(
+        lambda session: ingest_bank_data(session.connection(), records, upsert=mode == "upsert")
+    )
+    await db.commit()
+    data_version_tracker.invalidate()
+    errors.extend(
         {
-            "agence": row.agence,
-            "montant_total": row.montant_total,
-            "transactions_total": row.transactions_total,
-            "nombre_entrees": row.nombre_entrees
+            "index": indexes[position],
+            "errors": [{"type": "duplicate_key", "msg": "Une entrée existe déjà pour cette agence à cette date"}],
         }
-        for row in stats
-    ]
-    return result
+        for position in rejected
+    )
+    errors.sort(key=lambda error: error["index"])
+    return {"inserted": inserted, "updated": updated, "errors": errors}
+
+
+@router.get(
+    "/bank-data/stats/by-agence",
+    response_model=List[dict],
+    dependencies=[Depends(conditional_data_route(STATS_CACHE_CONTROL))]
+)
+async def get_bank_data_stats_by_agence(
+    current_user: User = Depends(require_read),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Obtenir des statistiques par agence (montant total, nombre de transactions).
+    
+    Les valeurs sont lues dans les agrégats maintenus à chaque écriture et
+    mises en cache jusqu'à la prochaine modification des données.
+    """
+    return await cached_response(db, "stats/by-agence", {}, lambda session: aggregates.stats_by_agence(session))
 
 
-@router.get("/bank-data/stats/by-date", response_model=List[dict])
+@router.get(
+    "/bank-data/stats/by-date",
+    response_model=List[dict],
+    dependencies=[Depends(conditional_data_route(STATS_CACHE_CONTROL, moving_window=True))]
+)
 async def get_bank_data_stats_by_date(
-    days: int = Query(30, description="Nombre de jours à analyser, par défaut 30"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    days: int = Query(30, ge=0, le=36500, description="Nombre de jours à analyser, par défaut 30"),
+    current_user: User = Depends(require_read),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Obtenir des statistiques par date (montant total, nombre de transactions).
@@ -175,22 +287,123 @@ async def get_bank_data_stats_by_date(
     """
     date_limite = date.today() - timedelta(days=days)
     
-    stats = db.query(
-        BankData.date,
-        func.sum(BankData.montant).label("montant_total"),
-        func.sum(BankData.nombre_transactions).label("transactions_total"),
-        func.count(BankData.id).label("nombre_entrees")
-    ).filter(
-        BankData.date >= date_limite
-    ).group_by(BankData.date).order_by(BankData.date).all()
+    # La clé porte sur la date limite : le cache change de jour avec elle
+    return await cached_response(
+        db, "stats/by-date", {"date_limite": date_limite.isoformat()},
+        lambda session: aggregates.stats_by_date(session, date_limite)
+    )
+
+
+@router.get(
+    "/bank-data/stats/timeseries",
+    response_model=TimeseriesResponse,
+    dependencies=[Depends(conditional_data_route(STATS_CACHE_CONTROL, moving_window=True))]
+)
+async def get_bank_data_timeseries(
+    granularity: Literal["day", "week", "month", "quarter"] = Query("day", description="Taille des périodes"),
+    agence: Optional[str] = Query(None, description="Filtrer par nom d'agence (toutes sinon)"),
+    date_from: Optional[date] = Query(None, alias="from", description="Date incluse dans la première période"),
+    date_to: Optional[date] = Query(None, alias="to", description="Date incluse dans la dernière période (aujourd'hui par défaut)"),
+    current_user: User = Depends(require_read),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Obtenir une série temporelle continue des montants et transactions.
     
-    result = [
-        {
-            "date": row.date.isoformat(),
-            "montant_total": row.montant_total,
-            "transactions_total": row.transactions_total,
-            "nombre_entrees": row.nombre_entrees
-        }
-        for row in stats
-    ]
-    return result 
\ No newline at end of file
+    - **granularity**: `day`, `week` (commençant le lundi), `month` ou `quarter`
+    - **agence**: Filtrer par nom d'agence
+    - **from**: Début de la série (par défaut, les 30 dernières périodes)
+    - **to**: Fin de la série (par défaut aujourd'hui)
+    
+    Les périodes sont complètes et le regroupement est fait en SQL sur les
+    agrégats. Chaque période de l'intervalle est présente : celles sans
+    données ont des valeurs à zéro, la série peut être tracée telle quelle.
+    """
+    first, last, periods = aggregates.resolve_periods(granularity, date_from, date_to)
+    
+    params = {"granularity": granularity, "agence": agence or "", "first": first.isoformat(), "last": last.isoformat()}
+    return await cached_response(
+        db, "stats/timeseries", params,
+        lambda session: aggregates.timeseries(session, granularity, first, last, periods, agence)
+    )
+
+
+@router.get(
+    "/bank-data/stats/pivot",
+    response_model=PivotResponse,
+    dependencies=[Depends(conditional_data_route(STATS_CACHE_CONTROL, moving_window=True))]
+)
+async def get_bank_data_pivot(
+    granularity: Literal["day", "week", "month", "quarter"] = Query("week", description="Taille des périodes"),
+    metric: Literal["montant_total", "transactions_total", "nombre_entrees"] = Query(
+        "montant_total", description="Mesure placée dans la matrice"
+    ),
+    date_from: Optional[date] = Query(None, alias="from", description="Date incluse dans la première période"),
+    date_to: Optional[date] = Query(None, alias="to", description="Date incluse dans la dernière période (aujourd'hui par défaut)"),
+    current_user: User = Depends(require_read),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Obtenir la matrice agence x période d'une mesure, en une seule requête.
+    
+    - **granularity**: `day`, `week` (par défaut), `month` ou `quarter`
+    - **metric**: `montant_total` (par défaut), `transactions_total` ou `nombre_entrees`
+    - **from** / **to**: Intervalle couvert (par défaut, les 30 dernières périodes)
+    
+    La réponse est en colonnes : `agences` (toutes les agences) et `periods`
+    étiquettent les axes et `values` contient la matrice à plat, ligne par
+    agence (`values[i * len(periods) + j]`), avec des zéros pour les cellules
+    sans données. Elle se charge directement dans un tableau NumPy de forme
+    `shape`. Les valeurs sont des entiers pour `transactions_total` et
+    `nombre_entrees`.
+    """
+    first, last, periods = aggregates.resolve_periods(granularity, date_from, date_to)
+    
+    params = {"granularity": granularity, "metric": metric, "first": first.isoformat(), "last": last.isoformat()}
+    return await cached_response(
+        db, "stats/pivot", params,
+        lambda session: aggregates.pivot(session, granularity, metric, first, last, periods)
+    )
+
+
+@router.post("/bank-data/dashboard", response_model=DashboardResponse)
+async def run_dashboard(
+    request: DashboardRequest,
+    current_user: User = Depends(require_read),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Exécuter plusieurs requêtes d'agrégats en un seul appel authentifié.
+    
+    Chaque sous-requête a un nom unique et un `type` :
+    - `stats_by_agence`, `stats_by_date` (`days`)
+    - `timeseries` (`granularity`, `agence`, `from`, `to`)
+    - `pivot` (`granularity`, `metric`, `from`, `to`)
+    - `top_agences` (`metric`, `limit`, `from`, `to`)
+    - `bank_data` (`agence`, `date_debut`, `date_fin`, `skip`, `limit`)
+    
+    Toutes les sous-requêtes s'exécutent sur la même connexion, dans une
+    transaction de lecture : elles voient le même état des données. Une
+    sous-requête invalide est signalée dans `errors` sans empêcher les autres.
+    """
+    if len(request.queries) > DASHBOARD_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Un tableau de bord contient au plus {DASHBOARD_MAX_QUERIES} requêtes"
+        )
+    names = [query.name for query in request.queries]
+    if len(set(names)) != len(names):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Les noms des requêtes doivent être uniques"
+        )
+    
+    await begin_read_snapshot(db)
+    results = {}
+    errors = {}
+    for query in request.queries:
+        try:
+            results[query.name] = await aggregates.run_dashboard_query(db, query)
+        except HTTPException as exc:
+            errors[query.name] = exc.detail
+    return {"results": results, "errors": errors}
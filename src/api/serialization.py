@@ -0,0 +1,24 @@
+"""
+Sérialisation rapide des réponses de l'API.
+
+Les routes qui renvoient beaucoup de lignes sérialisent directement les
+tuples SQL avec orjson, sans construire d'objets ORM ni de modèles Pydantic
+(validation par ligne). Le `response_model` de la route reste déclaré :
+le schéma OpenAPI est inchangé, mais il n'est plus appliqué à la réponse.
+Les colonnes sélectionnées doivent donc correspondre au modèle déclaré.
+"""
+from fastapi.responses import ORJSONResponse
+
+
+def rows_response(rows, headers=None):
+    """
+    Construire une réponse JSON à partir de lignes SQL.
+
+    Args:
+        rows: Lignes SQLAlchemy (Row) dont les noms de colonnes sont les champs JSON
+        headers: En-têtes à ajouter (ceux déjà posés sur la réponse de la route)
+
+    Returns:
+        ORJSONResponse: Tableau JSON d'objets
+    """
+    return ORJSONResponse([row._asdict() for row in rows], headers=headers)
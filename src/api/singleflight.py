@@ -0,0 +1,56 @@
+"""
+Regroupement des calculs identiques simultanés (single-flight).
+
+Lorsque plusieurs requêtes demandent en même temps le même calcul (même
+clé), une seule exécution a lieu et toutes reçoivent son résultat ou son
+exception. Le regroupement est propre à chaque processus.
+"""
+import asyncio
+
+from prometheus_client import Counter
+
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Appels passés par un groupe single-flight, exécutés ou regroupés avec un calcul en cours",
+    ["group", "outcome"],
+)
+
+
+class SingleFlight:
+    """Groupe de calculs asynchrones regroupés par clé."""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+
+    def _forget(self, key, task):
+        """Retirer un calcul terminé (et marquer son exception comme lue)."""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, compute):
+        """
+        Exécuter `compute` ou attendre le calcul déjà en cours pour la même clé.
+
+        Le calcul s'exécute dans sa propre tâche : l'annulation d'une requête
+        qui l'attend n'interrompt pas les autres.
+
+        Args:
+            key: Clé identifiant le calcul
+            compute: Fonction sans argument retournant une coroutine
+        """
+        task = self._calls.get(key)
+        if task is None:
+            SINGLEFLIGHT_CALLS.labels(self.name, "executed").inc()
+            task = asyncio.ensure_future(compute())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            SINGLEFLIGHT_CALLS.labels(self.name, "coalesced").inc()
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        """Nombre de calculs en cours."""
+        return len(self._calls)
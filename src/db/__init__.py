@@ -1 +1,4 @@
-# Package de base de données 
\ No newline at end of file
+# Package de base de données
+
+# Enregistre le maintien automatique des agrégats (événement before_flush)
+from src.db import rollups  # noqa: F401
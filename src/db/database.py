@@ -1,27 +1,271 @@
-from sqlalchemy import create_engine
+"""
+Configuration de la base de données.
+
+L'URL de connexion est lue depuis la variable d'environnement DATABASE_URL
+(à défaut SQLITE_PATH, puis ./bankreports.db). Les réglages du pool de
+connexions peuvent être ajustés par variables d'environnement afin de pointer
+l'API vers PostgreSQL en production sans modifier le code.
+
+Deux moteurs sont exposés sur la même base :
+- `engine` / `SessionLocal` (synchrones) pour l'ETL et les scripts ;
+- `async_engine` / `AsyncSessionLocal` (aiosqlite, asyncpg) pour l'API.
+"""
+import os
+import logging
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
 
-# Utilisation de SQLite
-SQLALCHEMY_DATABASE_URL = "sqlite:///./bankreports.db"
+def _env_bool(name, default):
+    """Lire une variable d'environnement booléenne."""
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
 
-# Création du moteur SQLite avec support des clés étrangères
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
+
+# URL de la base de données (SQLite par défaut)
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"sqlite:///{os.getenv('SQLITE_PATH', './bankreports.db')}"
 )
 
+# Pilotes asynchrones utilisés par l'API pour chaque backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+# Réglages du pool de connexions
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# Durée maximale d'une requête SQL en millisecondes (0 = illimitée)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+# Profil de performance SQLite appliqué à chaque nouvelle connexion.
+# Le mode WAL permet aux lectures de l'API de continuer pendant un import ETL.
+# Une valeur vide désactive le PRAGMA correspondant.
+SQLITE_PRAGMAS = {
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    # Valeur négative = taille en Kio (ici 64 Mio)
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite_memory(url):
+    """Indiquer si l'URL désigne une base SQLite en mémoire."""
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def get_engine_options(url, **overrides):
+    """
+    Construire les options de create_engine adaptées au backend.
+
+    Args:
+        url: URL de connexion SQLAlchemy
+        **overrides: Options supplémentaires qui remplacent les valeurs calculées
+
+    Returns:
+        dict: Arguments nommés à passer à create_engine
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    connect_args = {}
+
+    if backend == "sqlite":
+        # Une même connexion peut être utilisée par plusieurs threads (FastAPI)
+        connect_args["check_same_thread"] = False
+        if not is_sqlite_memory(url):
+            # SQLite n'a pas de statement_timeout : l'attente des verrous est
+            # bornée par le PRAGMA busy_timeout (voir SQLITE_PRAGMAS)
+            options.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+            if url.get_driver_name() == "aiosqlite":
+                # aiosqlite utilise NullPool par défaut pour les fichiers
+                options["poolclass"] = AsyncAdaptedQueuePool
+    else:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+        if backend == "postgresql" and DB_STATEMENT_TIMEOUT_MS:
+            if url.get_driver_name() == "asyncpg":
+                connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            else:
+                connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    options["connect_args"] = connect_args
+    options.update(overrides)
+    return options
+
+
+def create_db_engine(url=None, **overrides):
+    """
+    Créer un moteur SQLAlchemy configuré pour le backend de l'URL.
+
+    Args:
+        url: URL de connexion (par défaut SQLALCHEMY_DATABASE_URL)
+        **overrides: Options de create_engine qui remplacent les valeurs par défaut
+
+    Returns:
+        Engine: Moteur SQLAlchemy
+    """
+    url = url or SQLALCHEMY_DATABASE_URL
+    db_engine = create_engine(url, **get_engine_options(url, **overrides))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine, "connect", apply_sqlite_pragmas)
+    return db_engine
+
+
+def get_dialect_insert(dialect_name):
+    """
+    Retourner la construction INSERT du dialecte supportant ON CONFLICT.
+
+    Returns:
+        La fonction insert() de SQLite ou PostgreSQL, ou None pour les autres backends
+    """
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+
+def get_async_url(url=None):
+    """
+    Convertir une URL synchrone en URL utilisant le pilote asynchrone du backend.
+
+    La variable ASYNC_DATABASE_URL permet d'imposer une URL différente.
+    """
+    if url is None and os.getenv("ASYNC_DATABASE_URL"):
+        return make_url(os.getenv("ASYNC_DATABASE_URL"))
+    url = make_url(url or SQLALCHEMY_DATABASE_URL)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.get_driver_name() in ("aiosqlite", "asyncpg"):
+        return url
+    return url.set(drivername=driver)
+
+
+def create_async_db_engine(url=None, **overrides):
+    """
+    Créer un moteur asynchrone configuré pour le backend de l'URL.
+
+    Args:
+        url: URL de connexion, convertie vers le pilote asynchrone du backend
+        **overrides: Options de create_async_engine qui remplacent les valeurs par défaut
+
+    Returns:
+        AsyncEngine: Moteur SQLAlchemy asynchrone
+    """
+    url = get_async_url(url)
+    db_engine = create_async_engine(url, **get_engine_options(url, **overrides))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    return db_engine
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None, pragmas=None):
+    """
+    Appliquer le profil de PRAGMA SQLite sur une connexion DBAPI.
+
+    Utilisée comme écouteur de l'événement "connect" du moteur.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (pragmas or SQLITE_PRAGMAS).items():
+            if value not in (None, ""):
+                cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def get_sqlite_settings(db_engine):
+    """
+    Lire les valeurs effectives des PRAGMA du profil SQLite.
+
+    Returns:
+        dict: Valeur active de chaque PRAGMA (vide si le moteur n'est pas SQLite)
+    """
+    if db_engine.dialect.name != "sqlite":
+        return {}
+    with db_engine.connect() as conn:
+        return {
+            name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in SQLITE_PRAGMAS
+        }
+
+
+def log_database_settings(db_engine):
+    """Journaliser la configuration active de la base de données."""
+    logger.info("Base de données: %s", db_engine.url.render_as_string(hide_password=True))
+    settings = get_sqlite_settings(db_engine)
+    if settings:
+        logger.info(
+            "Profil SQLite actif: %s",
+            ", ".join(f"{name}={value}" for name, value in settings.items())
+        )
+
+
+# Création du moteur
+engine = create_db_engine()
+
 # Création de la session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Moteur et sessions asynchrones pour l'API
+async_engine = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Création de la base pour les modèles
 Base = declarative_base()
 
 
-def get_db():
-    """Fonction pour obtenir une session de base de données"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Fonction pour obtenir une session asynchrone de base de données"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close() 
\ No newline at end of file
+
+
+async def begin_read_snapshot(session):
+    """
+    Démarrer une transaction de lecture dont toutes les requêtes voient le même instantané.
+
+    La transaction en cours de la session est terminée. PostgreSQL passe en
+    REPEATABLE READ (lecture seule) ; SQLite ouvre explicitement une
+    transaction (en mode WAL, l'instantané est fixé à la première lecture).
+    La transaction se termine à la fermeture de la session.
+    """
+    await session.commit()
+    dialect_name = session.bind.dialect.name
+    if dialect_name == "postgresql":
+        await session.connection(execution_options={
+            "isolation_level": "REPEATABLE READ",
+            "postgresql_readonly": True,
+        })
+    elif dialect_name == "sqlite":
+        # Le pilote sqlite3 n'ouvre pas de transaction avant un SELECT
+        connection = await session.connection()
+        await connection.exec_driver_sql("BEGIN")
+
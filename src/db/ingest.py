@@ -0,0 +1,174 @@
+"""
+Insertion en masse des données bancaires.
+
+Les enregistrements sont écrits avec une seule instruction INSERT exécutée
+pour tout le lot (executemany, regroupé en INSERT multi-lignes par les
+pilotes qui le supportent) au lieu d'un aller-retour ORM par ligne. Comme
+ces écritures ne passent pas par la session ORM, les agrégats sont mis à
+jour explicitement avec apply_rollup_deltas() et la version des données
+est incrémentée.
+
+bank_data contient au plus une ligne par (agence, date) (index unique). En
+mode insertion, les enregistrements dont la clé existe déjà (en base ou plus
+tôt dans le lot) sont écartés par INSERT … ON CONFLICT DO NOTHING et
+signalés à l'appelant, sans empêcher l'insertion des autres.
+
+En mode upsert, les nouvelles clés sont insérées par INSERT … ON CONFLICT
+DO NOTHING ; les lignes existantes sont verrouillées (SELECT … FOR UPDATE),
+lues pour corriger les agrégats, puis remplacées par INSERT … ON CONFLICT
+DO UPDATE. Des rejeux simultanés d'un même lot ne créent donc pas de
+doublons et les agrégats restent exacts.
+"""
+from sqlalchemy import and_, select, tuple_, update
+
+from .database import get_dialect_insert
+from .models import BankData
+from .rollups import apply_rollup_deltas, compute_rollup_deltas
+from .versions import bump_data_version
+
+# Nombre de clés (agence, date) recherchées par requête en mode upsert
+UPSERT_LOOKUP_CHUNK = 500
+
+
+def _key(record):
+    """Clé (agence, date) d'un enregistrement."""
+    return record["agence"], record["date"]
+
+
+def _lock_existing(connection, keys):
+    """
+    Verrouiller et lire les lignes existantes de clés (agence, date).
+
+    Returns:
+        dict: {(agence, date): {"agence", "date", "montant", "nombre_transactions"}}
+    """
+    table = BankData.__table__
+    existing = {}
+    for i in range(0, len(keys), UPSERT_LOOKUP_CHUNK):
+        chunk = keys[i:i + UPSERT_LOOKUP_CHUNK]
+        rows = connection.execute(
+            select(table.c.agence, table.c.date, table.c.montant, table.c.nombre_transactions)
+            .where(tuple_(table.c.agence, table.c.date).in_(chunk))
+            .with_for_update()
+        )
+        for row in rows.mappings():
+            existing[(row["agence"], row["date"])] = dict(row)
+    return existing
+
+
+def _upsert(connection, records, existing):
+    """
+    Écrire des enregistrements dont la clé existait (ou vient d'être supprimée).
+
+    Args:
+        existing: Lignes existantes verrouillées (voir _lock_existing)
+    """
+    table = BankData.__table__
+    insert = get_dialect_insert(connection.dialect.name)
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.agence, table.c.date],
+            set_={name: stmt.excluded[name] for name in ("montant", "nombre_transactions")},
+        )
+        connection.execute(stmt, records)
+        return
+
+    for record in records:
+        if _key(record) in existing:
+            connection.execute(
+                update(table)
+                .where(and_(table.c.agence == record["agence"], table.c.date == record["date"]))
+                .values(montant=record["montant"], nombre_transactions=record["nombre_transactions"])
+            )
+        else:
+            connection.execute(table.insert(), record)
+
+
+def _insert_new(connection, records):
+    """
+    Insérer les enregistrements dont la clé (agence, date) est nouvelle.
+
+    Returns:
+        tuple: (nombre de lignes insérées, 0, positions des enregistrements écartés)
+    """
+    table = BankData.__table__
+    # Une clé répétée dans le lot : seule la première occurrence est insérée
+    first = {}
+    for position, record in enumerate(records):
+        first.setdefault(_key(record), position)
+    candidates = [records[position] for position in first.values()]
+
+    insert = get_dialect_insert(connection.dialect.name)
+    if insert is not None:
+        stmt = (
+            insert(table)
+            .on_conflict_do_nothing(index_elements=[table.c.agence, table.c.date])
+            .returning(table.c.agence, table.c.date)
+        )
+        inserted = {(row.agence, row.date) for row in connection.execute(stmt, candidates)}
+    else:
+        existing = _lock_existing(connection, list(first))
+        new = [record for record in candidates if _key(record) not in existing]
+        if new:
+            connection.execute(table.insert(), new)
+        inserted = {_key(record) for record in new}
+
+    rejected = [
+        position for position, record in enumerate(records)
+        if _key(record) not in inserted or first[_key(record)] != position
+    ]
+    if inserted:
+        apply_rollup_deltas(connection, compute_rollup_deltas(
+            record for record in candidates if _key(record) in inserted
+        ))
+        bump_data_version(connection)
+    return len(inserted), 0, rejected
+
+
+def ingest_bank_data(connection, records, upsert=False):
+    """
+    Insérer un lot de données bancaires et mettre à jour les agrégats.
+
+    Args:
+        connection: Connexion SQLAlchemy (dans la transaction d'écriture)
+        records: Liste de dictionnaires (agence, date, montant, nombre_transactions)
+        upsert: Mettre à jour la ligne existante de même (agence, date) au lieu
+            d'en insérer une nouvelle ; rejouer un lot est alors sans effet
+
+    Returns:
+        tuple: (nombre de lignes insérées, nombre de lignes mises à jour,
+                positions dans `records` des enregistrements écartés car leur
+                clé existe déjà - mode insertion uniquement)
+    """
+    if not records:
+        return 0, 0, []
+
+    table = BankData.__table__
+    if not upsert:
+        return _insert_new(connection, records)
+
+    # Le dernier enregistrement d'une même clé dans le lot l'emporte
+    records = list({_key(record): record for record in records}.values())
+    deltas = compute_rollup_deltas(records)
+
+    remaining = records
+    insert = get_dialect_insert(connection.dialect.name)
+    if insert is not None:
+        # Nouvelles clés : insérées sans attendre de lecture préalable
+        stmt = (
+            insert(table)
+            .on_conflict_do_nothing(index_elements=[table.c.agence, table.c.date])
+            .returning(table.c.agence, table.c.date)
+        )
+        inserted = {(row.agence, row.date) for row in connection.execute(stmt, records)}
+        remaining = [record for record in records if _key(record) not in inserted]
+
+    existing = {}
+    if remaining:
+        existing = _lock_existing(connection, [_key(record) for record in remaining])
+        _upsert(connection, remaining, existing)
+        compute_rollup_deltas(existing.values(), sign=-1, deltas=deltas)
+    apply_rollup_deltas(connection, deltas)
+    bump_data_version(connection)
+    return len(records) - len(existing), len(existing), []
@@ -0,0 +1,57 @@
+"""
+Environnement Alembic pour les migrations de la base de données.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+from src.db.database import SQLALCHEMY_DATABASE_URL, create_db_engine
+from src.db import models  # noqa: F401 - enregistre les modèles dans Base.metadata
+from src.db.database import Base
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_url():
+    """URL de la base à migrer (option -x url=... ou DATABASE_URL)."""
+    return context.get_x_argument(as_dictionary=True).get("url", SQLALCHEMY_DATABASE_URL)
+
+
+def run_migrations_offline():
+    """Générer le SQL des migrations sans connexion à la base."""
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Appliquer les migrations sur la base de données."""
+    connectable = config.attributes.get("connection")
+    if connectable is None:
+        connectable = create_db_engine(get_url())
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,55 @@
+"""Schéma initial (tables bank_data et users)
+
+Les bases créées auparavant par Base.metadata.create_all() contiennent déjà
+ces tables : elles ne sont créées que si elles sont absentes.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("bank_data"):
+        op.create_table(
+            "bank_data",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("agence", sa.String(), nullable=False),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("montant", sa.Float(), nullable=False),
+            sa.Column("nombre_transactions", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_bank_data_id", "bank_data", ["id"])
+        op.create_index("ix_bank_data_agence", "bank_data", ["agence"])
+        op.create_index("ix_bank_data_date", "bank_data", ["date"])
+
+    if not inspector.has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+
+def downgrade():
+    op.drop_table("users")
+    op.drop_table("bank_data")
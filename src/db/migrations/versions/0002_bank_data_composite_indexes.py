@@ -0,0 +1,31 @@
+"""Index composite (agence, date) et index couvrant sur bank_data
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_bank_data_agence_date", "bank_data", ["agence", "date"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_bank_data_date_agence_montant_transactions", "bank_data",
+        ["date", "agence", "montant", "nombre_transactions"],
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_bank_data_date_agence_montant_transactions", table_name="bank_data")
+    op.drop_index("ix_bank_data_agence_date", table_name="bank_data")
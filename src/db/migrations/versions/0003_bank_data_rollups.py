@@ -0,0 +1,105 @@
+"""Table d'agrégats bank_data_rollups (agence x jour/semaine/mois)
+
+La table est remplie à partir de l'historique existant. La migration
+n'utilise que des tables et du SQL déclarés ici : une évolution ultérieure
+du code de l'application ne la modifie pas.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+import datetime
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+bank_data = sa.table(
+    "bank_data",
+    sa.column("agence", sa.String()),
+    sa.column("date", sa.Date()),
+    sa.column("montant", sa.Float()),
+    sa.column("nombre_transactions", sa.Integer()),
+)
+rollups = sa.table(
+    "bank_data_rollups",
+    sa.column("granularity", sa.String()),
+    sa.column("agence", sa.String()),
+    sa.column("period_start", sa.Date()),
+    sa.column("montant_total", sa.Float()),
+    sa.column("transactions_total", sa.Integer()),
+    sa.column("nombre_entrees", sa.Integer()),
+)
+
+
+def _period_starts(day):
+    """Début des périodes jour, semaine (lundi) et mois contenant une date."""
+    return {
+        "day": day,
+        "week": day - datetime.timedelta(days=day.weekday()),
+        "month": day.replace(day=1),
+    }
+
+
+def _fill_rollups(bind):
+    """Remplir la table d'agrégats à partir des totaux journaliers de bank_data."""
+    totals = defaultdict(lambda: [0.0, 0, 0])
+    days = bind.execute(
+        sa.select(
+            bank_data.c.agence,
+            bank_data.c.date,
+            sa.func.sum(bank_data.c.montant),
+            sa.func.sum(bank_data.c.nombre_transactions),
+            sa.func.count(),
+        ).group_by(bank_data.c.agence, bank_data.c.date)
+    )
+    for agence, day, montant, transactions, entrees in days:
+        for granularity, start in _period_starts(day).items():
+            total = totals[(granularity, agence, start)]
+            total[0] += montant
+            total[1] += transactions
+            total[2] += entrees
+
+    bind.execute(sa.delete(rollups))
+    if totals:
+        bind.execute(sa.insert(rollups), [
+            {
+                "granularity": granularity,
+                "agence": agence,
+                "period_start": start,
+                "montant_total": montant,
+                "transactions_total": transactions,
+                "nombre_entrees": entrees,
+            }
+            for (granularity, agence, start), (montant, transactions, entrees) in totals.items()
+        ])
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("bank_data_rollups"):
+        op.create_table(
+            "bank_data_rollups",
+            sa.Column("granularity", sa.String(), primary_key=True),
+            sa.Column("agence", sa.String(), primary_key=True),
+            sa.Column("period_start", sa.Date(), primary_key=True),
+            sa.Column("montant_total", sa.Float(), nullable=False),
+            sa.Column("transactions_total", sa.Integer(), nullable=False),
+            sa.Column("nombre_entrees", sa.Integer(), nullable=False),
+        )
+        op.create_index(
+            "ix_bank_data_rollups_granularity_period", "bank_data_rollups",
+            ["granularity", "period_start"],
+        )
+
+    _fill_rollups(op.get_bind())
+
+
+def downgrade():
+    op.drop_table("bank_data_rollups")
@@ -0,0 +1,25 @@
+"""Index (date, id) sur bank_data pour la pagination par curseur
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_bank_data_date_id", "bank_data", ["date", "id"],
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_bank_data_date_id", table_name="bank_data")
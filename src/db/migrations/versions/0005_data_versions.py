@@ -0,0 +1,29 @@
+"""Table data_versions (version des données pour l'invalidation des caches)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("data_versions"):
+        op.create_table(
+            "data_versions",
+            sa.Column("name", sa.String(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table("data_versions")
@@ -0,0 +1,38 @@
+"""Table api_keys (clés d'API des clients machines)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("api_keys"):
+        op.create_table(
+            "api_keys",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("prefix", sa.String(), nullable=False),
+            sa.Column("key_hash", sa.String(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("scopes", sa.String(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("last_used_at", sa.DateTime(), nullable=True),
+            sa.Column("usage_count", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_api_keys_prefix", "api_keys", ["prefix"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_api_keys_prefix", table_name="api_keys")
+    op.drop_table("api_keys")
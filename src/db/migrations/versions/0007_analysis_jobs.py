@@ -0,0 +1,39 @@
+"""Table analysis_jobs (analyses IA exécutées en arrière-plan)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("analysis_jobs"):
+        op.create_table(
+            "analysis_jobs",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("parameters", sa.JSON(), nullable=False),
+            sa.Column("result", sa.JSON(), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("started_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_analysis_jobs_user_id", "analysis_jobs", ["user_id"])
+        op.create_index("ix_analysis_jobs_status", "analysis_jobs", ["status"])
+
+
+def downgrade():
+    op.drop_index("ix_analysis_jobs_status", table_name="analysis_jobs")
+    op.drop_index("ix_analysis_jobs_user_id", table_name="analysis_jobs")
+    op.drop_table("analysis_jobs")
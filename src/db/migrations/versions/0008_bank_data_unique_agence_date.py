@@ -0,0 +1,126 @@
+"""Index unique (agence, date) sur bank_data
+
+Les doublons existants sont résolus comme le fait l'upsert (API et import
+Excel) : la dernière écriture l'emporte. La ligne de plus grand ID est
+conservée telle quelle, les autres sont supprimées et retirées des agrégats.
+
+La migration n'utilise que des tables et du SQL déclarés ici : une
+évolution ultérieure du code de l'application ne la modifie pas.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+import datetime
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+bank_data = sa.table(
+    "bank_data",
+    sa.column("id", sa.Integer()),
+    sa.column("agence", sa.String()),
+    sa.column("date", sa.Date()),
+    sa.column("montant", sa.Float()),
+    sa.column("nombre_transactions", sa.Integer()),
+)
+rollups = sa.table(
+    "bank_data_rollups",
+    sa.column("granularity", sa.String()),
+    sa.column("agence", sa.String()),
+    sa.column("period_start", sa.Date()),
+    sa.column("montant_total", sa.Float()),
+    sa.column("transactions_total", sa.Integer()),
+    sa.column("nombre_entrees", sa.Integer()),
+)
+data_versions = sa.table(
+    "data_versions",
+    sa.column("name", sa.String()),
+    sa.column("version", sa.Integer()),
+    sa.column("updated_at", sa.DateTime()),
+)
+
+
+def _period_starts(day):
+    """Début des périodes jour, semaine (lundi) et mois contenant une date."""
+    return {
+        "day": day,
+        "week": day - datetime.timedelta(days=day.weekday()),
+        "month": day.replace(day=1),
+    }
+
+
+def upgrade():
+    bind = op.get_bind()
+    duplicated = (
+        sa.select(bank_data.c.agence, bank_data.c.date)
+        .group_by(bank_data.c.agence, bank_data.c.date)
+        .having(sa.func.count() > 1)
+        .subquery()
+    )
+    rows = bind.execute(
+        sa.select(bank_data)
+        .join(duplicated, sa.and_(bank_data.c.agence == duplicated.c.agence, bank_data.c.date == duplicated.c.date))
+        .order_by(bank_data.c.agence, bank_data.c.date, bank_data.c.id.desc())
+    ).all()
+
+    kept = set()
+    removed = []
+    for row in rows:
+        if (row.agence, row.date) in kept:
+            removed.append(row)
+        else:
+            kept.add((row.agence, row.date))
+
+    if removed:
+        deltas = defaultdict(lambda: [0.0, 0, 0])
+        for row in removed:
+            for granularity, start in _period_starts(row.date).items():
+                delta = deltas[(granularity, row.agence, start)]
+                delta[0] += row.montant
+                delta[1] += row.nombre_transactions
+                delta[2] += 1
+        removed_ids = [row.id for row in removed]
+        for i in range(0, len(removed_ids), 500):
+            bind.execute(sa.delete(bank_data).where(bank_data.c.id.in_(removed_ids[i:i + 500])))
+        for (granularity, agence, start), (montant, transactions, entrees) in deltas.items():
+            bind.execute(
+                sa.update(rollups)
+                .where(
+                    rollups.c.granularity == granularity,
+                    rollups.c.agence == agence,
+                    rollups.c.period_start == start,
+                )
+                .values(
+                    montant_total=rollups.c.montant_total - montant,
+                    transactions_total=rollups.c.transactions_total - transactions,
+                    nombre_entrees=rollups.c.nombre_entrees - entrees,
+                )
+            )
+        bind.execute(sa.delete(rollups).where(rollups.c.nombre_entrees <= 0))
+
+        # Version des données incrémentée : les caches de l'API sont invalidés
+        now = datetime.datetime.now()
+        result = bind.execute(
+            sa.update(data_versions)
+            .where(data_versions.c.name == "bank_data")
+            .values(version=data_versions.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            bind.execute(sa.insert(data_versions).values(name="bank_data", version=1, updated_at=now))
+
+    op.drop_index("ix_bank_data_agence_date", table_name="bank_data", if_exists=True)
+    op.create_index("ix_bank_data_agence_date", "bank_data", ["agence", "date"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_bank_data_agence_date", table_name="bank_data")
+    op.create_index("ix_bank_data_agence_date", "bank_data", ["agence", "date"])
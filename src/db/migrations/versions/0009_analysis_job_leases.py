@@ -0,0 +1,30 @@
+"""Bail des analyses en cours (worker_id, heartbeat_at)
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# Identifiants de révision utilisés par Alembic
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("analysis_jobs")}
+    with op.batch_alter_table("analysis_jobs") as batch_op:
+        if "worker_id" not in columns:
+            batch_op.add_column(sa.Column("worker_id", sa.String(), nullable=True))
+        if "heartbeat_at" not in columns:
+            batch_op.add_column(sa.Column("heartbeat_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("analysis_jobs") as batch_op:
+        batch_op.drop_column("heartbeat_at")
+        batch_op.drop_column("worker_id")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, Index, ForeignKey, JSON, Text
 from .database import Base
 import datetime
 
@@ -14,10 +14,51 @@ class BankData(Base):
     nombre_transactions = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.now)
 
+    __table_args__ = (
+        # Une ligne par agence et par jour ; filtre par agence sur une plage de dates
+        Index("ix_bank_data_agence_date", "agence", "date", unique=True),
+        # Index couvrant : agrégats sur une plage de dates sans lire la table
+        Index("ix_bank_data_date_agence_montant_transactions", "date", "agence", "montant", "nombre_transactions"),
+        # Clé de tri de la pagination par curseur
+        Index("ix_bank_data_date_id", "date", "id"),
+    )
+
     def __repr__(self):
         return f"<BankData(agence='{self.agence}', date='{self.date}', montant={self.montant})>"
 
 
+class BankDataRollup(Base):
+    """Agrégats des données bancaires par agence et par période (jour, semaine, mois)"""
+    __tablename__ = "bank_data_rollups"
+
+    granularity = Column(String, primary_key=True)
+    agence = Column(String, primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    montant_total = Column(Float, nullable=False, default=0.0)
+    transactions_total = Column(Integer, nullable=False, default=0)
+    nombre_entrees = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Lecture d'une plage de périodes toutes agences confondues
+        Index("ix_bank_data_rollups_granularity_period", "granularity", "period_start"),
+    )
+
+    def __repr__(self):
+        return f"<BankDataRollup(granularity='{self.granularity}', agence='{self.agence}', period_start='{self.period_start}')>"
+
+
+class DataVersion(Base):
+    """Compteur de version des données, incrémenté à chaque écriture (invalidation des caches)"""
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+
+    def __repr__(self):
+        return f"<DataVersion(name='{self.name}', version={self.version})>"
+
+
 class User(Base):
     """Modèle pour les utilisateurs de l'API"""
     __tablename__ = "users"
@@ -30,4 +71,48 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.datetime.now)
 
     def __repr__(self):
-        return f"<User(username='{self.username}', email='{self.email}')>" 
\ No newline at end of file
+        return f"<User(username='{self.username}', email='{self.email}')>"
+
+
+class ApiKey(Base):
+    """Clé d'API d'un client machine (ETL, connecteur BI), agissant pour un utilisateur"""
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True)
+    # Identifiant public de la clé, inclus dans la clé elle-même
+    prefix = Column(String, unique=True, index=True, nullable=False)
+    # HMAC-SHA256 de la clé complète (la clé n'est jamais stockée)
+    key_hash = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Portées séparées par des virgules (read, ingest, ai)
+    scopes = Column(String, nullable=False, default="read")
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    last_used_at = Column(DateTime, nullable=True)
+    usage_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ApiKey(prefix='{self.prefix}', name='{self.name}', scopes='{self.scopes}')>"
+
+
+class AnalysisJob(Base):
+    """Analyse IA exécutée en arrière-plan (paramètres, état et résultat)"""
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # pending, running, succeeded ou failed
+    status = Column(String, nullable=False, default="pending", index=True)
+    parameters = Column(JSON, nullable=False)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Processus exécutant la tâche et dernier renouvellement de son bail
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<AnalysisJob(id='{self.id}', status='{self.status}')>"
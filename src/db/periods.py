@@ -0,0 +1,78 @@
+"""
+Calcul des périodes (jour, semaine, mois, trimestre) utilisées pour agréger les données.
+"""
+import datetime
+
+# Granularités maintenues dans les tables d'agrégats
+GRANULARITIES = ("day", "week", "month")
+# Granularités des séries temporelles (les trimestres sont calculés à partir des mois)
+TIMESERIES_GRANULARITIES = GRANULARITIES + ("quarter",)
+
+
+def as_date(value):
+    """Convertir une date, un datetime (ou Timestamp pandas) ou une chaîne ISO en date."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if hasattr(value, "date"):
+        return value.date()
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def period_start(value, granularity):
+    """
+    Retourner le premier jour de la période contenant une date.
+
+    Les semaines commencent le lundi.
+
+    Args:
+        value: Date à rattacher à une période
+        granularity: "day", "week", "month" ou "quarter"
+    """
+    day = as_date(value)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return day.replace(month=day.month - (day.month - 1) % 3, day=1)
+    raise ValueError(f"Granularité inconnue : {granularity}")
+
+
+def shift_period(start, granularity, count=1):
+    """
+    Décaler un début de période d'un nombre de périodes (négatif pour reculer).
+
+    Args:
+        start: Début de période (retourné par period_start)
+        granularity: "day", "week", "month" ou "quarter"
+        count: Nombre de périodes
+    """
+    if granularity == "day":
+        return start + datetime.timedelta(days=count)
+    if granularity == "week":
+        return start + datetime.timedelta(weeks=count)
+    months = {"month": 1, "quarter": 3}.get(granularity)
+    if months is None:
+        raise ValueError(f"Granularité inconnue : {granularity}")
+    index = start.year * 12 + start.month - 1 + count * months
+    return start.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def iter_periods(start, end, granularity):
+    """
+    Énumérer les débuts de période de la période de `start` à celle de `end` incluses.
+
+    Returns:
+        list: Débuts de période, dans l'ordre chronologique
+    """
+    current = period_start(start, granularity)
+    last = period_start(end, granularity)
+    periods = []
+    while current <= last:
+        periods.append(current)
+        current = shift_period(current, granularity)
+    return periods
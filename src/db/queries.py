@@ -0,0 +1,245 @@
+"""
+Requêtes SQL réutilisées par les routes de l'API.
+
+Centraliser la construction des requêtes permet de vérifier leur plan
+d'exécution (index utilisés) indépendamment des routes.
+"""
+from sqlalchemy import Date, Integer, String, cast, func, literal, literal_column, select, tuple_, type_coerce
+
+from .models import BankData, BankDataRollup
+
+
+# Colonnes de BankData renvoyées par l'API (ordre de BankDataResponse)
+BANK_DATA_COLUMNS = (
+    BankData.id,
+    BankData.agence,
+    BankData.date,
+    BankData.montant,
+    BankData.nombre_transactions,
+    BankData.created_at,
+)
+
+
+def bank_data_query(agence=None, date_debut=None, date_fin=None):
+    """
+    Construire la requête de lecture des données bancaires filtrées.
+
+    Args:
+        agence: Filtrer par nom d'agence
+        date_debut: Filtrer à partir de cette date
+        date_fin: Filtrer jusqu'à cette date
+    """
+    query = select(BankData)
+    if agence:
+        query = query.where(BankData.agence == agence)
+    if date_debut:
+        query = query.where(BankData.date >= date_debut)
+    if date_fin:
+        query = query.where(BankData.date <= date_fin)
+    return query
+
+
+def keyset_page_query(query, after=None):
+    """
+    Trier une requête sur BankData par (date, id) et reprendre après une clé.
+
+    Contrairement à OFFSET, le coût d'une page ne dépend pas de sa position :
+    la base descend directement dans l'index jusqu'à la clé `after`.
+
+    Args:
+        query: Requête construite par bank_data_query
+        after: Clé (date, id) de la dernière ligne de la page précédente
+    """
+    if after is not None:
+        query = query.where(tuple_(BankData.date, BankData.id) > tuple_(*after))
+    return query.order_by(BankData.date, BankData.id)
+
+
+def rollup_stats_by_agence_query():
+    """
+    Construire la requête des statistiques par agence à partir des agrégats mensuels.
+
+    Le coût dépend du nombre d'agences et de mois, pas du volume de bank_data.
+    """
+    return select(
+        BankDataRollup.agence,
+        func.sum(BankDataRollup.montant_total).label("montant_total"),
+        func.sum(BankDataRollup.transactions_total).label("transactions_total"),
+        func.sum(BankDataRollup.nombre_entrees).label("nombre_entrees")
+    ).where(
+        BankDataRollup.granularity == "month"
+    ).group_by(BankDataRollup.agence)
+
+
+def rollup_stats_by_date_query(date_limite):
+    """Construire la requête des statistiques par date à partir des agrégats journaliers."""
+    return select(
+        BankDataRollup.period_start.label("date"),
+        func.sum(BankDataRollup.montant_total).label("montant_total"),
+        func.sum(BankDataRollup.transactions_total).label("transactions_total"),
+        func.sum(BankDataRollup.nombre_entrees).label("nombre_entrees")
+    ).where(
+        BankDataRollup.granularity == "day",
+        BankDataRollup.period_start >= date_limite
+    ).group_by(BankDataRollup.period_start).order_by(BankDataRollup.period_start)
+
+
+def quarter_start(column, dialect_name):
+    """
+    Expression SQL du premier jour du trimestre d'une colonne de dates.
+
+    Raises:
+        NotImplementedError: Si le dialecte n'est ni SQLite ni PostgreSQL
+    """
+    if dialect_name == "sqlite":
+        # date(d, 'start of month', '-N months') avec N = (mois - 1) % 3
+        months_back = (cast(func.strftime("%m", column), Integer) - 1) % 3
+        return type_coerce(
+            func.date(column, "start of month", literal("-") + cast(months_back, String) + literal(" months")),
+            Date
+        )
+    if dialect_name == "postgresql":
+        # Littéral SQL : une expression paramétrée ne serait pas reconnue
+        # comme identique entre SELECT et GROUP BY
+        return cast(func.date_trunc(literal_column("'quarter'"), column), Date)
+    raise NotImplementedError(f"Trimestres non supportés pour le dialecte {dialect_name}")
+
+
+def _rollup_bucket(granularity, dialect_name):
+    """
+    Granularité des agrégats à lire et expression de période d'une granularité.
+
+    Returns:
+        tuple: (granularité source, expression "period_start")
+    """
+    if granularity == "quarter":
+        return "month", quarter_start(BankDataRollup.period_start, dialect_name).label("period_start")
+    return granularity, BankDataRollup.period_start.label("period_start")
+
+
+def rollup_timeseries_query(granularity, start, end, agence=None, dialect_name="sqlite"):
+    """
+    Construire la requête d'une série temporelle à partir des agrégats.
+
+    Les jours, semaines et mois sont lus directement dans les agrégats de même
+    granularité ; les trimestres regroupent en SQL les agrégats mensuels.
+
+    Args:
+        granularity: "day", "week", "month" ou "quarter"
+        start: Début de la première période (incluse)
+        end: Début de la période suivant la dernière (exclue)
+        agence: Limiter la série à une agence (toutes les agences sinon)
+        dialect_name: Dialecte de la base (expression des trimestres)
+    """
+    source, bucket = _rollup_bucket(granularity, dialect_name)
+    query = select(
+        bucket,
+        func.sum(BankDataRollup.montant_total).label("montant_total"),
+        func.sum(BankDataRollup.transactions_total).label("transactions_total"),
+        func.sum(BankDataRollup.nombre_entrees).label("nombre_entrees")
+    ).where(
+        BankDataRollup.granularity == source,
+        BankDataRollup.period_start >= start,
+        BankDataRollup.period_start < end
+    )
+    if agence:
+        query = query.where(BankDataRollup.agence == agence)
+    return query.group_by(bucket).order_by(bucket)
+
+
+def rollup_agences_query():
+    """Construire la requête de la liste triée des agences (agrégats mensuels, les moins nombreux)."""
+    return select(BankDataRollup.agence).where(
+        BankDataRollup.granularity == "month"
+    ).distinct().order_by(BankDataRollup.agence)
+
+
+def rollup_pivot_query(granularity, metric, start, end, dialect_name="sqlite"):
+    """
+    Construire la requête de la matrice agence x période d'une mesure.
+
+    Args:
+        granularity: "day", "week", "month" ou "quarter"
+        metric: Colonne des agrégats ("montant_total", "transactions_total" ou "nombre_entrees")
+        start: Début de la première période (incluse)
+        end: Début de la période suivant la dernière (exclue)
+        dialect_name: Dialecte de la base (expression des trimestres)
+    """
+    source, bucket = _rollup_bucket(granularity, dialect_name)
+    return select(
+        BankDataRollup.agence,
+        bucket,
+        func.sum(getattr(BankDataRollup, metric)).label("value")
+    ).where(
+        BankDataRollup.granularity == source,
+        BankDataRollup.period_start >= start,
+        BankDataRollup.period_start < end
+    ).group_by(BankDataRollup.agence, bucket)
+
+
+def rollup_top_agences_query(metric, limit, date_from=None, date_to=None):
+    """
+    Construire la requête des agences classées par valeur décroissante d'une mesure.
+
+    Sans intervalle, les agrégats mensuels (les moins nombreux) sont utilisés ;
+    sinon les agrégats journaliers entre les deux dates incluses.
+
+    Args:
+        metric: Colonne des agrégats ("montant_total", "transactions_total" ou "nombre_entrees")
+        limit: Nombre d'agences retournées
+        date_from: Première date incluse
+        date_to: Dernière date incluse
+    """
+    granularity = "day" if date_from or date_to else "month"
+    value = func.sum(getattr(BankDataRollup, metric)).label("value")
+    query = select(BankDataRollup.agence, value).where(BankDataRollup.granularity == granularity)
+    if date_from:
+        query = query.where(BankDataRollup.period_start >= date_from)
+    if date_to:
+        query = query.where(BankDataRollup.period_start <= date_to)
+    return query.group_by(BankDataRollup.agence).order_by(value.desc(), BankDataRollup.agence).limit(limit)
+
+
+def analysis_data_query(start_date, end_date, agence=None):
+    """
+    Construire la requête des données à analyser par l'IA.
+
+    Seules les colonnes utiles sont sélectionnées afin que la requête soit
+    servie par l'index couvrant (date, agence, montant, nombre_transactions).
+    """
+    query = select(
+        BankData.agence,
+        BankData.date,
+        BankData.montant,
+        BankData.nombre_transactions
+    ).where(
+        BankData.date >= start_date,
+        BankData.date <= end_date
+    )
+    if agence:
+        query = query.where(BankData.agence == agence)
+    return query
+
+
+def analysis_fingerprint_query(start_date, end_date, agence=None):
+    """
+    Construire la requête des agrégats journaliers couverts par une analyse.
+
+    Ces agrégats décrivent les données lues par analysis_data_query : ils ne
+    changent que si une ligne de la plage est ajoutée, modifiée ou supprimée.
+    """
+    query = select(
+        BankDataRollup.agence,
+        BankDataRollup.period_start,
+        BankDataRollup.montant_total,
+        BankDataRollup.transactions_total,
+        BankDataRollup.nombre_entrees
+    ).where(
+        BankDataRollup.granularity == "day",
+        BankDataRollup.period_start >= start_date,
+        BankDataRollup.period_start <= end_date,
+        BankDataRollup.nombre_entrees > 0
+    )
+    if agence:
+        query = query.where(BankDataRollup.agence == agence)
+    return query.order_by(BankDataRollup.agence, BankDataRollup.period_start)
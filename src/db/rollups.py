@@ -0,0 +1,208 @@
+"""
+Maintien incrémental des agrégats par agence et par période.
+
+La table bank_data_rollups contient, pour chaque granularité (jour, semaine,
+mois), agence et période, la somme des montants, des transactions et le
+nombre d'entrées. Les routes de statistiques lisent ces agrégats au lieu de
+parcourir bank_data.
+
+Toute écriture ORM sur BankData (API, import ETL, scripts) met à jour les
+agrégats dans la même transaction grâce à l'événement before_flush. Les
+insertions en masse via Core doivent appeler apply_rollup_deltas().
+Ces deux chemins incrémentent aussi la version des données (voir versions.py).
+"""
+import math
+from collections import defaultdict
+
+from sqlalchemy import and_, delete, event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from .database import get_dialect_insert
+from .models import BankData, BankDataRollup
+from .periods import GRANULARITIES, period_start
+from .versions import bump_data_version
+
+# Colonnes de BankData dont dépendent les agrégats
+TRACKED_COLUMNS = ("agence", "date", "montant", "nombre_transactions")
+
+
+def compute_rollup_deltas(records, sign=1, deltas=None):
+    """
+    Calculer les variations d'agrégats induites par des enregistrements.
+
+    Args:
+        records: Itérable de dictionnaires (agence, date, montant, nombre_transactions)
+        sign: 1 pour un ajout, -1 pour une suppression
+        deltas: Dictionnaire de variations à compléter
+
+    Returns:
+        dict: {(granularité, agence, début de période): [montant, transactions, entrées]}
+    """
+    deltas = deltas if deltas is not None else defaultdict(lambda: [0.0, 0, 0])
+    for record in records:
+        for granularity in GRANULARITIES:
+            delta = deltas[(granularity, record["agence"], period_start(record["date"], granularity))]
+            delta[0] += sign * float(record["montant"])
+            delta[1] += sign * int(record["nombre_transactions"])
+            delta[2] += sign
+    return deltas
+
+
+def apply_rollup_deltas(connection, deltas):
+    """
+    Appliquer des variations sur la table d'agrégats.
+
+    Args:
+        connection: Connexion SQLAlchemy (dans la transaction d'écriture)
+        deltas: Variations calculées par compute_rollup_deltas
+    """
+    params = [
+        {
+            "granularity": granularity,
+            "agence": agence,
+            "period_start": start,
+            "montant_total": montant,
+            "transactions_total": transactions,
+            "nombre_entrees": entrees,
+        }
+        for (granularity, agence, start), (montant, transactions, entrees) in deltas.items()
+        if entrees or montant or transactions
+    ]
+    if not params:
+        return
+
+    table = BankDataRollup.__table__
+    insert = get_dialect_insert(connection.dialect.name)
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.granularity, table.c.agence, table.c.period_start],
+            set_={
+                name: table.c[name] + stmt.excluded[name]
+                for name in ("montant_total", "transactions_total", "nombre_entrees")
+            },
+        )
+        connection.execute(stmt, params)
+    else:
+        for values in params:
+            key = and_(
+                table.c.granularity == values["granularity"],
+                table.c.agence == values["agence"],
+                table.c.period_start == values["period_start"],
+            )
+            result = connection.execute(update(table).where(key).values(
+                montant_total=table.c.montant_total + values["montant_total"],
+                transactions_total=table.c.transactions_total + values["transactions_total"],
+                nombre_entrees=table.c.nombre_entrees + values["nombre_entrees"],
+            ))
+            if result.rowcount == 0:
+                connection.execute(table.insert(), values)
+
+    if any(values["nombre_entrees"] < 0 for values in params):
+        # Supprimer les périodes qui ne contiennent plus aucune entrée
+        connection.execute(delete(table).where(table.c.nombre_entrees <= 0))
+
+
+def _record(obj):
+    """Valeurs suivies d'une instance BankData."""
+    return {name: getattr(obj, name) for name in TRACKED_COLUMNS}
+
+
+def _has_tracked_changes(obj):
+    """Indiquer si une colonne suivie d'une instance BankData a été modifiée."""
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in TRACKED_COLUMNS)
+
+
+def _stored_records(connection, objects):
+    """Lire en base les valeurs suivies (avant modification) d'instances persistantes."""
+    ids = [inspect(obj).identity[0] for obj in objects]
+    table = BankData.__table__
+    columns = [table.c[name] for name in TRACKED_COLUMNS]
+    rows = connection.execute(select(*columns).where(table.c.id.in_(ids)))
+    return [dict(row) for row in rows.mappings()]
+
+
+@event.listens_for(Session, "before_flush")
+def maintain_rollups(session, flush_context, instances):
+    """Répercuter les ajouts, modifications et suppressions de BankData sur les agrégats."""
+    added = [_record(obj) for obj in session.new if isinstance(obj, BankData)]
+    modified = [
+        obj for obj in session.dirty
+        if isinstance(obj, BankData) and session.is_modified(obj) and _has_tracked_changes(obj)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, BankData)]
+    if not added and not modified and not deleted:
+        return
+
+    connection = session.connection()
+    # Les anciennes valeurs sont relues en base : l'historique ORM est vide
+    # lorsqu'un attribut expiré (après commit) est modifié
+    removed = _stored_records(connection, modified + deleted) if modified or deleted else []
+    added.extend(_record(obj) for obj in modified)
+
+    deltas = compute_rollup_deltas(added)
+    compute_rollup_deltas(removed, sign=-1, deltas=deltas)
+    apply_rollup_deltas(connection, deltas)
+    bump_data_version(connection)
+
+
+def compute_rollups_from_scan(connection, batch_size=10000):
+    """
+    Recalculer tous les agrégats à partir d'un parcours complet de bank_data.
+
+    Returns:
+        dict: Agrégats au format de compute_rollup_deltas
+    """
+    columns = [BankData.__table__.c[name] for name in TRACKED_COLUMNS]
+    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(select(*columns))
+    deltas = None
+    for partition in result.mappings().partitions():
+        deltas = compute_rollup_deltas(partition, deltas=deltas)
+    return deltas if deltas is not None else {}
+
+
+def rebuild_rollups(connection):
+    """
+    Reconstruire entièrement la table d'agrégats (reprise d'historique).
+
+    La version des données n'est pas incrémentée : c'est à l'appelant de
+    le faire si les agrégats servis par l'API changent.
+
+    Returns:
+        int: Nombre de lignes d'agrégats écrites
+    """
+    deltas = compute_rollups_from_scan(connection)
+    connection.execute(delete(BankDataRollup.__table__))
+    apply_rollup_deltas(connection, deltas)
+    return len(deltas)
+
+
+def check_rollups(connection, tolerance=1e-6):
+    """
+    Comparer la table d'agrégats avec un recalcul complet depuis bank_data.
+
+    Args:
+        connection: Connexion SQLAlchemy
+        tolerance: Écart relatif accepté sur les montants (sommes flottantes)
+
+    Returns:
+        list: Écarts trouvés (liste vide si les agrégats sont cohérents)
+    """
+    expected = compute_rollups_from_scan(connection)
+    table = BankDataRollup.__table__
+    stored = {
+        (row.granularity, row.agence, row.period_start): [row.montant_total, row.transactions_total, row.nombre_entrees]
+        for row in connection.execute(select(table))
+    }
+
+    differences = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        exp = expected.get(key, [0.0, 0, 0])
+        got = stored.get(key, [0.0, 0, 0])
+        if (
+            exp[1:] != list(got[1:])
+            or not math.isclose(exp[0], got[0], rel_tol=tolerance, abs_tol=tolerance)
+        ):
+            differences.append({"key": key, "expected": list(exp), "stored": list(got)})
+    return differences
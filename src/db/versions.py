@@ -0,0 +1,47 @@
+"""
+Version des données pour l'invalidation des caches.
+
+Chaque écriture sur bank_data incrémente, dans la même transaction, un
+compteur monotone de la table data_versions. Les caches de l'API incluent
+cette version dans leurs clés : une entrée devient inaccessible dès que les
+données qu'elle résume changent, quel que soit le processus (API, ETL,
+scripts) qui les a modifiées.
+"""
+import datetime
+
+from sqlalchemy import select, update
+
+from .models import DataVersion
+
+# Nom du compteur associé à bank_data
+BANK_DATA_VERSION = "bank_data"
+# Nom du compteur associé aux utilisateurs (cache des utilisateurs authentifiés)
+USERS_VERSION = "users"
+
+
+def data_version_query(name=BANK_DATA_VERSION):
+    """Construire la requête de lecture d'un compteur de version."""
+    table = DataVersion.__table__
+    return select(table.c.version, table.c.updated_at).where(table.c.name == name)
+
+
+def get_data_version(connection, name=BANK_DATA_VERSION):
+    """
+    Lire un compteur de version.
+
+    Returns:
+        tuple: (version, date de dernière modification) ; (0, None) si aucune écriture
+    """
+    row = connection.execute(data_version_query(name)).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def bump_data_version(connection, name=BANK_DATA_VERSION):
+    """Incrémenter un compteur de version dans la transaction en cours."""
+    table = DataVersion.__table__
+    now = datetime.datetime.now()
+    result = connection.execute(
+        update(table).where(table.c.name == name).values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert(), {"name": name, "version": 1, "updated_at": now})
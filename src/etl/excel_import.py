@@ -5,6 +5,7 @@ import os
 import pandas as pd
 from pathlib import Path
 from datetime import datetime, date
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 
 from src.db.database import SessionLocal, engine
@@ -176,8 +177,25 @@ def insert_data_to_db(df):
                 # Convertir le DataFrame en liste de dictionnaires
                 records = batch_df.to_dict(orient='records')
                 
+                # Entrées déjà importées (même agence, même date) : mises à jour,
+                # ce qui rend la réimportation d'un fichier sans effet
+                keys = [(record['agence'], record['date']) for record in records]
+                existing = {
+                    (bank_data.agence, bank_data.date): bank_data
+                    for bank_data in db.execute(
+                        select(BankData).where(tuple_(BankData.agence, BankData.date).in_(keys))
+                    ).scalars()
+                }
+                
                 # Insérer les enregistrements dans la base de données
                 for record in records:
+                    bank_data = existing.get((record['agence'], record['date']))
+                    if bank_data is not None:
+                        bank_data.montant = record['montant']
+                        bank_data.nombre_transactions = record['nombre_transactions']
+                        count += 1
+                        continue
+                    
                     # Créer un nouvel objet BankData
                     bank_data = BankData(
                         agence=record['agence'],
@@ -186,6 +204,7 @@ def insert_data_to_db(df):
                         nombre_transactions=record['nombre_transactions']
                     )
                     db.add(bank_data)
+                    existing[(record['agence'], record['date'])] = bank_data
                     count += 1
                 
                 # Commit par lot
@@ -2,20 +2,24 @@
 """
 Service d'IA pour l'analyse des données bancaires.
 Ce module fournit des fonctionnalités d'analyse de données bancaires utilisant
-des modèles de langage (LLM) comme OpenAI ou HuggingFace.
+des modèles de langage (LLM) comme OpenAI ou HuggingFace (voir providers.py).
 """
-import os
 import json
 import time
 import logging
+import threading
+import uuid
+from contextlib import closing
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Union, Any
 from pathlib import Path
 
 import pandas as pd
 import matplotlib.pyplot as plt
 from dotenv import load_dotenv
-import requests
+
+from src.ia.llm_cache import LLM_CACHE_LOOKUPS, llm_response_cache, make_cache_key
+from src.ia.providers import LLM_PROVIDER, LLMProvider, create_providers
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -24,36 +28,126 @@ logger = logging.getLogger(__name__)
 # Charger les variables d'environnement depuis .env
 load_dotenv()
 
-# Configuration de l'API OpenAI ou autre API LLM
-API_KEY = os.getenv("LLM_API_KEY", "")
-HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY", "")
-USE_ALTERNATIVE_API = not API_KEY or API_KEY == "your-api-key-here"
+# pyplot repose sur un état global : les graphiques sont générés un par un
+# lorsque plusieurs analyses s'exécutent en parallèle dans des threads
+_PLOT_LOCK = threading.Lock()
 
 
 class AIAnalysisService:
     """Service d'analyse par IA des données bancaires."""
     
-    def __init__(self, use_alternative_api: bool = USE_ALTERNATIVE_API):
+    def __init__(
+        self,
+        use_alternative_api: Optional[bool] = None,
+        response_cache=llm_response_cache,
+        providers: Optional[List[LLMProvider]] = None
+    ):
         """
         Initialiser le service d'analyse IA.
         
         Args:
-            use_alternative_api (bool): Si True, utilise une API alternative (HuggingFace)
-                                       au lieu d'OpenAI.
+            use_alternative_api (bool): Si True, utilise l'API alternative (HuggingFace),
+                                       si False OpenAI ; par défaut, LLM_PROVIDER.
+            response_cache: Cache des réponses des LLM (voir llm_cache.py)
+            providers: Fournisseur principal suivi des fournisseurs de secours
+                       (remplace use_alternative_api)
         """
-        self.use_alternative_api = use_alternative_api
-        logger.info(f"Service d'analyse IA initialisé (API alternative: {use_alternative_api})")
+        if providers is None:
+            if use_alternative_api is None:
+                providers = create_providers(LLM_PROVIDER)
+            else:
+                providers = create_providers("huggingface" if use_alternative_api else "openai")
+        self.providers = providers
+        self.response_cache = response_cache
+        logger.info(f"Service d'analyse IA initialisé (fournisseurs: {', '.join(p.name for p in providers)})")
+    
+    @property
+    def model_used(self) -> str:
+        """Modèle du fournisseur principal."""
+        return self.providers[0].model
     
-    def analyze_bank_data(self, data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    def analyze_bank_data(
+        self,
+        data: Union[pd.DataFrame, List[Dict[str, Any]]],
+        use_cache: bool = True,
+        include_visualizations: bool = True
+    ) -> Dict[str, Any]:
         """
         Analyser les données bancaires avec un LLM et générer un rapport.
         
         Args:
             data: Données bancaires sous forme de DataFrame pandas ou liste de dictionnaires
+            use_cache: Si False, le rapport est régénéré sans consulter le cache des réponses
+            include_visualizations: Générer les visualisations
             
         Returns:
             Dict contenant le rapport et des métadonnées associées
         """
+        df = self._prepare_dataframe(data)
+            
+        # Générer rapport textuel
+        prompt = self._prepare_prompt(df)
+        report_text = self._generate_report(prompt, use_cache)
+        
+        # Générer visualisations
+        visualizations = self._generate_visualizations(df) if include_visualizations else []
+        
+        # Préparer la réponse
+        result = {
+            "report": report_text,
+            "visualizations": visualizations,
+            "metadata": self._describe_data(df)
+        }
+        
+        return result
+    
+    def stream_analysis(
+        self,
+        data: Union[pd.DataFrame, List[Dict[str, Any]]],
+        include_visualizations: bool = True,
+        use_cache: bool = True
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Analyser les données bancaires en produisant chaque étape dès qu'elle est prête.
+        
+        Fermer le générateur interrompt la génération du rapport (la connexion
+        au fournisseur est fermée).
+        
+        Args:
+            data: Données bancaires sous forme de DataFrame pandas ou liste de dictionnaires
+            include_visualizations: Générer les visualisations
+            use_cache: Si False, le rapport est régénéré sans consulter le cache des réponses
+            
+        Yields:
+            Tuples (étape, données) : ("statistics", statistiques et métadonnées),
+            ("visualizations", visualisations) si demandées, ("token", fragment du
+            rapport) répété, puis ("result", résultat au format d'analyze_bank_data)
+        """
+        df = self._prepare_dataframe(data)
+        statistics = self._compute_statistics(df)
+        metadata = self._describe_data(df)
+        yield "statistics", {**statistics, "metadata": metadata}
+        
+        visualizations = []
+        if include_visualizations:
+            visualizations = self._generate_visualizations(df)
+            yield "visualizations", visualizations
+        
+        report = []
+        with closing(self._stream_report(self._prepare_prompt(df, statistics), use_cache)) as chunks:
+            for chunk in chunks:
+                report.append(chunk)
+                yield "token", chunk
+        
+        yield "result", {"report": "".join(report), "visualizations": visualizations, "metadata": metadata}
+    
+    def _prepare_dataframe(self, data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> pd.DataFrame:
+        """
+        Convertir et valider les données bancaires.
+        
+        Raises:
+            ValueError: Si des colonnes nécessaires sont absentes
+        """
         # Convertir en DataFrame si nécessaire
         if not isinstance(data, pd.DataFrame):
             df = pd.DataFrame(data)
@@ -69,40 +163,29 @@ class AIAnalysisService:
         # Convertir la colonne date en datetime si ce n'est pas déjà fait
         if not pd.api.types.is_datetime64_any_dtype(df["date"]):
             df["date"] = pd.to_datetime(df["date"])
-            
-        # Générer rapport textuel
-        prompt = self._prepare_prompt(df)
-        report_text = self._generate_report(prompt)
-        
-        # Générer visualisations
-        visualizations = self._generate_visualizations(df)
-        
-        # Préparer la réponse
-        result = {
-            "report": report_text,
-            "visualizations": visualizations,
-            "metadata": {
-                "timestamp": datetime.now().isoformat(),
-                "data_points": len(df),
-                "date_range": {
-                    "start": df["date"].min().isoformat(),
-                    "end": df["date"].max().isoformat()
-                },
-                "agencies": df["agence"].unique().tolist()
-            }
+        return df
+    
+    def _describe_data(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Métadonnées d'une analyse (nombre de points, période, agences)."""
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "data_points": len(df),
+            "date_range": {
+                "start": df["date"].min().isoformat(),
+                "end": df["date"].max().isoformat()
+            },
+            "agencies": df["agence"].unique().tolist()
         }
-        
-        return result
     
-    def _prepare_prompt(self, df: pd.DataFrame) -> str:
+    def _compute_statistics(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
-        Préparer le prompt pour l'IA en extrayant les statistiques des données.
+        Extraire les statistiques des données (globales et par agence).
         
         Args:
             df: DataFrame contenant les données bancaires
             
         Returns:
-            str: Prompt formaté pour l'IA
+            Dict avec les clés "global" et "agencies" (valeurs sérialisables en JSON)
         """
         # Préparation des statistiques essentielles pour l'analyse
         total_montant = df["montant"].sum() if not df.empty else 0
@@ -155,7 +238,7 @@ class AIAnalysisService:
         # Préparation des données pour le prompt
         stats = {
             "total_montant": f"{total_montant:,.2f} €",
-            "total_transactions": total_transactions,
+            "total_transactions": int(total_transactions),
             "moyenne_montant": f"{moyenne_montant:,.2f} €",
             "meilleure_agence": best_agency,
             "evolution_semaine": f"{evolution_percentage:.2f}%"
@@ -167,10 +250,28 @@ class AIAnalysisService:
             agence_df = df[df["agence"] == agence]
             agency_stats[agence] = {
                 "total_montant": f"{agence_df['montant'].sum():,.2f} €",
-                "total_transactions": agence_df["nombre_transactions"].sum(),
+                "total_transactions": int(agence_df["nombre_transactions"].sum()),
                 "moyenne_montant": f"{agence_df['montant'].mean():,.2f} €"
             }
         
+        return {"global": stats, "agencies": agency_stats}
+    
+    def _prepare_prompt(self, df: pd.DataFrame, statistics: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Préparer le prompt pour l'IA à partir des statistiques des données.
+        
+        Args:
+            df: DataFrame contenant les données bancaires
+            statistics: Statistiques déjà calculées par _compute_statistics
+            
+        Returns:
+            str: Prompt formaté pour l'IA
+        """
+        if statistics is None:
+            statistics = self._compute_statistics(df)
+        stats = statistics["global"]
+        agency_stats = statistics["agencies"]
+        
         # Construction du prompt pour l'IA
         prompt = f"""
         Analyser les données bancaires suivantes et générer un rapport détaillé pour le directeur.
@@ -203,82 +304,132 @@ class AIAnalysisService:
         
         return prompt
     
-    def _generate_report(self, prompt: str) -> str:
+    def _generate_report(self, prompt: str, use_cache: bool = True) -> str:
         """
         Générer un rapport en utilisant un LLM.
         
+        Les fournisseurs sont essayés dans l'ordre ; si aucun ne répond, un
+        rapport de secours est produit.
+        
         Args:
             prompt: Prompt contenant les instructions et données pour l'IA
+            use_cache: Consulter le cache des réponses avant d'appeler le LLM
             
         Returns:
             str: Texte du rapport généré
         """
         logger.info("Génération du rapport en cours...")
         
-        try:
-            if self.use_alternative_api:
-                logger.info("Utilisation de l'API alternative (HuggingFace)")
-                response = self._call_alternative_llm(prompt)
-            else:
-                logger.info("Utilisation de l'API OpenAI")
-                response = self._call_openai(prompt)
-                
-            logger.info("Rapport généré avec succès")
-            return response
-        except Exception as e:
-            logger.error(f"Erreur lors de la génération du rapport: {e}")
-            return self._generate_fallback_report(prompt)
+        for provider in self.providers:
+            if not provider.available:
+                logger.warning(f"Pas de clé API pour {provider.name}, fournisseur ignoré")
+                continue
+            logger.info(f"Utilisation du fournisseur {provider.name}")
+            try:
+                response = self._complete(
+                    provider.name, provider.model, prompt, provider.parameters,
+                    lambda: provider.complete(prompt), use_cache
+                )
+                logger.info("Rapport généré avec succès")
+                return response
+            except Exception as e:
+                logger.error(f"Erreur lors de l'appel à {provider.name}: {e}")
+        return self._generate_fallback_report(prompt)
     
-    def _call_openai(self, prompt: str) -> str:
-        """Appeler l'API OpenAI pour générer un rapport."""
-        try:
-            import openai
-            openai.api_key = API_KEY
-            
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Vous êtes un analyste financier expert spécialisé dans l'analyse de données bancaires."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1500
-            )
-            
-            return response.choices[0].message.content
-        except Exception as e:
-            logger.error(f"Erreur lors de l'appel à l'API OpenAI: {e}")
-            return self._call_alternative_llm(prompt)
+    def _complete(self, provider: str, model: str, prompt: str, parameters: Dict[str, Any], call, use_cache: bool = True) -> str:
+        """
+        Obtenir la réponse d'un LLM, depuis le cache si possible.
+        
+        Seules les réponses effectivement produites par le LLM sont mises en
+        cache ; une réponse obtenue sans consulter le cache le met à jour.
+        
+        Args:
+            provider: Nom du fournisseur
+            model: Modèle utilisé
+            prompt: Prompt envoyé
+            parameters: Paramètres de génération
+            call: Fonction sans argument appelant le LLM
+            use_cache: Consulter le cache avant l'appel
+        """
+        key = make_cache_key(provider, model, prompt, parameters)
+        if use_cache:
+            cached = self.response_cache.get(provider, key)
+            if cached is not None:
+                logger.info("Rapport trouvé dans le cache des réponses")
+                return cached
+        else:
+            LLM_CACHE_LOOKUPS.labels(provider, "bypass").inc()
+        response = call()
+        self.response_cache.set(provider, model, key, response)
+        return response
     
-    def _call_alternative_llm(self, prompt: str) -> str:
-        """Appeler une API alternative (HuggingFace) pour générer un rapport."""
+    def _stream_completion(self, provider: str, model: str, prompt: str, parameters: Dict[str, Any], stream, fallback, use_cache: bool = True) -> Iterator[str]:
+        """
+        Diffuser la réponse d'un LLM fragment par fragment, depuis le cache si possible.
+        
+        Une erreur avant le premier fragment bascule sur `fallback` ; après, le
+        texte déjà transmis ne peut être remplacé et l'erreur est remontée.
+        Seule une réponse complète est mise en cache (même clé que _complete).
+        
+        Args:
+            provider: Nom du fournisseur
+            model: Modèle utilisé
+            prompt: Prompt envoyé
+            parameters: Paramètres de génération
+            stream: Fonction sans argument retournant le générateur des fragments
+            fallback: Fonction sans argument retournant les fragments de secours
+            use_cache: Consulter le cache avant l'appel
+        """
+        key = make_cache_key(provider, model, prompt, parameters)
+        if use_cache:
+            cached = self.response_cache.get(provider, key)
+            if cached is not None:
+                logger.info("Rapport trouvé dans le cache des réponses")
+                yield cached
+                return
+        else:
+            LLM_CACHE_LOOKUPS.labels(provider, "bypass").inc()
+        parts = []
         try:
-            # Utilisation de l'API HuggingFace comme alternative
-            API_URL = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2"
-            headers = {"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"}
-            
-            # Si pas de clé HuggingFace, utiliser la méthode de fallback
-            if not HUGGINGFACE_API_KEY:
-                logger.warning("Pas de clé API HuggingFace, fallback sur rapport simulé")
-                return self._generate_fallback_report(prompt)
-            
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": 1024,
-                    "temperature": 0.7
-                }
-            }
-            
-            response = requests.post(API_URL, headers=headers, json=payload)
-            if response.status_code != 200:
-                logger.error(f"Erreur API HuggingFace: {response.status_code} - {response.text}")
-                return self._generate_fallback_report(prompt)
-                
-            return response.json()[0]["generated_text"]
-            
+            with closing(stream()) as chunks:
+                for chunk in chunks:
+                    parts.append(chunk)
+                    yield chunk
         except Exception as e:
-            logger.error(f"Erreur lors de l'appel à l'API alternative: {e}")
-            return self._generate_fallback_report(prompt)
+            if parts:
+                raise
+            logger.error(f"Erreur lors de l'appel en flux à {provider}: {e}")
+            yield from fallback()
+            return
+        self.response_cache.set(provider, model, key, "".join(parts))
+    
+    def _stream_report(self, prompt: str, use_cache: bool = True, providers: Optional[List[LLMProvider]] = None) -> Iterator[str]:
+        """
+        Générer un rapport fragment par fragment, au fil de la réponse du LLM.
+        
+        Args:
+            prompt: Prompt contenant les instructions et données pour l'IA
+            use_cache: Consulter le cache des réponses avant d'appeler le LLM
+            providers: Fournisseurs restant à essayer (par défaut, tous)
+        """
+        if providers is None:
+            logger.info("Génération du rapport en flux...")
+            providers = self.providers
+        available = [provider for provider in providers if provider.available]
+        if not available:
+            logger.warning("Aucun fournisseur disponible, fallback sur rapport simulé")
+            return self._stream_fallback_report(prompt)
+        provider, remaining = available[0], available[1:]
+        return self._stream_completion(
+            provider.name, provider.model, prompt, provider.parameters,
+            lambda: provider.stream(prompt),
+            lambda: self._stream_report(prompt, use_cache, remaining),
+            use_cache
+        )
+    
+    def _stream_fallback_report(self, prompt: str) -> Iterator[str]:
+        """Rapport de secours, en un seul fragment."""
+        yield self._generate_fallback_report(prompt)
     
     def _generate_fallback_report(self, prompt: str) -> str:
         """
@@ -345,12 +496,18 @@ Les performances globales sont satisfaisantes avec une tendance positive. La div
         Returns:
             Liste de dictionnaires contenant les chemins et titres des visualisations générées
         """
+        with _PLOT_LOCK:
+            return self._render_visualizations(df)
+    
+    def _render_visualizations(self, df: pd.DataFrame) -> List[Dict[str, str]]:
+        """Générer les fichiers PNG des visualisations (appelé sous _PLOT_LOCK)."""
         # Créer un répertoire pour les visualisations si nécessaire
         output_dir = Path("output")
         output_dir.mkdir(exist_ok=True)
         
-        # Timestamp unique pour les fichiers
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Horodatage suivi d'un identifiant aléatoire : deux analyses lancées
+        # dans la même seconde n'écrasent pas leurs fichiers respectifs
+        timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex}"
         visualizations = []
         
         try:
@@ -0,0 +1,158 @@
+"""
+Cache sur disque des réponses des LLM.
+
+Un rapport demandé plusieurs fois avec le même prompt (le rapport du matin,
+consulté toute la journée) n'est généré qu'une fois. La clé combine le
+fournisseur, le modèle, le prompt normalisé (espaces de début et de fin de
+ligne ignorés) et les paramètres de génération.
+
+Les réponses sont stockées dans une base SQLite (LLM_CACHE_PATH), partagée
+entre les processus et conservée au redémarrage. Elles expirent après
+LLM_CACHE_TTL_SECONDS ; au-delà de LLM_CACHE_MAX_ENTRIES, les moins
+récemment utilisées sont supprimées. Un chemin vide désactive le cache.
+Une erreur du cache (base verrouillée, disque plein) est journalisée et
+traitée comme une absence : elle n'empêche pas la génération du rapport.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+
+LLM_CACHE_LOOKUPS = Counter(
+    "llm_cache_lookups_total",
+    "Recherches dans le cache des réponses des LLM (hit, miss, bypass)",
+    ["provider", "outcome"],
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used_at ON llm_responses (last_used_at);
+"""
+
+
+def normalize_prompt(prompt):
+    """Normaliser un prompt : lignes sans espaces de début et de fin, lignes vides retirées."""
+    return "\n".join(line.strip() for line in prompt.strip().splitlines() if line.strip())
+
+
+def make_cache_key(provider, model, prompt, parameters):
+    """Construire la clé d'une réponse (hash SHA-256)."""
+    payload = json.dumps(
+        {"provider": provider, "model": model, "prompt": normalize_prompt(prompt), "parameters": parameters},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """Cache des réponses des LLM stocké dans une base SQLite."""
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    @property
+    def enabled(self):
+        """Indiquer si le cache est actif."""
+        return bool(self.path) and self.max_entries > 0
+
+    def _connect(self):
+        """Ouvrir une connexion (une par opération : le service est appelé depuis plusieurs threads)."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def get(self, provider, key):
+        """Retourner la réponse associée à la clé, ou None si absente ou expirée."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache des réponses LLM indisponible: {e}")
+            return None
+        try:
+            with conn:
+                row = conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] + self.ttl < now:
+                    conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    row = None
+                if row is not None:
+                    conn.execute("UPDATE llm_responses SET last_used_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Lecture du cache des réponses LLM impossible: {e}")
+            row = None
+        finally:
+            conn.close()
+        LLM_CACHE_LOOKUPS.labels(provider, "hit" if row is not None else "miss").inc()
+        return row[0] if row is not None else None
+
+    def set(self, provider, model, key, response):
+        """Enregistrer une réponse en supprimant les moins récemment utilisées au-delà de max_entries."""
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache des réponses LLM indisponible: {e}")
+            return
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, provider, model, response, created_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, provider, model, response, now, now),
+                )
+                conn.execute(
+                    "DELETE FROM llm_responses WHERE key IN ("
+                    "SELECT key FROM llm_responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Écriture dans le cache des réponses LLM impossible: {e}")
+        finally:
+            conn.close()
+
+    def clear(self):
+        """Supprimer toutes les réponses."""
+        if not self.enabled or not Path(self.path).exists():
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM llm_responses")
+        finally:
+            conn.close()
+
+
+llm_response_cache = LLMResponseCache()
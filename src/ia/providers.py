@@ -0,0 +1,205 @@
+"""
+Fournisseurs de LLM utilisés par le service d'analyse.
+
+Le fournisseur est choisi par la variable LLM_PROVIDER :
+
+- `openai` : API compatible OpenAI (chat completions) à l'adresse
+  LLM_API_BASE, avec la clé LLM_API_KEY (OpenAI, vLLM, Ollama...) ;
+- `huggingface` : API d'inférence HuggingFace (HUGGINGFACE_API_URL) ;
+- `local` : serveur local compatible OpenAI, sans clé, à l'adresse
+  LLM_LOCAL_API_BASE. Le serveur de substitution
+  (python -m src.scripts.llm_standin_server) permet de mesurer le chemin
+  des analyses sans appeler d'API payante.
+
+Sans LLM_PROVIDER, OpenAI est utilisé si une clé est configurée,
+HuggingFace sinon (comportement historique). En cas d'échec, le service
+essaie les fournisseurs de secours (LLM_FALLBACK_PROVIDERS, par défaut
+HuggingFace après OpenAI) puis produit un rapport simulé.
+"""
+import os
+from contextlib import closing
+from typing import Any, Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from src.ia.transport import get_transport
+
+load_dotenv()
+
+API_KEY = os.getenv("LLM_API_KEY", "")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+LLM_API_BASE = os.getenv("LLM_API_BASE", "https://api.openai.com/v1")
+HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY", "")
+HUGGINGFACE_API_URL = os.getenv(
+    "HUGGINGFACE_API_URL",
+    "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2"
+)
+LLM_LOCAL_API_BASE = os.getenv("LLM_LOCAL_API_BASE", "http://127.0.0.1:8089/v1")
+LLM_LOCAL_MODEL = os.getenv("LLM_LOCAL_MODEL", "standin")
+USE_ALTERNATIVE_API = not API_KEY or API_KEY == "your-api-key-here"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "huggingface" if USE_ALTERNATIVE_API else "openai")
+# Fournisseurs essayés, dans l'ordre, après l'échec du fournisseur principal
+LLM_FALLBACK_PROVIDERS = os.getenv("LLM_FALLBACK_PROVIDERS")
+
+SYSTEM_PROMPT = "Vous êtes un analyste financier expert spécialisé dans l'analyse de données bancaires."
+
+# Fournisseurs de secours par défaut
+DEFAULT_FALLBACKS = {"openai": ["huggingface"]}
+
+
+class LLMProvider:
+    """
+    Fournisseur de LLM.
+
+    Attributes:
+        name: Nom du fournisseur (transport, métriques, cache des réponses)
+        model: Modèle utilisé (cache des réponses, métadonnées des analyses)
+        parameters: Paramètres de génération (clé du cache des réponses)
+    """
+
+    name = None
+    model = None
+    parameters: Dict[str, Any] = {}
+
+    @property
+    def available(self) -> bool:
+        """Indiquer si le fournisseur est configuré (clé d'API présente)."""
+        return True
+
+    def complete(self, prompt: str) -> str:
+        """
+        Générer la réponse complète à un prompt.
+
+        Raises:
+            LLMTransportError: Si l'appel échoue
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Générer la réponse à un prompt fragment par fragment.
+
+        Fermer le générateur ferme la connexion au fournisseur.
+
+        Raises:
+            LLMTransportError: Si l'appel échoue
+        """
+        raise NotImplementedError
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """API chat completions compatible OpenAI."""
+
+    def __init__(
+        self, name="openai", api_base=LLM_API_BASE, api_key=API_KEY, model=LLM_MODEL, max_tokens=1500, require_key=True
+    ):
+        self.name = name
+        self.api_base = api_base.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.require_key = require_key
+        self.parameters = {"max_tokens": max_tokens, "system": SYSTEM_PROMPT}
+
+    @property
+    def available(self):
+        return not self.require_key or bool(self.api_key) and self.api_key != "your-api-key-here"
+
+    def _request(self, prompt, stream=False):
+        """Requête chat completions et en-têtes."""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": self.parameters["max_tokens"]
+        }
+        if stream:
+            payload["stream"] = True
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
+        return payload, headers
+
+    def complete(self, prompt):
+        payload, headers = self._request(prompt)
+        response = get_transport(self.name).post_json(f"{self.api_base}/chat/completions", payload, headers=headers)
+        return response["choices"][0]["message"]["content"]
+
+    def stream(self, prompt):
+        payload, headers = self._request(prompt, stream=True)
+        events = get_transport(self.name).stream_json(f"{self.api_base}/chat/completions", payload, headers=headers)
+        with closing(events):
+            for event in events:
+                for choice in event.get("choices", []):
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        yield content
+
+
+class HuggingFaceProvider(LLMProvider):
+    """API d'inférence HuggingFace (text-generation)."""
+
+    def __init__(self, api_url=HUGGINGFACE_API_URL, api_key=HUGGINGFACE_API_KEY):
+        self.name = "huggingface"
+        self.api_url = api_url
+        self.api_key = api_key
+        # Historiquement, le modèle enregistré dans le cache est l'URL d'inférence
+        self.model = api_url
+        self.parameters = {"max_new_tokens": 1024, "temperature": 0.7}
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def _request(self, prompt, stream=False):
+        """Requête d'inférence et en-têtes."""
+        payload = {"inputs": prompt, "parameters": dict(self.parameters)}
+        if stream:
+            payload["stream"] = True
+        return payload, {"Authorization": f"Bearer {self.api_key}"}
+
+    def complete(self, prompt):
+        payload, headers = self._request(prompt)
+        response = get_transport(self.name).post_json(self.api_url, payload, headers=headers)
+        return response[0]["generated_text"]
+
+    def stream(self, prompt):
+        payload, headers = self._request(prompt, stream=True)
+        events = get_transport(self.name).stream_json(self.api_url, payload, headers=headers)
+        with closing(events):
+            for event in events:
+                token = event.get("token") or {}
+                if token.get("text") and not token.get("special"):
+                    yield token["text"]
+
+
+def create_provider(name) -> LLMProvider:
+    """
+    Créer un fournisseur à partir de son nom.
+
+    Raises:
+        ValueError: Si le fournisseur est inconnu
+    """
+    if name == "openai":
+        return OpenAICompatibleProvider()
+    if name == "huggingface":
+        return HuggingFaceProvider()
+    if name == "local":
+        return OpenAICompatibleProvider(
+            name="local", api_base=LLM_LOCAL_API_BASE, api_key="", model=LLM_LOCAL_MODEL, require_key=False
+        )
+    raise ValueError(f"Fournisseur de LLM inconnu: {name} (openai, huggingface ou local)")
+
+
+def create_providers(name=LLM_PROVIDER, fallbacks=LLM_FALLBACK_PROVIDERS) -> List[LLMProvider]:
+    """
+    Créer le fournisseur principal suivi de ses fournisseurs de secours.
+
+    Args:
+        name: Fournisseur principal
+        fallbacks: Fournisseurs de secours séparés par des virgules (None : valeur par défaut)
+    """
+    if fallbacks is None:
+        names = DEFAULT_FALLBACKS.get(name, [])
+    else:
+        names = [fallback.strip() for fallback in fallbacks.split(",") if fallback.strip()]
+    return [create_provider(name)] + [create_provider(fallback) for fallback in names if fallback != name]
@@ -0,0 +1,260 @@
+"""
+Transport HTTP partagé des appels aux LLM.
+
+Chaque fournisseur (openai, huggingface...) dispose d'un transport avec :
+- une session requests dont les connexions sont conservées (keep-alive) et
+  réutilisées d'un appel à l'autre ;
+- des délais de connexion et de lecture : un fournisseur qui ne répond plus
+  n'immobilise pas un worker indéfiniment ;
+- des nouvelles tentatives bornées, avec attente exponentielle aléatoire
+  (jitter), sur les erreurs réseau et les réponses 429/5xx (Retry-After est
+  respecté) ;
+- un nombre maximal d'appels simultanés.
+
+Les réponses diffusées en flux (stream_json, Server-Sent Events du
+fournisseur) occupent une place jusqu'à la fin du flux ; fermer le
+générateur ferme la connexion, ce qui interrompt la génération.
+
+Les latences, codes de réponse et nouvelles tentatives de chaque fournisseur
+sont exposés dans les métriques Prometheus (/metrics).
+"""
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from prometheus_client import Counter, Gauge, Histogram
+
+# Délais (secondes) d'établissement de la connexion et d'attente des données
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+# Nouvelles tentatives après la première, et bornes de l'attente entre deux tentatives
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+# Connexions conservées par fournisseur
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+# Appels simultanés par fournisseur (LLM_MAX_CONCURRENCY_<FOURNISSEUR> pour un fournisseur donné)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# Codes HTTP pour lesquels l'appel est retenté
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds",
+    "Durée des appels HTTP aux fournisseurs de LLM (par tentative)",
+    ["provider", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+LLM_REQUESTS = Counter(
+    "llm_requests_total",
+    "Tentatives d'appel aux fournisseurs de LLM, par code HTTP ou type d'erreur",
+    ["provider", "status"],
+)
+LLM_RETRIES = Counter(
+    "llm_retries_total",
+    "Nouvelles tentatives d'appel aux fournisseurs de LLM",
+    ["provider"],
+)
+LLM_IN_FLIGHT = Gauge(
+    "llm_requests_in_flight",
+    "Appels en cours vers les fournisseurs de LLM",
+    ["provider"],
+)
+
+
+class LLMTransportError(Exception):
+    """Échec d'un appel à un fournisseur de LLM, après les nouvelles tentatives."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _provider_concurrency(provider):
+    """Nombre maximal d'appels simultanés d'un fournisseur."""
+    return int(os.getenv(f"LLM_MAX_CONCURRENCY_{provider.upper()}", str(LLM_MAX_CONCURRENCY)))
+
+
+def _retry_after(response):
+    """Délai demandé par l'en-tête Retry-After (en secondes), ou None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMTransport:
+    """Transport HTTP d'un fournisseur de LLM."""
+
+    def __init__(
+        self,
+        provider,
+        max_concurrency=None,
+        connect_timeout=LLM_CONNECT_TIMEOUT,
+        read_timeout=LLM_READ_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        backoff_base=LLM_BACKOFF_BASE_SECONDS,
+        backoff_max=LLM_BACKOFF_MAX_SECONDS,
+        pool_size=LLM_POOL_SIZE,
+        session=None,
+    ):
+        self.provider = provider
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = session or self._create_session(pool_size)
+        if max_concurrency is None:
+            max_concurrency = _provider_concurrency(provider)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    @staticmethod
+    def _create_session(pool_size):
+        """Créer une session dont les connexions sont réutilisées (sans nouvelle tentative implicite)."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _backoff(self, attempt, response=None):
+        """Attente avant la tentative suivante (exponentielle, aléatoire, bornée)."""
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _send(self, url, payload, headers, stream=False):
+        """
+        Effectuer une tentative, dans la limite des appels simultanés.
+
+        En flux (stream=True), la durée mesurée est celle de l'attente des
+        en-têtes et la place n'est libérée par _release() qu'à la fin du flux.
+        """
+        # Attendre une place au plus le temps d'une lecture
+        if not self._slots.acquire(timeout=self.timeout[1]):
+            LLM_REQUESTS.labels(self.provider, "saturated").inc()
+            raise LLMTransportError(f"{self.provider}: trop d'appels simultanés")
+        LLM_IN_FLIGHT.labels(self.provider).inc()
+        start = time.perf_counter()
+        outcome = "error"
+        keep_slot = False
+        try:
+            response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout, stream=stream)
+            outcome = "success" if response.ok else "http_error"
+            LLM_REQUESTS.labels(self.provider, str(response.status_code)).inc()
+            keep_slot = stream and response.ok
+            return response
+        except requests.Timeout:
+            outcome = "timeout"
+            LLM_REQUESTS.labels(self.provider, "timeout").inc()
+            raise
+        except requests.ConnectionError:
+            LLM_REQUESTS.labels(self.provider, "connection_error").inc()
+            raise
+        finally:
+            LLM_REQUEST_SECONDS.labels(self.provider, outcome).observe(time.perf_counter() - start)
+            if not keep_slot:
+                self._release()
+
+    def _release(self):
+        """Libérer la place d'un appel terminé."""
+        LLM_IN_FLIGHT.labels(self.provider).dec()
+        self._slots.release()
+
+    def _request(self, url, payload, headers, stream=False):
+        """
+        Envoyer une requête POST JSON, avec les nouvelles tentatives.
+
+        Returns:
+            requests.Response: Réponse réussie (2xx)
+
+        Raises:
+            LLMTransportError: Si l'appel échoue après les nouvelles tentatives
+        """
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self._send(url, payload, headers, stream)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error = LLMTransportError(f"{self.provider}: {e}")
+            else:
+                if response.ok:
+                    return response
+                error = LLMTransportError(
+                    f"{self.provider}: HTTP {response.status_code} - {response.text[:200]}",
+                    status_code=response.status_code,
+                )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise error
+            if attempt == self.max_retries:
+                raise error
+            LLM_RETRIES.labels(self.provider).inc()
+            time.sleep(self._backoff(attempt, response))
+
+    def post_json(self, url, payload, headers=None):
+        """
+        Envoyer une requête POST JSON et retourner la réponse décodée.
+
+        Args:
+            url: URL de l'API du fournisseur
+            payload: Corps de la requête (sérialisé en JSON)
+            headers: En-têtes supplémentaires (authentification)
+
+        Raises:
+            LLMTransportError: Si l'appel échoue après les nouvelles tentatives
+        """
+        return self._request(url, payload, headers).json()
+
+    def stream_json(self, url, payload, headers=None):
+        """
+        Envoyer une requête POST JSON et lire la réponse diffusée en Server-Sent Events.
+
+        Seul l'établissement du flux est retenté : une erreur en cours de
+        lecture est remontée telle quelle, le texte déjà produit ayant pu
+        être transmis.
+
+        Yields:
+            Données décodées de chaque événement (jusqu'à « [DONE] »)
+
+        Raises:
+            LLMTransportError: Si l'appel échoue ou si le flux est interrompu
+        """
+        response = self._request(url, payload, headers, stream=True)
+        try:
+            # Octets décodés en UTF-8 : requests supposerait ISO-8859-1 pour text/event-stream sans charset
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:"):].strip()
+                if data == b"[DONE]":
+                    break
+                yield json.loads(data.decode("utf-8"))
+        except requests.RequestException as e:
+            LLM_REQUESTS.labels(self.provider, "stream_error").inc()
+            raise LLMTransportError(f"{self.provider}: flux interrompu ({e})")
+        finally:
+            response.close()
+            self._release()
+
+    def close(self):
+        """Fermer les connexions conservées."""
+        self.session.close()
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(provider):
+    """Retourner le transport partagé d'un fournisseur (créé au premier appel)."""
+    with _transports_lock:
+        transport = _transports.get(provider)
+        if transport is None:
+            transport = _transports[provider] = LLMTransport(provider)
+        return transport
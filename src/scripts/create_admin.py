@@ -13,6 +13,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from src.api.auth import get_password_hash
 from src.db.database import SessionLocal, engine, Base
 from src.db.models import User
+from src.db.versions import USERS_VERSION, bump_data_version
 
 
 def initialize_database():
@@ -44,6 +45,8 @@ def create_admin_user(username, password, email=None):
     
     # Ajouter à la base de données
     db.add(admin_user)
+    # Invalider le cache des utilisateurs de l'API
+    bump_data_version(db.connection(), USERS_VERSION)
     db.commit()
     db.refresh(admin_user)
     
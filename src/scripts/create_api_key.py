@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Script pour créer ou révoquer une clé d'API (clients machines : ETL, connecteurs BI).
+
+Exemples :
+    python -m src.scripts.create_api_key --username etl --name robot-import --scopes read,ingest
+    python -m src.scripts.create_api_key --revoke 1a2b3c4d5e6f
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.api.api_keys import API_KEY_SCOPES, generate_api_key, parse_scopes
+from src.db.database import SessionLocal, engine, Base
+from src.db.models import ApiKey, User
+from src.db.versions import USERS_VERSION, bump_data_version
+
+
+def create_api_key(username, name, scopes):
+    """
+    Créer une clé d'API pour un utilisateur.
+
+    Returns:
+        str: Clé complète (elle n'est pas conservée en base), ou None si l'utilisateur n'existe pas
+    """
+    db = SessionLocal()
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        print(f"L'utilisateur '{username}' n'existe pas.")
+        db.close()
+        return None
+
+    key, prefix, key_hash = generate_api_key()
+    db.add(ApiKey(
+        prefix=prefix,
+        key_hash=key_hash,
+        name=name,
+        user_id=user.id,
+        scopes=",".join(scopes),
+        is_active=True
+    ))
+    db.commit()
+    db.close()
+
+    print(f"Clé d'API '{name}' créée pour '{username}' (préfixe {prefix}, portées: {', '.join(scopes)}).")
+    return key
+
+
+def revoke_api_key(prefix):
+    """Révoquer une clé d'API à partir de son préfixe."""
+    db = SessionLocal()
+    api_key = db.query(ApiKey).filter(ApiKey.prefix == prefix).first()
+    if not api_key:
+        print(f"Aucune clé d'API avec le préfixe '{prefix}'.")
+        db.close()
+        return False
+
+    api_key.is_active = False
+    # Invalider le cache des clés de l'API
+    bump_data_version(db.connection(), USERS_VERSION)
+    db.commit()
+    db.close()
+
+    print(f"Clé d'API '{prefix}' révoquée.")
+    return True
+
+
+def parse_arguments():
+    """Parse les arguments de ligne de commande."""
+    parser = argparse.ArgumentParser(description="Créer ou révoquer une clé d'API.")
+    parser.add_argument(
+        "--username", "-u",
+        type=str,
+        help="Utilisateur pour lequel la clé agit"
+    )
+    parser.add_argument(
+        "--name", "-n",
+        type=str,
+        help="Nom du client (ex. robot-import, connecteur-bi)"
+    )
+    parser.add_argument(
+        "--scopes", "-s",
+        type=str,
+        default="read",
+        help=f"Portées séparées par des virgules parmi {', '.join(API_KEY_SCOPES)} (par défaut: read)"
+    )
+    parser.add_argument(
+        "--revoke",
+        type=str,
+        metavar="PREFIX",
+        help="Révoquer la clé d'API ayant ce préfixe"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Point d'entrée principal."""
+    args = parse_arguments()
+    Base.metadata.create_all(bind=engine)
+
+    if args.revoke:
+        return 0 if revoke_api_key(args.revoke) else 1
+
+    if not args.username or not args.name:
+        print("Erreur: --username et --name sont requis pour créer une clé.")
+        return 1
+    try:
+        scopes = parse_scopes(args.scopes)
+    except ValueError as e:
+        print(f"Erreur: {e}")
+        return 1
+
+    key = create_api_key(args.username, args.name, scopes)
+    if key is None:
+        return 1
+    print("Conservez cette clé, elle ne sera plus affichée :")
+    print(key)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
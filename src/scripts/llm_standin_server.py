@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Serveur local compatible OpenAI, substitut déterministe d'un fournisseur de LLM.
+
+Il permet de mesurer le débit et la latence de /api/ai/analyze sans appeler
+d'API payante : l'API l'utilise avec LLM_PROVIDER=local et
+LLM_LOCAL_API_BASE=http://127.0.0.1:8089/v1.
+
+Routes : POST /v1/chat/completions (réponse complète ou flux SSE avec
+"stream": true), GET /v1/models, GET /stats (compteurs : requêtes, erreurs
+injectées, flux interrompus par le client, tokens envoyés).
+
+Le texte produit ne dépend que du prompt ; la latence avant le premier token
+suit la distribution choisie, puis les tokens sont émis au débit demandé.
+Les erreurs (code HTTP) et les absences de réponse sont injectées avec les
+probabilités demandées. Le tirage est reproductible (--seed).
+
+Exemples :
+    python -m src.scripts.llm_standin_server --port 8089
+    python -m src.scripts.llm_standin_server --latency-ms 800 --latency-distribution lognormal \\
+        --tokens-per-second 40 --error-rate 0.05 --error-status 503
+"""
+import sys
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "lognormal", "exponential")
+
+# Phrases dont est composé le rapport simulé
+REPORT_SENTENCES = [
+    "Les performances globales des agences restent solides sur la période analysée.",
+    "Le montant total des transactions progresse par rapport à la semaine précédente.",
+    "Certaines agences présentent une volatilité plus marquée qui mérite un suivi attentif.",
+    "Le nombre moyen de transactions par jour est stable dans la plupart des agences.",
+    "Nous recommandons de partager les bonnes pratiques des agences les plus performantes.",
+    "Une attention particulière doit être portée aux agences dont les montants reculent.",
+]
+
+
+class StandinConfig:
+    """Comportement du serveur de substitution."""
+
+    def __init__(
+        self,
+        latency_ms=300.0,
+        latency_distribution="constant",
+        latency_spread=0.5,
+        tokens_per_second=50.0,
+        completion_tokens=200,
+        error_rate=0.0,
+        error_status=503,
+        retry_after=None,
+        hang_rate=0.0,
+        seed=0,
+        model="standin",
+    ):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Distribution inconnue: {latency_distribution}")
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_spread = latency_spread
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.hang_rate = hang_rate
+        self.seed = seed
+        self.model = model
+
+
+def sample_latency(config, rng):
+    """
+    Tirer la latence avant le premier token (secondes).
+
+    - constant : latency_ms ;
+    - uniform : entre latency_ms × (1 - spread) et latency_ms × (1 + spread) ;
+    - lognormal : médiane latency_ms, écart-type du logarithme spread ;
+    - exponential : moyenne latency_ms.
+    """
+    base = config.latency_ms / 1000
+    if config.latency_distribution == "uniform":
+        return max(0.0, rng.uniform(base * (1 - config.latency_spread), base * (1 + config.latency_spread)))
+    if config.latency_distribution == "lognormal":
+        return base * rng.lognormvariate(0, config.latency_spread)
+    if config.latency_distribution == "exponential":
+        return rng.expovariate(1 / base) if base > 0 else 0.0
+    return base
+
+
+def completion_tokens(prompt, count):
+    """Tokens (mots suivis d'un espace) d'une réponse, déterminés par le prompt."""
+    digest = hashlib.sha256(prompt.encode()).digest()
+    words = ["# Rapport d'analyse bancaire\n\n"]
+    index = digest[0]
+    while len(words) < count:
+        sentence = REPORT_SENTENCES[index % len(REPORT_SENTENCES)]
+        words.extend(word + " " for word in sentence.split())
+        index += digest[index % len(digest)] or 1
+    return words[:count]
+
+
+def create_app(config=None):
+    """Créer l'application du serveur de substitution."""
+    config = config or StandinConfig()
+    rng = random.Random(config.seed)
+    stats = {
+        "requests": 0,
+        "errors_injected": 0,
+        "hangs_injected": 0,
+        "completed": 0,
+        "cancelled": 0,
+        "tokens_sent": 0,
+    }
+    app = FastAPI(title="LLM de substitution")
+
+    def token_delay():
+        return 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": config.model, "object": "model", "owned_by": "standin"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        # Tirages dans un ordre fixe : reproductibles pour une même suite de requêtes
+        draw = rng.random()
+        latency = sample_latency(config, rng)
+        if draw < config.error_rate:
+            stats["errors_injected"] += 1
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after is not None else None
+            return JSONResponse(
+                {"error": {"message": "Erreur injectée", "type": "standin_injected_error"}},
+                status_code=config.error_status,
+                headers=headers,
+            )
+        if draw < config.error_rate + config.hang_rate:
+            # Aucune réponse : le client abandonne à l'expiration de son délai de lecture
+            stats["hangs_injected"] += 1
+            await asyncio.sleep(3600)
+
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        count = min(config.completion_tokens, int(body.get("max_tokens") or config.completion_tokens))
+        tokens = completion_tokens(prompt, count)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model") or config.model
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency + len(tokens) * token_delay())
+            stats["completed"] += 1
+            stats["tokens_sent"] += len(tokens)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": len(prompt.split()),
+                    "completion_tokens": len(tokens),
+                    "total_tokens": len(prompt.split()) + len(tokens),
+                },
+            }
+
+        def chunk(delta, finish_reason=None):
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def events():
+            completed = False
+            try:
+                await asyncio.sleep(latency)
+                yield chunk({"role": "assistant"})
+                for token in tokens:
+                    yield chunk({"content": token})
+                    stats["tokens_sent"] += 1
+                    await asyncio.sleep(token_delay())
+                yield chunk({}, "stop")
+                yield "data: [DONE]\n\n"
+                completed = True
+            finally:
+                stats["completed" if completed else "cancelled"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def parse_arguments():
+    """Parse les arguments de ligne de commande."""
+    parser = argparse.ArgumentParser(description="Serveur local compatible OpenAI pour les tests de charge.")
+    parser.add_argument("--host", "-H", type=str, default="127.0.0.1", help="Hôte d'écoute (par défaut: 127.0.0.1)")
+    parser.add_argument("--port", "-p", type=int, default=8089, help="Port d'écoute (par défaut: 8089)")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Latence avant le premier token en ms (par défaut: 300)")
+    parser.add_argument(
+        "--latency-distribution",
+        choices=LATENCY_DISTRIBUTIONS,
+        default="constant",
+        help="Distribution de la latence (par défaut: constant)"
+    )
+    parser.add_argument(
+        "--latency-spread", type=float, default=0.5,
+        help="Dispersion : écart relatif (uniform) ou écart-type du logarithme (lognormal) (par défaut: 0.5)"
+    )
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Débit des tokens, 0 pour instantané (par défaut: 50)")
+    parser.add_argument("--completion-tokens", type=int, default=200, help="Tokens par réponse, bornés par max_tokens (par défaut: 200)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses en erreur (par défaut: 0)")
+    parser.add_argument("--error-status", type=int, default=503, help="Code HTTP des erreurs injectées (par défaut: 503)")
+    parser.add_argument("--retry-after", type=int, help="En-tête Retry-After des erreurs injectées (secondes)")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Proportion de requêtes sans réponse (par défaut: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="Graine des tirages aléatoires (par défaut: 0)")
+    return parser.parse_args()
+
+
+def main():
+    """Point d'entrée principal."""
+    import uvicorn
+
+    args = parse_arguments()
+    config = StandinConfig(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        latency_spread=args.latency_spread,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        hang_rate=args.hang_rate,
+        seed=args.seed,
+    )
+    print(f"LLM de substitution sur http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
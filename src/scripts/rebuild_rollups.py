@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Script pour reconstruire ou vérifier les agrégats de bank_data_rollups.
+
+Exemples :
+    # Reconstruire les agrégats après une reprise d'historique
+    python -m src.scripts.rebuild_rollups
+
+    # Comparer les agrégats avec un recalcul complet depuis bank_data
+    python -m src.scripts.rebuild_rollups --check
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.db.database import engine, Base
+from src.db.rollups import rebuild_rollups, check_rollups
+from src.db.versions import bump_data_version
+
+
+def parse_arguments():
+    """Parse les arguments de ligne de commande."""
+    parser = argparse.ArgumentParser(description="Reconstruire ou vérifier les agrégats par agence et par période.")
+    parser.add_argument(
+        "--check", "-c",
+        action="store_true",
+        help="Vérifier la cohérence des agrégats sans les modifier"
+    )
+    parser.add_argument(
+        "--max-differences",
+        type=int,
+        default=20,
+        help="Nombre maximum d'écarts affichés (par défaut: 20)"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Point d'entrée principal."""
+    args = parse_arguments()
+    Base.metadata.create_all(bind=engine)
+
+    if args.check:
+        with engine.connect() as conn:
+            differences = check_rollups(conn)
+        if not differences:
+            print("Agrégats cohérents avec bank_data.")
+            return 0
+        print(f"{len(differences)} écart(s) trouvé(s) :")
+        for difference in differences[:args.max_differences]:
+            granularity, agence, start = difference["key"]
+            print(
+                f"- {granularity} {agence} {start}: attendu {difference['expected']}, "
+                f"stocké {difference['stored']}"
+            )
+        print("Relancez le script sans --check pour reconstruire les agrégats.")
+        return 1
+
+    with engine.begin() as conn:
+        count = rebuild_rollups(conn)
+        # Invalider les réponses en cache calculées sur les anciens agrégats
+        bump_data_version(conn)
+    print(f"Agrégats reconstruits : {count} lignes.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from src.api.auth import get_password_hash
 from src.db.database import SessionLocal, engine, Base
 from src.db.models import User
+from src.db.versions import USERS_VERSION, bump_data_version
 
 
 def initialize_database():
@@ -52,6 +53,8 @@ def setup_admin_user(username="admin", email="admin@example.com", password=None)
         if email:
             existing_user.email = email
         existing_user.is_active = True
+        # Invalider le cache des utilisateurs de l'API
+        bump_data_version(db.connection(), USERS_VERSION)
         db.commit()
         db.refresh(existing_user)
         print(f"Mot de passe de l'utilisateur '{username}' réinitialisé.")
@@ -64,6 +67,7 @@ def setup_admin_user(username="admin", email="admin@example.com", password=None)
             is_active=True
         )
         db.add(admin_user)
+        bump_data_version(db.connection(), USERS_VERSION)
         db.commit()
         db.refresh(admin_user)
         print(f"Utilisateur administrateur '{username}' créé avec succès.")
@@ -105,8 +105,25 @@ def test_ai_api(host, token, agence=None):
             }
         )
         
-        if response.status_code == 200:
-            result = response.json()
+        if response.status_code != 202:
+            print(f"Erreur lors de l'appel à l'API: {response.status_code} - {response.text}")
+            return None
+        
+        # Suivre la tâche d'analyse jusqu'à sa fin
+        job = response.json()
+        print(f"Analyse en cours (tâche {job['id']})...")
+        while job["status"] not in ("succeeded", "failed"):
+            response = requests.get(
+                f"{host}/api/ai/jobs/{job['id']}",
+                params={"wait": 30},
+                headers={"Authorization": f"Bearer {token}"}
+            )
+            if response.status_code != 200:
+                break
+            job = response.json()
+        
+        if response.status_code == 200 and job["status"] == "succeeded":
+            result = job["result"]
             
             print("\n=== Analyse IA réussie ===")
             print(f"ID de l'analyse: {result['id']}")
@@ -127,7 +144,7 @@ def test_ai_api(host, token, agence=None):
             return result
             
         else:
-            print(f"Erreur lors de l'appel à l'API: {response.status_code} - {response.text}")
+            print(f"Échec de l'analyse: {job.get('error') or response.text}")
             return None
     
     except Exception as e:
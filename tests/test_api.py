@@ -3,12 +3,17 @@ Tests pour l'API FastAPI.
 """
 import os
 import sys
+import json
+import asyncio
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
 from fastapi import status
+from passlib.context import CryptContext
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from datetime import date, timedelta, datetime
 from typing import Generator
 from pathlib import Path
@@ -17,28 +22,40 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.api.main import app
-from src.api.auth import get_password_hash
+from src.api import auth
+from src.api.auth import get_password_hash, user_cache
 from src.db.database import Base, get_db
-from src.db.models import User, BankData
+from src.db.models import User, BankData, ApiKey, AnalysisJob
+from src.api.api_keys import api_key_usage, generate_api_key
+from src.api.analysis_jobs import analysis_jobs, analysis_result_cache, AnalysisJobManager, AnalysisQueueFull
+from src.api.analysis_stream import analysis_streams, iterate_in_thread
+from src.api.cache import response_cache, data_version_tracker, users_version_tracker
+from src.db.versions import USERS_VERSION, bump_data_version
+from src.api.models import BankDataResponse
+from src.ia.ai_service import ai_service
 
-# Créer une base de données en mémoire pour les tests
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Créer une base de données temporaire pour les tests, partagée entre le moteur
+# synchrone (préparation des données) et le moteur asynchrone (routes de l'API)
+TEST_DB_PATH = os.path.join(tempfile.mkdtemp(), "test_api.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DB_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
+    connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Le client de test peut utiliser une boucle d'événements différente par requête
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DB_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 
 # Surcharger la dépendance get_db pour utiliser la base de test
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # Configurer le client de test
@@ -79,6 +96,7 @@ def setup_test_db():
     ]
     db.add_all(test_data)
     db.commit()
+    db.close()
     
     # Générer un token pour les tests
     response = client.post(
@@ -90,8 +108,13 @@ def setup_test_db():
     
     yield headers
     
-    # Nettoyer après le test
+    # Nettoyer après le test (la version des données repart de zéro)
     Base.metadata.drop_all(bind=engine)
+    asyncio.run(response_cache.clear())
+    asyncio.run(user_cache.clear())
+    asyncio.run(analysis_result_cache.clear())
+    data_version_tracker.invalidate()
+    users_version_tracker.invalidate()
 
 
 def test_root():
@@ -102,6 +125,13 @@ def test_root():
     assert "version" in response.json()
 
 
+def test_metrics():
+    """Tester l'exposition des métriques Prometheus."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "singleflight_calls_total" in response.text
+
+
 def test_health_check():
     """Tester la route de vérification de santé."""
     response = client.get("/health")
@@ -181,6 +211,9 @@ def test_read_bank_data(setup_test_db):
     response = client.get("/api/bank-data", headers=headers)
     assert response.status_code == 200
     assert len(response.json()) == 5
+    # La sérialisation rapide respecte le schéma déclaré
+    for item in response.json():
+        assert BankDataResponse.model_validate(item).model_dump(mode="json") == item
     
     # Test avec pagination
     response = client.get("/api/bank-data?skip=1&limit=2", headers=headers)
@@ -199,6 +232,88 @@ def test_read_bank_data(setup_test_db):
     assert response.status_code == 401
 
 
+def test_read_bank_data_cursor_pagination(setup_test_db):
+    """Tester la pagination par curseur des données bancaires."""
+    headers = setup_test_db
+    
+    # Parcourir toutes les pages de 2 éléments
+    ids = []
+    response = client.get("/api/bank-data?pagination=cursor&limit=2", headers=headers)
+    while True:
+        assert response.status_code == 200
+        ids.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = client.get(f"/api/bank-data?limit=2&cursor={cursor}", headers=headers)
+    
+    # Même ordre (date, id) qu'en pagination par offset, sans doublon
+    offset_ids = [item["id"] for item in client.get("/api/bank-data", headers=headers).json()]
+    assert ids == offset_ids
+    assert len(ids) == 5
+    
+    # Curseur invalide
+    response = client.get("/api/bank-data?cursor=invalide", headers=headers)
+    assert response.status_code == 400
+    
+    # Taille de page bornée (1 à 1000), décalage positif
+    for query in ("pagination=cursor&limit=0", "limit=-1", "limit=1001", "skip=-1"):
+        assert client.get(f"/api/bank-data?{query}", headers=headers).status_code == 422
+    response = client.get("/api/bank-data?pagination=cursor&limit=1", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+
+def test_export_bank_data(setup_test_db):
+    """Tester l'export en flux des données bancaires."""
+    headers = setup_test_db
+    
+    # NDJSON par défaut
+    response = client.get("/api/bank-data/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 5
+    assert [line["id"] for line in lines] == [
+        item["id"] for item in client.get("/api/bank-data", headers=headers).json()
+    ]
+    
+    # CSV choisi par l'en-tête Accept, avec filtre
+    date_debut = (date.today() - timedelta(days=1)).isoformat()
+    response = client.get(
+        f"/api/bank-data/export?date_debut={date_debut}",
+        headers={**headers, "Accept": "text/csv"}
+    )
+    assert response.status_code == 200
+    rows = response.text.splitlines()
+    assert rows[0] == "id,agence,date,montant,nombre_transactions,created_at"
+    assert len(rows) == 3
+    
+    # Format non disponible
+    response = client.get("/api/bank-data/export", headers={**headers, "Accept": "image/png"})
+    assert response.status_code == 406
+
+
+def test_export_bank_data_parquet(setup_test_db):
+    """Tester l'export Parquet et Arrow IPC (nécessite pyarrow)."""
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    headers = setup_test_db
+    
+    response = client.get("/api/bank-data/export?format=parquet", headers=headers)
+    assert response.status_code == 200
+    table = pq.read_table(pa.BufferReader(response.content))
+    assert table.num_rows == 5
+    assert table.column_names[:3] == ["id", "agence", "date"]
+    
+    response = client.get(
+        "/api/bank-data/export",
+        headers={**headers, "Accept": "application/vnd.apache.arrow.stream"}
+    )
+    assert response.status_code == 200
+    assert pa.ipc.open_stream(response.content).read_all().num_rows == 5
+
+
 def test_read_bank_data_by_id(setup_test_db):
     """Tester la récupération d'une donnée bancaire par ID."""
     headers = setup_test_db
@@ -246,6 +361,71 @@ def test_create_bank_data(setup_test_db):
     assert response.status_code == 401
 
 
+def test_create_bank_data_batch(setup_test_db, monkeypatch):
+    """Tester l'insertion d'un lot de données bancaires."""
+    headers = setup_test_db
+    batch = [
+        {"agence": "Agence Lot", "date": "2024-01-01", "montant": 100.0, "nombre_transactions": 1},
+        {"agence": "Agence Lot", "date": "pas une date", "montant": 100.0, "nombre_transactions": 1},
+        {"agence": "Agence Lot", "date": "2024-01-02", "montant": 200.0, "nombre_transactions": 2},
+    ]
+    response = client.post("/api/bank-data/batch", headers=headers, json=batch)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 2
+    assert result["updated"] == 0
+    assert [error["index"] for error in result["errors"]] == [1]
+    
+    # Rejeu en NDJSON et en mode upsert : aucune ligne ajoutée
+    ndjson = "\n".join(json.dumps(record) for record in (batch[0], batch[2])) + "\n"
+    response = client.post(
+        "/api/bank-data/batch?mode=upsert",
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+        content=ndjson
+    )
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 0, "updated": 2, "errors": []}
+    
+    # Rejeu en mode insert : entrées existantes ou répétées signalées, les autres insérées
+    new = {"agence": "Agence Lot", "date": "2024-01-03", "montant": 0.0, "nombre_transactions": 0}
+    response = client.post("/api/bank-data/batch", headers=headers, json=[batch[0], new, batch[1], new])
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["inserted"], result["updated"]) == (1, 0)
+    assert [error["index"] for error in result["errors"]] == [0, 2, 3]
+    assert result["errors"][0]["errors"][0]["type"] == "duplicate_key"
+    response = client.post("/api/bank-data", headers=headers, json=batch[0])
+    assert response.status_code == 409
+    
+    response = client.get("/api/bank-data?agence=Agence%20Lot", headers=headers)
+    assert len(response.json()) == 3
+    stats = client.get("/api/bank-data/stats/by-agence", headers=headers).json()
+    assert next(s for s in stats if s["agence"] == "Agence Lot")["montant_total"] == 300.0
+    
+    # Corps illisible
+    response = client.post("/api/bank-data/batch", headers=headers, json={"agence": "Agence Lot"})
+    assert response.status_code == 400
+    response = client.post(
+        "/api/bank-data/batch",
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+        content=b'{"agence": "Agence \xe9"}\n'
+    )
+    assert response.status_code == 400
+    
+    # Lot trop grand : refusé avant décodage
+    monkeypatch.setattr("src.api.batch.BATCH_MAX_BYTES", 64)
+    response = client.post("/api/bank-data/batch", headers=headers, json=batch * 2)
+    assert response.status_code == 413
+    monkeypatch.setattr("src.api.batch.BATCH_MAX_BYTES", 10000)
+    monkeypatch.setattr("src.api.batch.BATCH_MAX_RECORDS", 1)
+    response = client.post(
+        "/api/bank-data/batch",
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+        content=ndjson
+    )
+    assert response.status_code == 413
+
+
 def test_get_stats_by_agence(setup_test_db):
     """Tester la récupération des statistiques par agence."""
     headers = setup_test_db
@@ -264,6 +444,7 @@ def test_get_stats_by_agence(setup_test_db):
     ]
     db.add_all(test_data)
     db.commit()
+    db.close()
     
     # Tester la récupération des statistiques
     response = client.get("/api/bank-data/stats/by-agence", headers=headers)
@@ -284,6 +465,583 @@ def test_get_stats_by_agence(setup_test_db):
     assert response.status_code == 401
 
 
+def test_stats_follow_created_bank_data(setup_test_db):
+    """Tester que les statistiques (agrégats) reflètent une donnée créée via l'API."""
+    headers = setup_test_db
+    new_bank_data = {
+        "agence": "Agence Créée",
+        "date": str(date.today()),
+        "montant": 1234.5,
+        "nombre_transactions": 12
+    }
+    response = client.post("/api/bank-data", json=new_bank_data, headers=headers)
+    assert response.status_code == 201
+
+    response = client.get("/api/bank-data/stats/by-agence", headers=headers)
+    stats = {stat["agence"]: stat for stat in response.json()}
+    assert stats["Agence Créée"]["montant_total"] == 1234.5
+    assert stats["Agence Créée"]["transactions_total"] == 12
+    assert stats["Agence Créée"]["nombre_entrees"] == 1
+    assert stats["Agence Test"]["nombre_entrees"] == 5
+
+    response = client.get("/api/bank-data/stats/by-date?days=0", headers=headers)
+    assert response.json()[-1]["montant_total"] == 1234.5 + 1000
+
+
+def test_stats_cache_invalidated_by_writes(setup_test_db):
+    """Tester que les statistiques en cache sont invalidées par une écriture."""
+    headers = setup_test_db
+    
+    first = client.get("/api/bank-data/stats/by-date?days=30", headers=headers).json()
+    assert client.get("/api/bank-data/stats/by-date?days=30", headers=headers).json() == first
+    
+    client.post("/api/bank-data", headers=headers, json={
+        "agence": "Agence Nouvelle",
+        "date": date.today().isoformat(),
+        "montant": 1.0,
+        "nombre_transactions": 1
+    })
+    today = next(
+        row for row in client.get("/api/bank-data/stats/by-date?days=30", headers=headers).json()
+        if row["date"] == date.today().isoformat()
+    )
+    before = next(row for row in first if row["date"] == date.today().isoformat())
+    assert today["montant_total"] == before["montant_total"] + 1.0
+
+
+def test_conditional_get(setup_test_db):
+    """Tester les réponses 304 sur ETag et Last-Modified."""
+    headers = setup_test_db
+    
+    for url in ("/api/bank-data?limit=3", "/api/bank-data/stats/by-agence", "/api/bank-data/stats/by-date?days=7"):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert "private" in response.headers["cache-control"]
+        
+        response = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        
+        response = client.get(
+            url, headers={**headers, "If-Modified-Since": response.headers["last-modified"]}
+        )
+        assert response.status_code == 304
+    
+    # Les paramètres font partie de l'ETag
+    etag = client.get("/api/bank-data?limit=3", headers=headers).headers["etag"]
+    response = client.get("/api/bank-data?limit=2", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    
+    # Une écriture change l'ETag
+    client.post("/api/bank-data", headers=headers, json={
+        "agence": "Agence Nouvelle",
+        "date": date.today().isoformat(),
+        "montant": 1.0,
+        "nombre_transactions": 1
+    })
+    response = client.get("/api/bank-data?limit=3", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    
+    # Sans authentification, pas de 304
+    response = client.get("/api/bank-data?limit=3", headers={"If-None-Match": etag})
+    assert response.status_code == 401
+    
+    # Date au fuseau « -0000 » (naïve une fois analysée) : comparée en UTC
+    response = client.get(
+        "/api/bank-data/stats/by-agence",
+        headers={**headers, "If-Modified-Since": "Sat, 17 Oct 2099 10:00:00 -0000"}
+    )
+    assert response.status_code == 304
+    response = client.get(
+        "/api/bank-data/stats/by-agence",
+        headers={**headers, "If-Modified-Since": "Sat, 17 Oct 2020 10:00:00 -0000"}
+    )
+    assert response.status_code == 200
+
+
+def test_conditional_get_moving_window(setup_test_db, monkeypatch):
+    """Tester que les statistiques sur une fenêtre glissante changent d'ETag au changement de jour."""
+    from src.api import conditional
+    headers = setup_test_db
+    
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+    
+    for url in ("/api/bank-data/stats/by-date?days=7", "/api/bank-data/stats/timeseries", "/api/bank-data/stats/pivot"):
+        response = client.get(url, headers=headers)
+        etag = response.headers["etag"]
+        last_modified = response.headers["last-modified"]
+        assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+        
+        monkeypatch.setattr(conditional, "date", Tomorrow)
+        response = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        response = client.get(url, headers={**headers, "If-Modified-Since": last_modified})
+        assert response.status_code == 200
+        monkeypatch.undo()
+    
+    # Les données non fenêtrées ne dépendent pas de la date
+    etag = client.get("/api/bank-data/stats/by-agence", headers=headers).headers["etag"]
+    monkeypatch.setattr(conditional, "date", Tomorrow)
+    response = client.get("/api/bank-data/stats/by-agence", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_get_stats_timeseries(setup_test_db):
+    """Tester la série temporelle continue par période."""
+    headers = setup_test_db
+    today = date.today()
+    
+    # Données sur les 5 derniers jours : les 2 jours précédents sont complétés à zéro
+    response = client.get(
+        f"/api/bank-data/stats/timeseries?granularity=day&from={(today - timedelta(days=6)).isoformat()}",
+        headers=headers
+    )
+    assert response.status_code == 200
+    points = response.json()["points"]
+    assert len(points) == 7
+    assert points[0]["montant_total"] == 0.0 and points[0]["nombre_entrees"] == 0
+    assert points[-1]["period_start"] == today.isoformat()
+    assert sum(point["montant_total"] for point in points) == sum(1000 + i * 100 for i in range(5))
+    
+    # Trimestres regroupés en SQL à partir des agrégats mensuels
+    client.post("/api/bank-data/batch", headers=headers, json=[
+        {"agence": "Agence T", "date": "2024-01-15", "montant": 100.0, "nombre_transactions": 1},
+        {"agence": "Agence T", "date": "2024-03-31", "montant": 200.0, "nombre_transactions": 2},
+        {"agence": "Agence T", "date": "2024-10-01", "montant": 50.0, "nombre_transactions": 1},
+    ])
+    response = client.get(
+        "/api/bank-data/stats/timeseries?granularity=quarter&agence=Agence%20T&from=2024-02-01&to=2024-12-31",
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert [(p["period_start"], p["montant_total"]) for p in response.json()["points"]] == [
+        ("2024-01-01", 300.0), ("2024-04-01", 0.0), ("2024-07-01", 0.0), ("2024-10-01", 50.0)
+    ]
+    
+    # Intervalle invalide
+    response = client.get(
+        "/api/bank-data/stats/timeseries?from=2024-02-01&to=2024-01-01", headers=headers
+    )
+    assert response.status_code == 400
+    
+    # Bornes du calendrier et intervalles démesurés : 400, pas 500
+    for url in (
+        "/api/bank-data/stats/timeseries?to=9999-12-31",
+        "/api/bank-data/stats/timeseries?granularity=month&to=9999-12-31",
+        "/api/bank-data/stats/timeseries?to=0001-01-02",
+        "/api/bank-data/stats/timeseries?from=0001-01-01&to=9000-01-01",
+        "/api/bank-data/stats/pivot?granularity=quarter&from=9999-01-01&to=9999-12-31",
+    ):
+        assert client.get(url, headers=headers).status_code == 400
+    assert client.get("/api/bank-data/stats/by-date?days=100000", headers=headers).status_code == 422
+    response = client.post("/api/bank-data/dashboard", headers=headers, json={"queries": [
+        {"name": "jours", "type": "stats_by_date", "days": 1000000}
+    ]})
+    assert response.status_code == 422
+
+
+def test_get_stats_pivot(setup_test_db):
+    """Tester la matrice agence x période au format colonnes."""
+    headers = setup_test_db
+    client.post("/api/bank-data/batch", headers=headers, json=[
+        {"agence": "Agence B", "date": "2024-01-01", "montant": 10.0, "nombre_transactions": 1},
+        {"agence": "Agence A", "date": "2024-01-09", "montant": 20.0, "nombre_transactions": 2},
+        {"agence": "Agence A", "date": "2024-01-10", "montant": 5.0, "nombre_transactions": 1},
+    ])
+    response = client.get(
+        "/api/bank-data/stats/pivot?granularity=week&from=2024-01-01&to=2024-01-21",
+        headers=headers
+    )
+    assert response.status_code == 200
+    pivot = response.json()
+    # Toutes les agences, y compris celle sans données dans l'intervalle
+    assert pivot["agences"] == ["Agence A", "Agence B", "Agence Test"]
+    assert pivot["periods"] == ["2024-01-01", "2024-01-08", "2024-01-15"]
+    assert pivot["shape"] == [3, 3]
+    assert pivot["values"] == [0.0, 25.0, 0.0, 10.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    assert all(isinstance(value, float) for value in pivot["values"])
+    
+    response = client.get(
+        "/api/bank-data/stats/pivot?granularity=month&metric=transactions_total&from=2024-01-01&to=2024-01-31",
+        headers=headers
+    )
+    values = response.json()["values"]
+    assert values == [3, 1, 0]
+    assert all(isinstance(value, int) for value in values)
+
+
+def test_dashboard(setup_test_db):
+    """Tester l'exécution de plusieurs sous-requêtes en un appel."""
+    headers = setup_test_db
+    today = date.today()
+    response = client.post("/api/bank-data/dashboard", headers=headers, json={"queries": [
+        {"name": "agences", "type": "stats_by_agence"},
+        {"name": "jours", "type": "stats_by_date", "days": 7},
+        {"name": "serie", "type": "timeseries", "granularity": "day", "from": (today - timedelta(days=2)).isoformat()},
+        {"name": "top", "type": "top_agences", "limit": 3},
+        {"name": "liste", "type": "bank_data", "limit": 2},
+        {"name": "invalide", "type": "pivot", "from": "2024-02-01", "to": "2024-01-01"},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["results"]["agences"] == client.get("/api/bank-data/stats/by-agence", headers=headers).json()
+    assert len(body["results"]["jours"]) == 5
+    assert len(body["results"]["serie"]["points"]) == 3
+    assert body["results"]["top"] == [{"agence": "Agence Test", "montant_total": 6000.0}]
+    assert len(body["results"]["liste"]) == 2
+    assert "invalide" in body["errors"]
+    
+    # Type inconnu ou noms en double
+    response = client.post("/api/bank-data/dashboard", headers=headers, json={"queries": [{"name": "x", "type": "inconnu"}]})
+    assert response.status_code == 422
+    response = client.post("/api/bank-data/dashboard", headers=headers, json={"queries": [
+        {"name": "x", "type": "stats_by_agence"}, {"name": "x", "type": "stats_by_agence"}
+    ]})
+    assert response.status_code == 400
+
+
+def test_current_user_cache(setup_test_db):
+    """Tester le cache des utilisateurs authentifiés et son invalidation."""
+    headers = setup_test_db
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    
+    # Désactivation sans incrément de version : l'utilisateur reste en cache
+    db = TestingSessionLocal()
+    db.query(User).filter(User.username == "testuser").update({"is_active": False})
+    db.commit()
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    
+    # Désactivation signalée (comme par les scripts) : le token est refusé
+    bump_data_version(db.connection(), USERS_VERSION)
+    db.commit()
+    db.close()
+    users_version_tracker.invalidate()
+    assert client.get("/api/users/me", headers=headers).status_code == 401
+    
+    # Un utilisateur désactivé ne peut plus obtenir de token
+    response = client.post("/api/token", data={"username": "testuser", "password": "testpassword"})
+    assert response.status_code == 401
+
+
+def test_login_rehashes_password(setup_test_db, monkeypatch):
+    """Tester la mise à jour du hash lorsque le coût bcrypt change."""
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4))
+    response = client.post("/api/token", data={"username": "testuser", "password": "testpassword"})
+    assert response.status_code == 200
+    
+    db = TestingSessionLocal()
+    hashed_password = db.query(User).filter(User.username == "testuser").one().hashed_password
+    db.close()
+    assert hashed_password.startswith("$2b$04$")
+    assert auth.verify_password("testpassword", hashed_password)
+    
+    response = client.post("/api/token", data={"username": "testuser", "password": "mauvais"})
+    assert response.status_code == 401
+
+
+def create_test_api_key(scopes):
+    """Créer une clé d'API pour l'utilisateur de test."""
+    key, prefix, key_hash = generate_api_key()
+    db = TestingSessionLocal()
+    user = db.query(User).filter(User.username == "testuser").one()
+    db.add(ApiKey(prefix=prefix, key_hash=key_hash, name="robot", user_id=user.id, scopes=scopes))
+    db.commit()
+    db.close()
+    return key
+
+
+def test_api_key_authentication(setup_test_db):
+    """Tester l'authentification par clé d'API et ses portées."""
+    key = create_test_api_key("read")
+    
+    # En-tête X-API-Key ou token Bearer
+    response = client.get("/api/bank-data", headers={"X-API-Key": key})
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    response = client.get("/api/bank-data/stats/by-agence", headers={"Authorization": f"Bearer {key}"})
+    assert response.status_code == 200
+    
+    # Portée manquante
+    new_data = {"agence": "Agence Robot", "date": date.today().isoformat(), "montant": 1.0, "nombre_transactions": 1}
+    response = client.post("/api/bank-data", headers={"X-API-Key": key}, json=new_data)
+    assert response.status_code == 403
+    ingest_key = create_test_api_key("read,ingest")
+    response = client.post("/api/bank-data", headers={"X-API-Key": ingest_key}, json=new_data)
+    assert response.status_code == 201
+    
+    # Clé falsifiée
+    response = client.get("/api/bank-data", headers={"X-API-Key": key[:-4] + "abcd"})
+    assert response.status_code == 401
+    
+    # Compteurs d'utilisation écrits en différé
+    asyncio.run(api_key_usage.flush(async_engine))
+    db = TestingSessionLocal()
+    usage = sorted(api_key.usage_count for api_key in db.query(ApiKey).all())
+    db.close()
+    assert usage == [1, 3]
+
+
+def test_analysis_jobs(setup_test_db, monkeypatch):
+    """Tester l'exécution des analyses IA en arrière-plan."""
+    headers = setup_test_db
+    
+    def fake_analysis(data, use_cache=True, include_visualizations=True):
+        return {
+            "report": "Rapport de test",
+            "visualizations": [],
+            "metadata": {
+                "timestamp": datetime.now().isoformat(),
+                "data_points": len(data),
+                "date_range": {"start": "2024-01-01", "end": "2024-01-05"},
+                "agencies": ["Agence Test"]
+            }
+        }
+    monkeypatch.setattr(ai_service, "analyze_bank_data", fake_analysis)
+    
+    # Le client démarre les workers (événements de démarrage de l'application)
+    with TestClient(app) as job_client:
+        response = job_client.post("/api/ai/analyze", headers=headers, json={})
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "pending"
+        assert response.headers["location"] == f"/api/ai/jobs/{job['id']}"
+        
+        response = job_client.get(f"/api/ai/jobs/{job['id']}?wait=10", headers=headers)
+        assert response.status_code == 200
+        job = response.json()
+        assert job["status"] == "succeeded"
+        assert job["result"]["report"] == "Rapport de test"
+        assert job["result"]["metadata"]["data_points"] == 5
+        
+        assert job_client.get("/api/ai/analyses", headers=headers).json()["count"] == 1
+        response = job_client.get(f"/api/ai/analyses/{job['id']}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["id"] == job["id"]
+        etag = response.headers["etag"]
+        response = job_client.get(f"/api/ai/analyses/{job['id']}", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        
+        # Aucune donnée : la tâche échoue
+        response = job_client.post("/api/ai/analyze", headers=headers, json={"agence": "Inconnue"})
+        response = job_client.get(f"/api/ai/jobs/{response.json()['id']}?wait=10", headers=headers)
+        assert response.json()["status"] == "failed"
+        assert "Aucune donnée" in response.json()["error"]
+        
+        assert job_client.get("/api/ai/jobs/inconnue", headers=headers).status_code == 404
+    
+    # File remplie entre la vérification et la mise en file : 503, tâche marquée en échec
+    def full_queue(job_id, db_engine):
+        raise AnalysisQueueFull()
+    monkeypatch.setattr(analysis_jobs, "is_full", lambda: False)
+    monkeypatch.setattr(analysis_jobs, "submit", full_queue)
+    response = client.post("/api/ai/analyze", headers=headers, json={"bypass_cache": True})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "30"
+    db = TestingSessionLocal()
+    assert [job.status for job in db.query(AnalysisJob).filter(AnalysisJob.status == "pending")] == []
+    assert db.query(AnalysisJob).filter(AnalysisJob.status == "failed").count() == 2
+    db.close()
+
+
+def test_analysis_job_recovery(setup_test_db):
+    """Tester que seules les tâches dont le bail a expiré sont relancées."""
+    now = datetime.now()
+    expired = now - timedelta(seconds=120)
+    db = TestingSessionLocal()
+    user_id = db.query(User).first().id
+    for job_id, worker_id, heartbeat_at in (
+        ("active", "autre-processus", now),
+        ("expiree", "processus-arrete", expired),
+        ("sans-bail", None, None),
+    ):
+        db.add(AnalysisJob(
+            id=job_id, user_id=user_id, status="running", parameters={},
+            started_at=now, worker_id=worker_id, heartbeat_at=heartbeat_at
+        ))
+    db.commit()
+    
+    manager = AnalysisJobManager(workers=1, lease_seconds=60)
+    ran = []
+    
+    async def record_job(job_id, db_engine):
+        ran.append(job_id)
+    manager.run_job = record_job
+    
+    async def recover():
+        manager.start(async_engine)
+        await manager.recover(async_engine)
+        while len(ran) < 2:
+            await asyncio.sleep(0.01)
+        await manager.stop()
+    asyncio.run(recover())
+    
+    assert sorted(ran) == ["expiree", "sans-bail"]
+    db.expire_all()
+    statuses = {job.id: (job.status, job.worker_id) for job in db.query(AnalysisJob)}
+    db.close()
+    assert statuses == {
+        "active": ("running", "autre-processus"),
+        "expiree": ("pending", None),
+        "sans-bail": ("pending", None),
+    }
+
+
+def test_analysis_result_cache(setup_test_db, monkeypatch):
+    """Tester le cache des résultats d'analyse (paramètres + données analysées)."""
+    headers = setup_test_db
+    calls = []
+    
+    def fake_analysis(data, use_cache=True, include_visualizations=True):
+        calls.append(len(data))
+        return {
+            "report": f"Rapport {len(calls)}",
+            "visualizations": [],
+            "metadata": {
+                "timestamp": datetime.now().isoformat(),
+                "data_points": len(data),
+                "date_range": {"start": "2024-01-01", "end": "2024-01-05"},
+                "agencies": ["Agence Test"]
+            }
+        }
+    monkeypatch.setattr(ai_service, "analyze_bank_data", fake_analysis)
+    
+    def analyze(job_client, payload):
+        response = job_client.post("/api/ai/analyze", headers=headers, json=payload)
+        if response.status_code == 202:
+            response = job_client.get(f"/api/ai/jobs/{response.json()['id']}?wait=10", headers=headers)
+        return response
+    
+    with TestClient(app) as job_client:
+        first = analyze(job_client, {}).json()
+        assert first["result"]["report"] == "Rapport 1"
+        
+        # Même demande, mêmes données : tâche terminée sans nouvelle analyse
+        response = job_client.post("/api/ai/analyze", headers=headers, json={})
+        assert response.status_code == 200
+        cached = response.json()
+        assert cached["status"] == "succeeded"
+        assert cached["id"] != first["id"]
+        assert cached["result"]["id"] == cached["id"]
+        assert cached["result"]["report"] == "Rapport 1"
+        assert job_client.get(f"/api/ai/analyses/{cached['id']}", headers=headers).status_code == 200
+        assert len(calls) == 1
+        
+        # Paramètres différents ou bypass_cache : nouvelle analyse
+        assert analyze(job_client, {"format": "html"}).json()["result"]["report"] == "Rapport 2"
+        assert analyze(job_client, {"bypass_cache": True}).json()["result"]["report"] == "Rapport 3"
+        
+        # Une écriture hors de la plage analysée ne l'invalide pas
+        db = TestingSessionLocal()
+        db.add(BankData(agence="Agence Test", date=date.today() - timedelta(days=400), montant=1, nombre_transactions=1))
+        db.commit()
+        assert analyze(job_client, {}).json()["result"]["report"] == "Rapport 3"
+        
+        # Une écriture dans la plage analysée l'invalide
+        db.add(BankData(agence="Agence Nouvelle", date=date.today(), montant=1, nombre_transactions=1))
+        db.commit()
+        db.close()
+        response = analyze(job_client, {})
+        assert response.json()["result"]["report"] == "Rapport 4"
+        assert response.json()["result"]["metadata"]["data_points"] == 6
+
+
+def _parse_events(body):
+    """Décoder les événements Server-Sent Events d'une réponse."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_analysis_stream(setup_test_db, monkeypatch):
+    """Tester la diffusion d'une analyse en Server-Sent Events."""
+    headers = setup_test_db
+    
+    def fake_stream_report(prompt, use_cache=True):
+        yield "Rapport "
+        yield "diffusé"
+    monkeypatch.setattr(ai_service, "_stream_report", fake_stream_report)
+    monkeypatch.setattr(ai_service, "_generate_visualizations", lambda df: [
+        {"path": "output/test.png", "title": "Montant total par agence", "type": "bar_chart"}
+    ])
+    
+    with client.stream("POST", "/api/ai/analyze/stream", headers=headers, json={}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _parse_events(response.read().decode())
+    
+    assert [event for event, _ in events] == ["statistics", "visualizations", "token", "token", "done"]
+    statistics = events[0][1]
+    assert statistics["global"]["total_transactions"] == 60
+    assert statistics["metadata"]["data_points"] == 5
+    assert statistics["agencies"]["Agence Test"]["total_transactions"] == 60
+    assert events[1][1][0]["url"].startswith("/api/ai/visualizations/")
+    
+    # L'analyse terminée est enregistrée
+    analysis = client.get(f"/api/ai/analyses/{events[-1][1]['id']}", headers=headers).json()
+    assert analysis["report"] == "Rapport diffusé"
+    assert analysis["visualizations"][0]["url"] == events[1][1][0]["url"]
+    
+    response = client.post("/api/ai/analyze/stream", headers=headers, json={"agence": "Inconnue"})
+    assert response.status_code == 404
+    assert analysis_streams.active == 0
+    
+    # Places réservées dès la route : au-delà de max_streams, 503
+    monkeypatch.setattr(analysis_streams, "max_streams", 1)
+    slot = analysis_streams.reserve()
+    assert analysis_streams.reserve() is None
+    response = client.post("/api/ai/analyze/stream", headers=headers, json={})
+    assert response.status_code == 503
+    slot.release()
+    slot.release()
+    assert analysis_streams.active == 0
+
+
+def test_analysis_stream_cancellation():
+    """Tester l'arrêt du générateur bloquant quand le client abandonne le flux."""
+    from concurrent.futures import ThreadPoolExecutor
+    import threading
+    closed = threading.Event()
+    
+    def tokens():
+        try:
+            while True:
+                yield "token"
+        finally:
+            closed.set()
+    
+    async def consume():
+        stream = iterate_in_thread(tokens(), ThreadPoolExecutor(max_workers=1))
+        assert await stream.__anext__() == "token"
+        await stream.aclose()
+    
+    asyncio.run(consume())
+    assert closed.wait(2)
+
+
+def test_current_user_trusted_claims(setup_test_db, monkeypatch):
+    """Tester l'authentification à partir des informations signées du token."""
+    headers = setup_test_db
+    monkeypatch.setattr(auth, "AUTH_TRUST_TOKEN_CLAIMS", True)
+    
+    db = TestingSessionLocal()
+    db.query(User).delete()
+    db.commit()
+    db.close()
+    response = client.get("/api/users/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "testuser"
+    assert response.json()["email"] == "test@example.com"
+
+
 def test_get_stats_by_date(setup_test_db):
     """Tester la récupération des statistiques par date."""
     headers = setup_test_db
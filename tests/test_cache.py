@@ -0,0 +1,89 @@
+"""
+Tests du cache des réponses de l'API.
+"""
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.api.cache import MemoryCache, RedisCache, make_cache_key
+
+
+def test_make_cache_key():
+    """Tester que la clé dépend des paramètres et de la version des données."""
+    key = make_cache_key("stats/by-date", {"b": 2, "a": 1}, 3)
+    assert key == make_cache_key("stats/by-date", {"a": 1, "b": 2}, 3)
+    assert key != make_cache_key("stats/by-date", {"a": 1, "b": 2}, 4)
+
+
+def test_memory_cache_lru_and_ttl():
+    """Tester l'éviction LRU et l'expiration des entrées."""
+    async def scenario():
+        cache = MemoryCache(max_entries=2, ttl=60)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        assert await cache.get("a") == 1
+        await cache.set("c", 3)
+        # "b" est l'entrée la moins récemment utilisée
+        assert await cache.get("b") is None
+        assert await cache.get("a") == 1
+
+        expired = MemoryCache(ttl=-1)
+        await expired.set("a", 1)
+        assert await expired.get("a") is None
+
+    asyncio.run(scenario())
+
+
+def test_redis_cache():
+    """Tester le backend partagé sur un serveur Redis simulé."""
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        cache = RedisCache(client=fakeredis.FakeAsyncRedis(), prefix="test:")
+        await cache.set("stats", [{"agence": "A", "montant_total": 1.5}])
+        assert await cache.get("stats") == [{"agence": "A", "montant_total": 1.5}]
+        await cache.clear()
+        assert await cache.get("stats") is None
+
+    asyncio.run(scenario())
+
+
+def test_cached_response_computes_in_own_session(tmp_path):
+    """Le calcul partagé utilise sa propre session, pas celle de la première requête."""
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from src.api.cache import cached_response
+    from src.db.database import Base
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = []
+        started = asyncio.Event()
+
+        async def compute(session):
+            sessions.append(session)
+            started.set()
+            await asyncio.sleep(0.05)
+            return (await session.execute(text("SELECT 42"))).scalar()
+
+        async with AsyncSession(engine) as first, AsyncSession(engine) as second:
+            task = asyncio.create_task(cached_response(first, "test/own-session", {}, compute))
+            await started.wait()
+            # La session de la requête qui a lancé le calcul est fermée entre-temps
+            await first.close()
+            results = await asyncio.gather(
+                task, cached_response(second, "test/own-session", {}, compute)
+            )
+        await engine.dispose()
+
+        assert results == [42, 42]
+        assert len(sessions) == 1
+        assert sessions[0] is not first and sessions[0].bind is engine
+
+    asyncio.run(scenario())
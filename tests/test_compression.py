@@ -0,0 +1,103 @@
+"""
+Tests du middleware de compression des réponses.
+"""
+import sys
+import gzip
+import pytest
+from pathlib import Path
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.api.compression import CompressionMiddleware, negotiate_encoding
+
+LARGE_TEXT = "agence;montant\n" * 1000
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500, excluded_paths="/exclu")
+
+
+@app.get("/grand")
+async def large():
+    return Response(LARGE_TEXT, media_type="text/csv", headers={"ETag": '"abc"'})
+
+
+@app.get("/petit")
+async def small():
+    return Response("ok", media_type="text/plain")
+
+
+@app.get("/image")
+async def image():
+    return Response(b"\x89PNG" + b"0" * 2000, media_type="image/png")
+
+
+@app.get("/exclu")
+async def excluded():
+    return Response(LARGE_TEXT, media_type="text/csv")
+
+
+@app.get("/flux")
+async def stream():
+    async def lines():
+        for i in range(100):
+            yield f"ligne {i}\n".encode()
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+client = TestClient(app)
+
+
+def test_negotiate_encoding():
+    """Tester la négociation des codages selon les valeurs q."""
+    preferred = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, br", preferred) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", preferred) == "gzip"
+    assert negotiate_encoding("*", preferred) == "zstd"
+    assert negotiate_encoding("identity", preferred) is None
+    assert negotiate_encoding("gzip;q=0", preferred) is None
+    assert negotiate_encoding(None, preferred) is None
+
+
+def test_gzip_response():
+    """Tester la compression gzip d'une réponse complète."""
+    response = client.get("/grand", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert int(response.headers["content-length"]) < len(LARGE_TEXT)
+    assert response.text == LARGE_TEXT
+
+
+def test_uncompressed_responses():
+    """Tester les réponses laissées telles quelles."""
+    for path in ("/petit", "/image", "/exclu"):
+        response = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+    response = client.get("/grand", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+
+
+def test_streaming_response():
+    """Tester la compression en flux, morceau par morceau."""
+    response = client.get("/flux", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "".join(f"ligne {i}\n" for i in range(100))
+
+
+@pytest.mark.parametrize("encoding, module", [("br", "brotli"), ("zstd", "zstandard")])
+def test_optional_encodings(encoding, module):
+    """Tester brotli et zstd lorsque leurs bibliothèques sont installées."""
+    library = pytest.importorskip(module)
+    with client.stream("GET", "/grand", headers={"Accept-Encoding": encoding}) as response:
+        assert response.headers["content-encoding"] == encoding
+        raw = b"".join(response.iter_raw())
+    if encoding == "br":
+        assert library.decompress(raw).decode() == LARGE_TEXT
+    else:
+        assert library.ZstdDecompressor().decompressobj().decompress(raw).decode() == LARGE_TEXT
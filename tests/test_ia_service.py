@@ -16,6 +16,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 # Importer le service d'IA
 from src.ia.ai_service import AIAnalysisService
+from src.ia.llm_cache import LLMResponseCache, make_cache_key
 
 
 class TestAIAnalysisService(unittest.TestCase):
@@ -100,6 +101,11 @@ class TestAIAnalysisService(unittest.TestCase):
                 # Vérifier que les fichiers existent
                 for viz in visualizations:
                     self.assertTrue(os.path.exists(viz["path"]))
+
+                # Une seconde génération immédiate n'écrase pas les fichiers
+                again = self.service._generate_visualizations(self.test_data)
+                paths = {viz["path"] for viz in visualizations + again}
+                self.assertEqual(len(paths), 6)
             finally:
                 # Restaurer le répertoire de travail
                 os.chdir(original_dir)
@@ -161,6 +167,48 @@ class TestAIAnalysisService(unittest.TestCase):
         self.assertIn("report", result)
         self.assertEqual(result["metadata"]["data_points"], 0)
 
+    
+    def test_response_cache(self):
+        """Tester le cache des réponses du LLM (normalisation du prompt, contournement)."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            service = AIAnalysisService(
+                use_alternative_api=True,
+                response_cache=LLMResponseCache(os.path.join(tmp_dir, "llm_cache.db"))
+            )
+            calls = []
+            
+            def call():
+                calls.append(1)
+                return f"Rapport {len(calls)}"
+            
+            prompt = self.service._prepare_prompt(self.test_data)
+            self.assertEqual(service._complete("test", "modele", prompt, {"temperature": 0.7}, call), "Rapport 1")
+            # Même prompt à l'indentation près : réponse en cache
+            reindented = "\n".join("    " + line.strip() for line in prompt.splitlines())
+            self.assertEqual(service._complete("test", "modele", reindented, {"temperature": 0.7}, call), "Rapport 1")
+            self.assertEqual(len(calls), 1)
+            # Autres paramètres de génération : nouvel appel
+            self.assertEqual(service._complete("test", "modele", prompt, {"temperature": 0.2}, call), "Rapport 2")
+            # Contournement : nouvel appel, qui remplace la réponse en cache
+            self.assertEqual(service._complete("test", "modele", prompt, {"temperature": 0.7}, call, use_cache=False), "Rapport 3")
+            self.assertEqual(service._complete("test", "modele", prompt, {"temperature": 0.7}, call), "Rapport 3")
+            self.assertEqual(len(calls), 3)
+    
+    def test_response_cache_eviction(self):
+        """Tester l'expiration et l'éviction des réponses les moins récemment utilisées."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = LLMResponseCache(os.path.join(tmp_dir, "llm_cache.db"), max_entries=2)
+            keys = [make_cache_key("test", "modele", f"prompt {i}", {}) for i in range(3)]
+            cache.set("test", "modele", keys[0], "a")
+            cache.set("test", "modele", keys[1], "b")
+            self.assertEqual(cache.get("test", keys[0]), "a")
+            cache.set("test", "modele", keys[2], "c")
+            self.assertIsNone(cache.get("test", keys[1]))
+            self.assertEqual(cache.get("test", keys[0]), "a")
+            
+            cache.ttl = -1
+            self.assertIsNone(cache.get("test", keys[2]))
+
 
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Tests des fournisseurs de LLM et du serveur de substitution local.
+"""
+import sys
+import json
+import socket
+import threading
+import time
+import pytest
+import requests
+import uvicorn
+from contextlib import closing
+from pathlib import Path
+from fastapi.testclient import TestClient
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.ia.ai_service import AIAnalysisService
+from src.ia.llm_cache import LLMResponseCache
+from src.ia.providers import OpenAICompatibleProvider, create_providers
+from src.scripts.llm_standin_server import StandinConfig, create_app
+
+
+@pytest.fixture
+def standin():
+    """Démarrer le serveur de substitution dans un thread et retourner son URL."""
+    def start(config):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        servers.append((server, thread))
+        return f"http://127.0.0.1:{port}"
+
+    servers = []
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(5)
+
+
+def _local_service(base_url, tmp_path):
+    """Service d'analyse utilisant le serveur de substitution, avec un cache vide."""
+    provider = OpenAICompatibleProvider(
+        name="local", api_base=f"{base_url}/v1", api_key="", model="standin", require_key=False
+    )
+    return AIAnalysisService(
+        providers=[provider],
+        response_cache=LLMResponseCache(str(tmp_path / "llm_cache.db"))
+    )
+
+
+def test_create_providers():
+    """Tester le choix du fournisseur et des fournisseurs de secours."""
+    assert [p.name for p in create_providers("openai", None)] == ["openai", "huggingface"]
+    assert [p.name for p in create_providers("local", None)] == ["local"]
+    assert [p.name for p in create_providers("local", "openai, huggingface")] == ["local", "openai", "huggingface"]
+    assert [p.name for p in AIAnalysisService(use_alternative_api=True).providers] == ["huggingface"]
+    with pytest.raises(ValueError):
+        create_providers("inconnu")
+
+
+def test_standin_completion_is_deterministic():
+    """Tester que la réponse ne dépend que du prompt et respecte max_tokens."""
+    client = TestClient(create_app(StandinConfig(latency_ms=0, tokens_per_second=0, completion_tokens=50)))
+    request = {"model": "standin", "messages": [{"role": "user", "content": "Analyse"}], "max_tokens": 20}
+    first = client.post("/v1/chat/completions", json=request).json()
+    second = client.post("/v1/chat/completions", json=request).json()
+    assert first["choices"][0]["message"]["content"] == second["choices"][0]["message"]["content"]
+    assert first["usage"]["completion_tokens"] == 20
+
+    with client.stream("POST", "/v1/chat/completions", json=dict(request, stream=True)) as response:
+        lines = [line for line in response.iter_lines() if line.startswith("data: ")]
+    assert lines[-1] == "data: [DONE]"
+    content = "".join(
+        json.loads(line[len("data: "):])["choices"][0]["delta"].get("content", "") for line in lines[:-1]
+    )
+    assert content == first["choices"][0]["message"]["content"]
+    assert client.get("/stats").json()["completed"] == 3
+
+
+def test_standin_error_injection():
+    """Tester l'injection d'erreurs avec un tirage reproductible."""
+    def statuses():
+        client = TestClient(create_app(StandinConfig(latency_ms=0, tokens_per_second=0, error_rate=0.5, seed=7)))
+        request = {"messages": [{"role": "user", "content": "Analyse"}]}
+        return [client.post("/v1/chat/completions", json=request).status_code for _ in range(20)]
+
+    first = statuses()
+    assert set(first) == {200, 503}
+    assert statuses() == first
+
+
+def test_local_provider_analysis(standin, tmp_path):
+    """Tester une analyse complète, puis en flux, avec le fournisseur local."""
+    base_url = standin(StandinConfig(latency_ms=10, tokens_per_second=0, completion_tokens=30))
+    service = _local_service(base_url, tmp_path)
+    data = [
+        {"agence": "Agence A", "date": "2024-01-01", "montant": 1000.0, "nombre_transactions": 10},
+        {"agence": "Agence B", "date": "2024-01-02", "montant": 2000.0, "nombre_transactions": 20},
+    ]
+
+    result = service.analyze_bank_data(data, include_visualizations=False)
+    assert result["report"].startswith("# Rapport d'analyse bancaire")
+    assert result["visualizations"] == []
+    assert service.model_used == "standin"
+
+    steps = list(service.stream_analysis(data, include_visualizations=False, use_cache=False))
+    tokens = [payload for step, payload in steps if step == "token"]
+    assert len(tokens) == 30
+    assert steps[-1][1]["report"] == result["report"]
+
+
+def test_local_provider_stream_cancellation(standin, tmp_path):
+    """Tester que l'abandon d'un flux interrompt la génération côté fournisseur."""
+    base_url = standin(StandinConfig(latency_ms=0, tokens_per_second=20, completion_tokens=200))
+    service = _local_service(base_url, tmp_path)
+
+    with closing(service._stream_report("Analyse", use_cache=False)) as chunks:
+        next(chunks)
+
+    for _ in range(50):
+        stats = requests.get(f"{base_url}/stats").json()
+        if stats["cancelled"]:
+            break
+        time.sleep(0.1)
+    assert stats["cancelled"] == 1
+    assert stats["tokens_sent"] < 200
@@ -0,0 +1,116 @@
+"""
+Tests des plans d'exécution des requêtes sur bank_data et ses agrégats.
+
+Le volume de données est réglable par la variable QUERY_PLAN_ROWS
+(par exemple QUERY_PLAN_ROWS=3000000 pour reproduire la production).
+"""
+import os
+import sys
+import random
+import pytest
+from pathlib import Path
+from datetime import date, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import sqlite
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.db.database import Base
+from src.db.models import BankData
+from src.db.queries import (
+    bank_data_query, analysis_data_query, rollup_stats_by_agence_query,
+    rollup_stats_by_date_query, rollup_timeseries_query, rollup_pivot_query,
+)
+from src.db.rollups import rebuild_rollups
+
+ROWS = int(os.getenv("QUERY_PLAN_ROWS", "100000"))
+AGENCES = [f"Agence {i}" for i in range(20)]
+FIN = date(2024, 12, 31)
+
+
+@pytest.fixture(scope="module")
+def plan_engine(tmp_path_factory):
+    """Base SQLite remplie de ROWS lignes, agrégats calculés, analysée (ANALYZE)."""
+    db_path = tmp_path_factory.mktemp("plans") / "plans.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    random.seed(42)
+    with engine.begin() as conn:
+        batch = []
+        for i in range(ROWS):
+            batch.append({
+                "agence": AGENCES[i % len(AGENCES)],
+                "date": FIN - timedelta(days=i // len(AGENCES)),
+                "montant": random.uniform(1000, 10000),
+                "nombre_transactions": random.randint(5, 100),
+            })
+            if len(batch) == 50000:
+                conn.execute(BankData.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(BankData.__table__.insert(), batch)
+        rebuild_rollups(conn)
+        conn.exec_driver_sql("ANALYZE")
+    yield engine
+    engine.dispose()
+
+
+def explain(engine, query):
+    """Retourner le plan d'exécution SQLite d'une requête sous forme de texte."""
+    sql = str(query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_rollup_stats_by_date_uses_period_index(plan_engine):
+    """Les statistiques par date lisent les agrégats journaliers par l'index de période."""
+    plan = explain(plan_engine, rollup_stats_by_date_query(FIN - timedelta(days=30)))
+    assert "INDEX ix_bank_data_rollups_granularity_period (granularity=? AND period_start>?)" in plan, plan
+    assert "bank_data " not in plan, plan
+
+
+def test_rollup_stats_by_agence_uses_primary_key(plan_engine):
+    """Les statistiques par agence ne lisent que les agrégats d'une granularité."""
+    plan = explain(plan_engine, rollup_stats_by_agence_query())
+    assert "SEARCH bank_data_rollups USING INDEX" in plan and "(granularity=?)" in plan, plan
+    assert "SCAN" not in plan, plan
+
+
+@pytest.mark.parametrize("granularity", ["day", "week", "month", "quarter"])
+def test_rollup_timeseries_uses_period_index(plan_engine, granularity):
+    """Les séries temporelles lisent un intervalle de l'index de période."""
+    plan = explain(plan_engine, rollup_timeseries_query(granularity, FIN - timedelta(days=400), FIN))
+    assert (
+        "INDEX ix_bank_data_rollups_granularity_period "
+        "(granularity=? AND period_start>? AND period_start<?)"
+    ) in plan, plan
+    assert "SCAN" not in plan, plan
+
+
+def test_rollup_pivot_uses_period_index(plan_engine):
+    """Le tableau croisé lit un intervalle de l'index de période."""
+    plan = explain(plan_engine, rollup_pivot_query("week", "montant_total", FIN - timedelta(days=200), FIN))
+    assert "INDEX ix_bank_data_rollups_granularity_period" in plan, plan
+    assert "SCAN" not in plan, plan
+
+
+def test_analysis_query_uses_covering_index(plan_engine):
+    """Les données d'analyse de toutes les agences ne lisent pas la table."""
+    plan = explain(plan_engine, analysis_data_query(FIN - timedelta(days=30), FIN))
+    assert "COVERING INDEX ix_bank_data_date_agence_montant_transactions" in plan, plan
+
+
+def test_analysis_query_by_agence_uses_index(plan_engine):
+    """Les données d'analyse d'une agence utilisent un index composite."""
+    plan = explain(plan_engine, analysis_data_query(FIN - timedelta(days=30), FIN, "Agence 3"))
+    assert "ix_bank_data_agence_date" in plan or "COVERING INDEX" in plan, plan
+    assert "SCAN bank_data" not in plan, plan
+
+
+def test_bank_data_query_uses_agence_date_index(plan_engine):
+    """La lecture filtrée par agence et par dates utilise l'index (agence, date)."""
+    query = bank_data_query("Agence 3", FIN - timedelta(days=30), FIN)
+    plan = explain(plan_engine, query)
+    assert "INDEX ix_bank_data_agence_date (agence=? AND date>? AND date<?)" in plan, plan
@@ -0,0 +1,63 @@
+"""
+Tests du regroupement des calculs simultanés (single-flight).
+"""
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.api.singleflight import SingleFlight, SINGLEFLIGHT_CALLS
+
+
+def _count(group, outcome):
+    """Valeur courante du compteur de métriques."""
+    return SINGLEFLIGHT_CALLS.labels(group, outcome)._value.get()
+
+
+def test_concurrent_calls_share_one_computation():
+    """Tester que des appels simultanés identiques n'exécutent qu'un calcul."""
+    flight = SingleFlight("test_shared")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"total": 42}
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("stats", compute) for _ in range(10)))
+        other = await flight.do("autre", compute)
+        return results, other
+
+    results, other = asyncio.run(scenario())
+    assert results == [{"total": 42}] * 10
+    assert other == {"total": 42}
+    assert len(calls) == 2
+    assert _count("test_shared", "executed") == 2
+    assert _count("test_shared", "coalesced") == 9
+    assert flight.in_flight() == 0
+
+
+def test_exception_is_shared_and_not_cached():
+    """Tester que l'exception est transmise à tous puis que le calcul est relancé."""
+    flight = SingleFlight("test_error")
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("échec")
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(flight.do("cle", failing) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            await flight.do("cle", failing)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
@@ -0,0 +1,113 @@
+"""
+Tests du transport HTTP des appels aux LLM.
+"""
+import io
+import sys
+import json
+import socket
+import threading
+import time
+import pytest
+import requests
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin de recherche Python
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.ia.transport import LLMTransport, LLMTransportError, LLM_IN_FLIGHT, LLM_RETRIES
+
+
+def _response(status_code, body=None, headers=None):
+    """Construire une réponse HTTP."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode()
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeSession:
+    """Session qui retourne des réponses prédéfinies et compte les appels."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def post(self, url, json=None, headers=None, timeout=None, stream=False):
+        self.calls.append(timeout)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_retries_on_server_errors():
+    """Tester les nouvelles tentatives sur 503 et 429 puis le succès."""
+    session = FakeSession([
+        _response(503),
+        _response(429, headers={"Retry-After": "0"}),
+        _response(200, {"ok": True}),
+    ])
+    transport = LLMTransport("test_retry", max_retries=2, backoff_max=0, session=session)
+    assert transport.post_json("http://llm.test/v1", {}) == {"ok": True}
+    assert len(session.calls) == 3
+    assert session.calls[0] == transport.timeout
+    assert LLM_RETRIES.labels("test_retry")._value.get() == 2
+
+
+def test_no_retry_on_client_error():
+    """Tester qu'une erreur 4xx (hors 429) n'est pas retentée."""
+    session = FakeSession([_response(400, {"error": "invalid"})])
+    transport = LLMTransport("test_client_error", session=session)
+    with pytest.raises(LLMTransportError) as exc_info:
+        transport.post_json("http://llm.test/v1", {})
+    assert exc_info.value.status_code == 400
+    assert len(session.calls) == 1
+
+
+def test_retries_are_bounded():
+    """Tester l'abandon après le nombre maximal de tentatives."""
+    session = FakeSession([requests.ConnectionError("refusée")] * 3)
+    transport = LLMTransport("test_bounded", max_retries=2, backoff_max=0, session=session)
+    with pytest.raises(LLMTransportError):
+        transport.post_json("http://llm.test/v1", {})
+    assert len(session.calls) == 3
+
+
+def test_read_timeout_on_hung_server():
+    """Tester qu'un serveur qui ne répond pas ne bloque pas l'appel indéfiniment."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    connections = []
+    acceptor = threading.Thread(target=lambda: connections.append(server.accept()), daemon=True)
+    acceptor.start()
+
+    transport = LLMTransport("test_timeout", read_timeout=0.2, max_retries=0)
+    start = time.perf_counter()
+    with pytest.raises(LLMTransportError):
+        transport.post_json(f"http://127.0.0.1:{server.getsockname()[1]}/v1", {})
+    assert time.perf_counter() - start < 2
+    transport.close()
+    server.close()
+
+
+def test_stream_json():
+    """Tester la lecture d'un flux Server-Sent Events et la libération de la place à la fermeture."""
+    response = _response(200)
+    response.raw = io.BytesIO(
+        b'data: {"text": "Bon"}\n\n: commentaire\n\ndata: {"text": "jour"}\n\ndata: [DONE]\n\n'
+    )
+    transport = LLMTransport("test_stream", max_concurrency=1, session=FakeSession([response]))
+    events = transport.stream_json("http://llm.test/v1", {})
+    assert next(events) == {"text": "Bon"}
+    assert LLM_IN_FLIGHT.labels("test_stream")._value.get() == 1
+    # Abandon du flux (client déconnecté) : connexion fermée, place libérée
+    events.close()
+    assert LLM_IN_FLIGHT.labels("test_stream")._value.get() == 0
+    assert transport._slots.acquire(blocking=False)
+    
+    response = _response(200)
+    response.raw = io.BytesIO(b'data: {"text": "Bon"}\n\ndata: {"text": "jour"}\n\ndata: [DONE]\n\n')
+    transport = LLMTransport("test_stream_done", session=FakeSession([response]))
+    assert list(transport.stream_json("http://llm.test/v1", {})) == [{"text": "Bon"}, {"text": "jour"}]